@@ -1,12 +1,441 @@
+import asyncio
 import asyncpg
-from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable, Tuple, Set
+from datetime import datetime, time as dt_time, timedelta
+import json
+import logging
 import os
+import time
+import uuid
+
+from metrics import Counter, Histogram, add_phase_time
+
+logger = logging.getLogger(__name__)
+
+# Подписчик на изменения задач: (task_id, next_reminder_at); None - напоминаний
+# по задаче больше не будет (завершена, удалена или все уже отправлены)
+TaskListener = Callable[[int, Optional[datetime]], None]
+
+# За сколько до дедлайна отправляются напоминания, от самого раннего к позднему
+REMINDER_OFFSETS = [timedelta(hours=24), timedelta(hours=1), timedelta(0)]
+
+# Сколько напоминаний процесс захватывает за раз и на какой срок: если он не
+# подтвердит отправку до истечения аренды, напоминания заберет другая реплика
+REMINDER_CLAIM_BATCH = 100
+REMINDER_LEASE = timedelta(minutes=2)
+# Пока пачка отправляется, аренда продлевается с этим интервалом: отправка
+# сотни напоминаний одному чату с учетом лимитов Telegram дольше срока аренды
+REMINDER_LEASE_RENEW = REMINDER_LEASE / 3
+
+# Режимы напоминаний пользователя: отдельное сообщение по каждой задаче
+# или одна ежедневная сводка в выбранное время
+REMINDER_MODES = ("tasks", "digest")
+DEFAULT_DIGEST_TIME = dt_time(9, 0)
+# В сводку попадают активные задачи с дедлайном в ближайшие сутки и просроченные
+DIGEST_HORIZON = timedelta(hours=24)
+DIGEST_CLAIM_BATCH = 100
+
+# Сколько строк выгрузки курсор забирает с сервера за раз
+EXPORT_PREFETCH = 500
+
+# Сколько задач удаленных проектов вычищается одним запросом: короткие
+# транзакции не держат блокировки и не раздувают WAL одним большим удалением
+PURGE_BATCH = 1000
+
+# Завершенные задачи через ARCHIVE_AFTER после завершения переносятся в
+# tasks_archive, секционированную по месяцу завершения; за один запрос
+# переносится не больше ARCHIVE_BATCH задач
+ARCHIVE_AFTER = timedelta(days=1)
+ARCHIVE_BATCH = 1000
+
+# Конфигурация полнотекстового поиска: стемминг и стоп-слова русского языка
+SEARCH_CONFIG = "russian"
+
+# Поля задачи, которые возвращают get_task и методы изменения задач
+TASK_COLUMN_NAMES = ["id", "project_id", "title", "description", "deadline", "status", "comment"]
+TASK_COLUMNS = ", ".join(TASK_COLUMN_NAMES)
+
+# Размер страницы списков проектов и задач: укладывается в лимит сообщения
+# Telegram (4096 символов) и клавиатуры
+PAGE_SIZE = 10
+
+# Размер кэша подготовленных выражений на соединение; с запасом покрывает
+# все именованные запросы Database
+STATEMENT_CACHE_SIZE = 256
+
+# Канал Postgres, в который триггеры на projects и tasks публикуют изменения.
+# Уведомление доставляется слушателям при фиксации транзакции, так что другой
+# процесс узнает об изменении через время сетевой доставки (единицы мс).
+# При обрыве соединения слушателя события теряются: попытки переподключения
+# идут каждые CHANGE_FEED_RECONNECT_DELAY секунд, после успешной кэш
+# сбрасывается целиком, а подписчики получают событие RESYNC
+CHANGE_FEED_CHANNEL = "data_changes"
+CHANGE_FEED_RECONNECT_DELAY = 5
+
+# Триггеры ленты изменений: (таблица, имя, события, функция, столбцы).
+# Для UPDATE событие публикуется, только если изменился один из столбцов:
+# служебные записи (аренда напоминаний, сдвиг digest_next_at при захвате
+# сводки) не меняют кэшируемых данных и не должны будить все реплики
+CHANGE_FEED_TRIGGERS = (
+    ("projects", "projects_change_feed", ("INSERT", "UPDATE", "DELETE"), "notify_project_change", ()),
+    ("tasks", "tasks_change_feed", ("INSERT", "DELETE"), "notify_task_change", ()),
+    ("tasks", "tasks_change_feed_update", ("UPDATE",), "notify_task_change",
+     ("project_id", "title", "description", "deadline", "status", "comment",
+      "next_reminder_at", "completed_at")),
+    ("user_settings", "user_settings_change_feed", ("INSERT", "DELETE"), "notify_settings_change", ()),
+    ("user_settings", "user_settings_change_feed_update", ("UPDATE",), "notify_settings_change",
+     ("reminder_mode", "digest_time")),
+)
+# Биты pg_trigger.tgtype: по ним видно, что триггер создан с другим набором событий
+_TRIGGER_ROW = 1
+_TRIGGER_EVENTS = {"INSERT": 4, "DELETE": 8, "UPDATE": 16}
+
+# Подписчик на ленту изменений: словарь события (table, op, id, user_id, ...)
+ChangeListener = Callable[[Dict[str, Any]], None]
+
+
+def next_digest_at(digest_time: dt_time, now: Optional[datetime] = None) -> datetime:
+    """Ближайший момент отправки сводки в digest_time"""
+    now = now or datetime.now()
+    send_at = datetime.combine(now.date(), digest_time)
+    return send_at if send_at > now else send_at + timedelta(days=1)
+
+
+def _task_selection(user_id: int, task_ids: Optional[List[int]], project_id: Optional[int],
+                    overdue: bool) -> Tuple[str, List[Any]]:
+    """Условие WHERE и параметры для групповых действий над задачами пользователя.
+
+    Задачи выбираются по списку id и/или проекту, при overdue - только
+    просроченные активные. Владелец проверяется всегда.
+    """
+    if task_ids is None and project_id is None:
+        raise ValueError("Нужен список задач или проект")
+    args: List[Any] = [user_id]
+    conditions = ["project_id IN (SELECT id FROM projects WHERE user_id = $1 AND deleted_at IS NULL)"]
+    if task_ids is not None:
+        args.append(task_ids)
+        conditions.append(f"id = ANY(${len(args)}::int[])")
+    if project_id is not None:
+        args.append(project_id)
+        conditions.append(f"project_id = ${len(args)}")
+    if overdue:
+        conditions.append("status = 'активно' AND deadline < NOW()")
+    return " AND ".join(conditions), args
+
+
+def encode_page_cursor(sort_value: datetime, row_id: int) -> str:
+    """Курсор страницы для callback_data: значение сортировки и id последней строки"""
+    return f"{sort_value:%Y%m%d%H%M%S%f}-{row_id}"
+
+
+def decode_page_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Разбор курсора страницы"""
+    sort_value, row_id = cursor.split("-")
+    return datetime.strptime(sort_value, "%Y%m%d%H%M%S%f"), int(row_id)
+
+
+def _split_page(rows: List[asyncpg.Record], limit: int, sort_column: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Отделение лишней строки страницы и построение курсора следующей"""
+    page = [dict(row) for row in rows[:limit]]
+    if len(rows) <= limit:
+        return page, None
+    last = page[-1]
+    return page, encode_page_cursor(last[sort_column], last['id'])
+
+
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Время выполнения запросов к БД", ("query",)
+)
+QUERY_ROWS = Counter("db_query_rows_total", "Строки, возвращенные или затронутые запросами", ("query",))
+QUERY_ERRORS = Counter("db_query_errors_total", "Запросы к БД, завершившиеся ошибкой", ("query",))
+POOL_ACQUIRE_DURATION = Histogram(
+    "db_pool_acquire_seconds", "Ожидание свободного соединения из пула", ("query",)
+)
+
+
+def _count_rows(method: str, result: Any, args: tuple) -> int:
+    """Число строк по результату вызова asyncpg"""
+    if method == "fetch":
+        return len(result)
+    if method in ("fetchrow", "fetchval"):
+        return 0 if result is None else 1
+    if method == "executemany":
+        return len(args[0]) if args else 0
+    # execute возвращает статус вида "UPDATE 3"
+    last = result.rsplit(" ", 1)[-1] if isinstance(result, str) else ""
+    return int(last) if last.isdigit() else 0
+
+
+class InstrumentedConnection:
+    """Обертка соединения, замеряющая запросы под именем метода Database"""
+
+    def __init__(self, conn: asyncpg.Connection, name: str):
+        self._conn = conn
+        self._name = name
+
+    def __getattr__(self, item):
+        return getattr(self._conn, item)
+
+    async def _timed(self, method: str, query: str, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = await getattr(self._conn, method)(query, *args, **kwargs)
+        except Exception:
+            QUERY_ERRORS.inc(self._name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            QUERY_DURATION.observe(elapsed, self._name)
+            add_phase_time("db", elapsed)
+        QUERY_ROWS.inc(self._name, amount=_count_rows(method, result, args))
+        return result
+
+    async def fetch(self, query: str, *args, **kwargs):
+        return await self._timed("fetch", query, *args, **kwargs)
+
+    async def fetchrow(self, query: str, *args, **kwargs):
+        return await self._timed("fetchrow", query, *args, **kwargs)
+
+    async def fetchval(self, query: str, *args, **kwargs):
+        return await self._timed("fetchval", query, *args, **kwargs)
+
+    async def execute(self, query: str, *args, **kwargs):
+        return await self._timed("execute", query, *args, **kwargs)
+
+    async def executemany(self, query: str, *args, **kwargs):
+        return await self._timed("executemany", query, *args, **kwargs)
+
+
+class UserCache:
+    """LRU-кэш прочитанных строк, разложенный по пользователям.
+
+    Ключи внутри пользователя: "projects", "projects_stats", "project:<id>",
+    "tasks:<project_id>", "task:<id>", "settings". Записи живут не дольше ttl секунд
+    и удаляются при обращении после истечения. У пользователя хранится не больше
+    max_keys записей, при превышении max_users вытесняется давно не активный
+    пользователь. Выключенный кэш (enabled=False) ничего не хранит и не отдает.
+    """
+
+    def __init__(self, max_users: int = 1000, max_keys: int = 50, ttl: float = 60,
+                 enabled: bool = True):
+        self.max_users = max_users
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.enabled = enabled
+        self._users: "OrderedDict[int, OrderedDict[str, tuple]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, key: str) -> Any:
+        if not self.enabled:
+            return None
+        entries = self._users.get(user_id)
+        entry = entries.get(key) if entries else None
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                self._drop(user_id, key)
+            self.misses += 1
+            return None
+        entries.move_to_end(key)
+        self._users.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, user_id: int, key: str, value: Any):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        entries = self._users.setdefault(user_id, OrderedDict())
+        entries[key] = (value, now + self.ttl)
+        entries.move_to_end(key)
+        while len(entries) > self.max_keys:
+            entries.popitem(last=False)
+        self._users.move_to_end(user_id)
+        self._evict_expired(now)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def _drop(self, user_id: int, key: str):
+        """Удаление записи; пользователь без записей удаляется целиком"""
+        entries = self._users[user_id]
+        del entries[key]
+        if not entries:
+            del self._users[user_id]
+
+    def _evict_expired(self, now: float):
+        """Вытеснение давно не активных пользователей, у которых истекли все записи"""
+        while self._users:
+            user_id, entries = next(iter(self._users.items()))
+            if max(expires for _, expires in entries.values()) >= now:
+                break
+            del self._users[user_id]
+
+    def invalidate(self, user_id: int, *keys: str):
+        """Сброс указанных ключей пользователя; без ключей - всех его записей"""
+        if not keys:
+            self._users.pop(user_id, None)
+            return
+        entries = self._users.get(user_id)
+        if entries:
+            for key in keys:
+                entries.pop(key, None)
+            if not entries:
+                del self._users[user_id]
+
+    def clear(self):
+        """Сброс всех записей"""
+        self._users.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "users": len(self._users),
+            "entries": sum(len(entries) for entries in self._users.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
 
 
 class Database:
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
+        self._task_listeners: List[TaskListener] = []
+        self._change_listeners: List[ChangeListener] = []
+        # Изменения из других процессов через LISTEN/NOTIFY (DB_CHANGE_FEED=1)
+        self._change_feed = os.getenv("DB_CHANGE_FEED") == "1"
+        # Кэш включается только при подключенной ленте изменений: без нее
+        # записи других процессов и реплик не сбрасывают его, и списки
+        # проектов и задач устаревали бы на ttl
+        self.cache = UserCache(
+            max_users=int(os.getenv("DB_CACHE_USERS", 1000)),
+            max_keys=int(os.getenv("DB_CACHE_KEYS", 50)),
+            ttl=float(os.getenv("DB_CACHE_TTL", 60)),
+            enabled=False
+        )
+        self._database_url: Optional[str] = None
+        self._feed_connection: Optional[asyncpg.Connection] = None
+        self._feed_reconnect: Optional[asyncio.Task] = None
+        self.feed_events = 0
+        self.feed_reconnects = 0
+        # Метка соединений этого процесса: свои события из ленты пропускаются
+        self._instance_id = uuid.uuid4().hex[:8]
+        # Уже созданные секции архива: DDL выполняется один раз на процесс
+        self._archive_partitions: Set[str] = set()
+
+    def add_task_listener(self, listener: TaskListener):
+        """Подписка на изменения дедлайна и статуса задач"""
+        self._task_listeners.append(listener)
+
+    def remove_task_listener(self, listener: TaskListener):
+        """Отписка от изменений задач"""
+        if listener in self._task_listeners:
+            self._task_listeners.remove(listener)
+
+    def _notify_task_changed(self, task_id: int, deadline: Optional[datetime]):
+        """Оповещение подписчиков об изменении задачи"""
+        for listener in self._task_listeners:
+            try:
+                listener(task_id, deadline)
+            except Exception as e:
+                logger.error(f"Ошибка в подписчике изменений задач: {e}")
+
+    def add_change_listener(self, listener: ChangeListener):
+        """Подписка на изменения, сделанные другими процессами"""
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener: ChangeListener):
+        """Отписка от ленты изменений"""
+        if listener in self._change_listeners:
+            self._change_listeners.remove(listener)
+
+    def _dispatch_change(self, event: Dict[str, Any]):
+        """Рассылка события ленты изменений подписчикам"""
+        for listener in self._change_listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Ошибка в подписчике ленты изменений: {e}")
+
+    def _on_change(self, conn, pid, channel, payload):
+        """Событие от триггера: сброс кэша и оповещение подписчиков"""
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.error(f"Некорректное событие ленты изменений: {payload}")
+            return
+        # Свои изменения уже учтены в момент записи
+        if event.get("origin") == self._instance_id:
+            return
+        self.feed_events += 1
+
+        user_id = event.get("user_id")
+        if event["table"] == "user_settings":
+            self.cache.invalidate(user_id, "settings")
+        elif event["table"] == "projects":
+            # Удаление проекта скрывает его задачи - сбрасываем все записи пользователя
+            deleted = event["op"] == "DELETE" or event.get("deleted")
+            keys = () if deleted else (f"project:{event['id']}", "projects", "projects_stats")
+            self.cache.invalidate(user_id, *keys)
+        else:
+            # При каскадном удалении проект уже не найден, и user_id пуст:
+            # кэш тогда сбрасывается событием самого проекта
+            if user_id is not None:
+                self._invalidate_task(user_id, event["id"], event["project_id"])
+            remind_at = event.get("next_reminder_at")
+            self._notify_task_changed(event["id"], datetime.fromisoformat(remind_at) if remind_at else None)
+        self._dispatch_change(event)
+
+    async def _connect_change_feed(self):
+        """Отдельное соединение вне пула, слушающее канал изменений"""
+        conn = await asyncpg.connect(self._database_url)
+        conn.add_termination_listener(self._on_feed_terminated)
+        await conn.add_listener(CHANGE_FEED_CHANNEL, self._on_change)
+        self._feed_connection = conn
+        self.cache.enabled = True
+
+    def _on_feed_terminated(self, conn):
+        """Обрыв соединения слушателя: запуск переподключения"""
+        if conn is not self._feed_connection or self._feed_reconnect is not None:
+            return
+        logger.warning("Соединение ленты изменений потеряно, переподключение")
+        self._feed_connection = None
+        # Пока события не приходят, кэш не сбрасывается чужими записями
+        self.cache.enabled = False
+        self.cache.clear()
+        self._feed_reconnect = asyncio.create_task(self._reconnect_change_feed())
+
+    async def _reconnect_change_feed(self):
+        """Переподключение слушателя и полная пересинхронизация"""
+        while True:
+            await asyncio.sleep(CHANGE_FEED_RECONNECT_DELAY)
+            try:
+                await self._connect_change_feed()
+                break
+            except Exception as e:
+                logger.error(f"Ошибка подключения ленты изменений: {e}")
+        self._feed_reconnect = None
+        self.feed_reconnects += 1
+        # События за время обрыва потеряны, поэтому кэшу верить нельзя
+        self.cache.clear()
+        self._dispatch_change({"table": None, "op": "RESYNC"})
+
+    def get_change_feed_metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._change_feed,
+            "connected": self._feed_connection is not None,
+            "events": self.feed_events,
+            "reconnects": self.feed_reconnects,
+        }
+
+    @asynccontextmanager
+    async def acquire(self, name: str):
+        """Соединение из пула с замером ожидания и запросов под именем name"""
+        start = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            POOL_ACQUIRE_DURATION.observe(time.perf_counter() - start, name)
+            yield InstrumentedConnection(conn, name)
 
     async def create_pool(self):
         """Создание пула подключений к БД"""
@@ -17,207 +446,1138 @@ class Database:
         # Конвертируем URL для asyncpg если нужно
         if database_url.startswith("postgres://"):
             database_url = database_url.replace("postgres://", "postgresql://", 1)
+        self._database_url = database_url
         
         self.pool = await asyncpg.create_pool(
             database_url,
             min_size=1,
             max_size=10,
-            command_timeout=60
+            command_timeout=60,
+            # Параметризованные запросы asyncpg держит подготовленными
+            # в кэше каждого соединения
+            statement_cache_size=STATEMENT_CACHE_SIZE,
+            # Триггеры ленты изменений подписывают события этой меткой
+            server_settings={"app.instance_id": self._instance_id}
         )
         await self.init_tables()
+
+        if self._change_feed:
+            await self._connect_change_feed()
     
+    async def _ensure_change_feed_triggers(self, conn: InstrumentedConnection):
+        """Установка триггеров ленты изменений при DB_CHANGE_FEED=1 и снятие без него.
+
+        DDL над триггерами берет AccessExclusive-блокировку горячих таблиц,
+        поэтому выполняется только при расхождении с pg_trigger, а не при
+        каждом запуске. Настройка должна совпадать у всех реплик: без ленты
+        триггеров нет, и запись не платит за pg_notify при фиксации.
+        """
+        async with conn.transaction():
+            existing = {row['tgname']: row['tgtype'] for row in await conn.fetch("""
+                SELECT tgname, tgtype FROM pg_trigger
+                WHERE tgname = ANY($1::text[]) AND NOT tgisinternal
+            """, [name for _, name, _, _, _ in CHANGE_FEED_TRIGGERS])}
+
+            if not self._change_feed:
+                for table, name, _, _, _ in CHANGE_FEED_TRIGGERS:
+                    if name in existing:
+                        await conn.execute(f"DROP TRIGGER {name} ON {table}")
+                return
+
+            # Замена функций не блокирует таблицы и обновляет формат событий
+            await conn.execute(f"""
+                CREATE OR REPLACE FUNCTION notify_project_change() RETURNS trigger AS $$
+                DECLARE
+                    changed projects%ROWTYPE;
+                BEGIN
+                    IF TG_OP = 'DELETE' THEN changed := OLD; ELSE changed := NEW; END IF;
+                    PERFORM pg_notify('{CHANGE_FEED_CHANNEL}', json_build_object(
+                        'table', 'projects',
+                        'op', TG_OP,
+                        'id', changed.id,
+                        'user_id', changed.user_id,
+                        'deleted', changed.deleted_at IS NOT NULL,
+                        'origin', current_setting('app.instance_id', true)
+                    )::text);
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            await conn.execute(f"""
+                CREATE OR REPLACE FUNCTION notify_task_change() RETURNS trigger AS $$
+                DECLARE
+                    changed tasks%ROWTYPE;
+                BEGIN
+                    IF TG_OP = 'DELETE' THEN changed := OLD; ELSE changed := NEW; END IF;
+                    PERFORM pg_notify('{CHANGE_FEED_CHANNEL}', json_build_object(
+                        'table', 'tasks',
+                        'op', TG_OP,
+                        'id', changed.id,
+                        'project_id', changed.project_id,
+                        'user_id', (SELECT user_id FROM projects WHERE id = changed.project_id),
+                        'next_reminder_at', CASE WHEN TG_OP <> 'DELETE' THEN changed.next_reminder_at END,
+                        'origin', current_setting('app.instance_id', true)
+                    )::text);
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            await conn.execute(f"""
+                CREATE OR REPLACE FUNCTION notify_settings_change() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM pg_notify('{CHANGE_FEED_CHANNEL}', json_build_object(
+                        'table', 'user_settings',
+                        'op', TG_OP,
+                        'user_id', COALESCE(NEW.user_id, OLD.user_id),
+                        'origin', current_setting('app.instance_id', true)
+                    )::text);
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            for table, name, events, function, columns in CHANGE_FEED_TRIGGERS:
+                tgtype = _TRIGGER_ROW + sum(_TRIGGER_EVENTS[event] for event in events)
+                if existing.get(name) == tgtype:
+                    continue
+                if name in existing:
+                    # Триггер прежней версии, например на все UPDATE сразу
+                    await conn.execute(f"DROP TRIGGER {name} ON {table}")
+                condition = ""
+                if columns:
+                    old = ", ".join(f"OLD.{column}" for column in columns)
+                    new = ", ".join(f"NEW.{column}" for column in columns)
+                    condition = f"WHEN (({old}) IS DISTINCT FROM ({new}))"
+                await conn.execute(f"""
+                    CREATE TRIGGER {name}
+                    AFTER {" OR ".join(events)} ON {table}
+                    FOR EACH ROW {condition} EXECUTE FUNCTION {function}()
+                """)
+
     async def init_tables(self):
         """Инициализация таблиц в БД"""
-        async with self.pool.acquire() as conn:
-            # Создание таблицы проектов
+        async with self.acquire("init_tables") as conn:
+            # Реплики, стартующие одновременно, меняют схему по очереди
+            await conn.execute("SELECT pg_advisory_lock(hashtext('init_tables'))")
+            try:
+                await self._create_schema(conn)
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(hashtext('init_tables'))")
+
+    @staticmethod
+    async def _has_column(conn: InstrumentedConnection, table: str, column: str) -> bool:
+        """Есть ли столбец в таблице.
+
+        ALTER TABLE ... ADD COLUMN IF NOT EXISTS берет AccessExclusive-блокировку
+        таблицы даже для существующего столбца, поэтому миграции при запуске
+        сначала проверяют information_schema.
+        """
+        return await conn.fetchval("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = $1 AND column_name = $2
+            )
+        """, table, column)
+
+    async def _create_schema(self, conn: InstrumentedConnection):
+        """Создание и миграция таблиц, индексов и триггеров"""
+        # Создание таблицы проектов
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS projects (
+                id SERIAL PRIMARY KEY,
+                user_id BIGINT NOT NULL,
+                name TEXT NOT NULL,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        # Мягкое удаление: проект скрывается сразу, задачи вычищает purge_deleted_projects
+        if not await self._has_column(conn, "projects", "deleted_at"):
             await conn.execute("""
-                CREATE TABLE IF NOT EXISTS projects (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT NOW()
-                )
+                ALTER TABLE projects ADD COLUMN deleted_at TIMESTAMP WITHOUT TIME ZONE
             """)
-            
-            # Создание таблицы задач
+        
+        # Создание таблицы задач
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id SERIAL PRIMARY KEY,
+                project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+                title TEXT NOT NULL,
+                description TEXT,
+                deadline TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                status TEXT DEFAULT 'активно',
+                comment TEXT,
+                created_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        
+        # Создание индексов для оптимизации
+        # Индексы по проектам частичные: удаленные проекты в них не попадают
+        await conn.execute("DROP INDEX IF EXISTS idx_projects_user_id")
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_projects_user_active
+            ON projects(user_id) WHERE deleted_at IS NULL
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_projects_deleted
+            ON projects(deleted_at) WHERE deleted_at IS NOT NULL
+        """)
+        # Индексы задач повторяют реальные выборки: задачи проекта по дедлайну
+        # (idx_tasks_project_deadline ниже, он же обслуживает каскад от projects)
+        # и активные задачи проекта по дедлайну для просроченных и сводок - без
+        # прохода по истории завершенных. Отдельные индексы по project_id,
+        # status и deadline ими перекрываются, а status почти не сужает выборку
+        for index in ("idx_tasks_project_id", "idx_tasks_status", "idx_tasks_deadline",
+                      "idx_tasks_active_deadline"):
+            await conn.execute(f"DROP INDEX IF EXISTS {index}")
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tasks_project_active_deadline
+            ON tasks(project_id, deadline) WHERE status = 'активно'
+        """)
+        # Индексы под постраничную выборку по курсору
+        await conn.execute("DROP INDEX IF EXISTS idx_projects_user_created")
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_projects_user_created_active
+            ON projects(user_id, created_at DESC, id DESC) WHERE deleted_at IS NULL
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tasks_project_deadline
+            ON tasks(project_id, deadline, id)
+        """)
+
+        # Время следующего неотправленного напоминания; NULL - отправлять нечего
+        if not await self._has_column(conn, "tasks", "next_reminder_at"):
             await conn.execute("""
-                CREATE TABLE IF NOT EXISTS tasks (
-                    id SERIAL PRIMARY KEY,
-                    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
-                    title TEXT NOT NULL,
-                    description TEXT,
-                    deadline TIMESTAMP WITHOUT TIME ZONE NOT NULL,
-                    status TEXT DEFAULT 'активно',
-                    comment TEXT,
-                    created_at TIMESTAMP DEFAULT NOW()
-                )
+                ALTER TABLE tasks ADD COLUMN next_reminder_at TIMESTAMP WITHOUT TIME ZONE
             """)
-            
-            # Создание индексов для оптимизации
             await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_projects_user_id ON projects(user_id)
-            """)
+                UPDATE tasks
+                SET next_reminder_at = deadline - $1::interval
+                WHERE status = 'активно' AND deadline > NOW()
+            """, REMINDER_OFFSETS[0])
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tasks_next_reminder_at
+            ON tasks(next_reminder_at) WHERE next_reminder_at IS NOT NULL
+        """)
+        # Аренда наступившего напоминания репликой, которая его отправляет
+        if not await self._has_column(conn, "tasks", "reminder_locked_until"):
             await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_tasks_project_id ON tasks(project_id)
+                ALTER TABLE tasks
+                ADD COLUMN IF NOT EXISTS reminder_locked_by TEXT,
+                ADD COLUMN IF NOT EXISTS reminder_locked_until TIMESTAMP WITHOUT TIME ZONE
+            """)
+
+        # Полнотекстовый поиск: вектор задачи хранится в генерируемом столбце
+        # (название важнее описания, описание - комментария), по названию
+        # проекта строится индекс по выражению
+        if not await self._has_column(conn, "tasks", "search_vector"):
+            await conn.execute(f"""
+                ALTER TABLE tasks
+                ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') ||
+                    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B') ||
+                    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(comment, '')), 'C')
+                ) STORED
             """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tasks_search ON tasks USING GIN (search_vector)
+        """)
+        await conn.execute("DROP INDEX IF EXISTS idx_projects_name_search")
+        await conn.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_projects_name_search_active
+            ON projects USING GIN (to_tsvector('{SEARCH_CONFIG}', name))
+            WHERE deleted_at IS NULL
+        """)
+
+        # Время завершения задачи: по нему завершенные уходят в архив
+        if not await self._has_column(conn, "tasks", "completed_at"):
             await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)
+                ALTER TABLE tasks ADD COLUMN completed_at TIMESTAMP WITHOUT TIME ZONE
             """)
+            # Задачам, завершенным до появления столбца, отсчет идет с момента миграции
             await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_tasks_deadline ON tasks(deadline)
+                UPDATE tasks SET completed_at = NOW()
+                WHERE status = 'завершено'
             """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tasks_completed_at
+            ON tasks(completed_at) WHERE status = 'завершено'
+        """)
+        # Архив завершенных задач; секции по месяцам создает archive_completed_tasks
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks_archive (
+                id INTEGER NOT NULL,
+                project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+                title TEXT NOT NULL,
+                description TEXT,
+                deadline TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                status TEXT NOT NULL,
+                comment TEXT,
+                created_at TIMESTAMP,
+                completed_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                archived_at TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (id, completed_at)
+            ) PARTITION BY RANGE (completed_at)
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tasks_archive_project
+            ON tasks_archive(project_id, completed_at DESC, id DESC)
+        """)
+
+        # Настройки напоминаний; digest_next_at заполнено только в режиме сводки
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_settings (
+                user_id BIGINT PRIMARY KEY,
+                reminder_mode TEXT NOT NULL DEFAULT 'tasks',
+                digest_time TIME NOT NULL DEFAULT '09:00',
+                digest_next_at TIMESTAMP WITHOUT TIME ZONE,
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_user_settings_digest_next_at
+            ON user_settings(digest_next_at) WHERE digest_next_at IS NOT NULL
+        """)
+
+        # Лента изменений: триггеры публикуют компактные события в
+        # CHANGE_FEED_CHANNEL, origin - метка процесса, сделавшего запись
+        await self._ensure_change_feed_triggers(conn)
+
+        # Состояния FSM (см. storage.PostgresStorage)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data JSONB NOT NULL DEFAULT '{}',
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states(updated_at)
+        """)
+
+        # Обработанные update_id для отсева повторных доставок вебхука
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS processed_updates (
+                update_id BIGINT PRIMARY KEY,
+                created_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_processed_updates_created_at
+            ON processed_updates(created_at)
+        """)
     
     # Методы для работы с проектами
     async def create_project(self, user_id: int, name: str, description: Optional[str] = None) -> int:
         """Создание нового проекта"""
-        async with self.pool.acquire() as conn:
+        async with self.acquire("create_project") as conn:
             project_id = await conn.fetchval("""
                 INSERT INTO projects (user_id, name, description)
                 VALUES ($1, $2, $3)
                 RETURNING id
             """, user_id, name, description)
+            self.cache.invalidate(user_id, "projects", "projects_stats")
             return project_id
     
     async def get_user_projects(self, user_id: int) -> List[Dict[str, Any]]:
         """Получение всех проектов пользователя"""
-        async with self.pool.acquire() as conn:
+        cached = self.cache.get(user_id, "projects")
+        if cached is not None:
+            return [dict(project) for project in cached]
+        async with self.acquire("get_user_projects") as conn:
             rows = await conn.fetch("""
                 SELECT id, name, description
                 FROM projects
-                WHERE user_id = $1
+                WHERE user_id = $1 AND deleted_at IS NULL
                 ORDER BY created_at DESC
             """, user_id)
-            return [dict(row) for row in rows]
-    
+        projects = [dict(row) for row in rows]
+        self.cache.put(user_id, "projects", projects)
+        return [dict(project) for project in projects]
+
+    async def get_user_projects_with_stats(self, user_id: int, after: Optional[str] = None,
+                                           limit: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Страница проектов пользователя со счетчиками задач и курсор следующей страницы"""
+        if after is None:
+            cached = self.cache.get(user_id, "projects_stats")
+            if cached is not None:
+                return [dict(project) for project in cached[0]], cached[1]
+
+        cursor_filter = ""
+        args: List[Any] = [user_id, limit + 1]
+        if after is not None:
+            cursor_filter = "AND (created_at, id) < ($3, $4)"
+            args.extend(decode_page_cursor(after))
+
+        async with self.acquire("get_user_projects_with_stats") as conn:
+            # Сначала страница проектов по индексу, затем счетчики только для нее
+            rows = await conn.fetch(f"""
+                SELECT p.id, p.name, p.description, p.created_at,
+                       COUNT(t.id) AS total_tasks,
+                       COUNT(t.id) FILTER (WHERE t.status = 'активно') AS active_tasks,
+                       COUNT(t.id) FILTER (
+                           WHERE t.status = 'активно' AND t.deadline < NOW()
+                       ) AS overdue_tasks
+                FROM (
+                    SELECT id, name, description, created_at
+                    FROM projects
+                    WHERE user_id = $1 AND deleted_at IS NULL {cursor_filter}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT $2
+                ) p
+                LEFT JOIN tasks t ON t.project_id = p.id
+                GROUP BY p.id, p.name, p.description, p.created_at
+                ORDER BY p.created_at DESC, p.id DESC
+            """, *args)
+        projects, next_cursor = _split_page(rows, limit, "created_at")
+        if after is None:
+            self.cache.put(user_id, "projects_stats", (projects, next_cursor))
+        return [dict(project) for project in projects], next_cursor
+
     async def get_project(self, project_id: int, user_id: int) -> Optional[Dict[str, Any]]:
         """Получение проекта по ID с проверкой пользователя"""
-        async with self.pool.acquire() as conn:
+        cache_key = f"project:{project_id}"
+        cached = self.cache.get(user_id, cache_key)
+        if cached is not None:
+            return dict(cached)
+        async with self.acquire("get_project") as conn:
             row = await conn.fetchrow("""
                 SELECT id, name, description
                 FROM projects
-                WHERE id = $1 AND user_id = $2
+                WHERE id = $1 AND user_id = $2 AND deleted_at IS NULL
             """, project_id, user_id)
-            return dict(row) if row else None
+        if not row:
+            return None
+        self.cache.put(user_id, cache_key, dict(row))
+        return dict(row)
     
     async def update_project(self, project_id: int, user_id: int, name: str, description: Optional[str] = None) -> bool:
         """Обновление проекта"""
-        async with self.pool.acquire() as conn:
+        async with self.acquire("update_project") as conn:
             result = await conn.execute("""
                 UPDATE projects
                 SET name = $1, description = $2
-                WHERE id = $3 AND user_id = $4
+                WHERE id = $3 AND user_id = $4 AND deleted_at IS NULL
             """, name, description, project_id, user_id)
-            return "UPDATE 1" in result
+            if "UPDATE 1" not in result:
+                return False
+            self.cache.invalidate(user_id, f"project:{project_id}", "projects", "projects_stats")
+            return True
     
     async def delete_project(self, project_id: int, user_id: int) -> bool:
-        """Удаление проекта"""
-        async with self.pool.acquire() as conn:
+        """Удаление проекта.
+
+        Проект только помечается удаленным и сразу пропадает из всех выборок;
+        сами строки пачками удаляет фоновый purge_deleted_projects.
+        """
+        async with self.acquire("delete_project") as conn:
             result = await conn.execute("""
-                DELETE FROM projects
-                WHERE id = $1 AND user_id = $2
+                UPDATE projects
+                SET deleted_at = NOW()
+                WHERE id = $1 AND user_id = $2 AND deleted_at IS NULL
             """, project_id, user_id)
-            return "DELETE 1" in result
+            if "UPDATE 1" not in result:
+                return False
+            # Вместе с проектом скрыты его задачи - сбрасываем все записи пользователя
+            self.cache.invalidate(user_id)
+            return True
+
+    async def purge_deleted_projects(self, limit: int = PURGE_BATCH) -> int:
+        """Один шаг очистки удаленных проектов; возвращает число удаленных задач.
+
+        Удаляет не больше limit задач, сначала текущих, затем архивных; когда
+        задач у удаленных проектов не осталось, удаляет и сами проекты.
+        Строки, которые чистит другая реплика, пропускаются (SKIP LOCKED).
+        """
+        async with self.acquire("purge_deleted_projects") as conn:
+            rows = await conn.fetch("""
+                WITH doomed AS (
+                    SELECT id
+                    FROM tasks
+                    WHERE project_id IN (SELECT id FROM projects WHERE deleted_at IS NOT NULL)
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                DELETE FROM tasks t
+                USING doomed
+                WHERE t.id = doomed.id
+                RETURNING t.id
+            """, limit)
+            archived = 0
+            if len(rows) < limit:
+                archived = await conn.fetchval("""
+                    WITH doomed AS (
+                        SELECT id, completed_at
+                        FROM tasks_archive
+                        WHERE project_id IN (SELECT id FROM projects WHERE deleted_at IS NOT NULL)
+                        LIMIT $1
+                        FOR UPDATE SKIP LOCKED
+                    ), deleted AS (
+                        DELETE FROM tasks_archive a
+                        USING doomed
+                        WHERE a.id = doomed.id AND a.completed_at = doomed.completed_at
+                        RETURNING a.id
+                    )
+                    SELECT COUNT(*) FROM deleted
+                """, limit - len(rows))
+            if len(rows) + archived < limit:
+                # Задачи, добавленные в проект после пометки, удалит каскад
+                await conn.execute("""
+                    DELETE FROM projects p
+                    WHERE p.deleted_at IS NOT NULL
+                    AND NOT EXISTS (SELECT 1 FROM tasks t WHERE t.project_id = p.id)
+                    AND NOT EXISTS (SELECT 1 FROM tasks_archive a WHERE a.project_id = p.id)
+                """)
+        for row in rows:
+            self._notify_task_changed(row['id'], None)
+        return len(rows) + archived
     
     # Методы для работы с задачами
+    def _invalidate_task(self, user_id: int, task_id: int, project_id: int):
+        """Сброс кэша задачи, списка задач ее проекта и счетчиков проектов"""
+        self.cache.invalidate(user_id, f"task:{task_id}", f"tasks:{project_id}", "projects_stats")
+
+    def _store_updated_task(self, user_id: int, row: asyncpg.Record) -> Dict[str, Any]:
+        """Сброс кэша после изменения задачи и сохранение ее новой версии"""
+        task = {column: row[column] for column in TASK_COLUMN_NAMES}
+        self._invalidate_task(user_id, task['id'], task['project_id'])
+        self.cache.put(user_id, f"task:{task['id']}", task)
+        return dict(task)
+
     async def create_task(self, project_id: int, title: str, description: Optional[str],
                          deadline: datetime, comment: Optional[str] = None) -> int:
         """Создание новой задачи"""
-        async with self.pool.acquire() as conn:
-            task_id = await conn.fetchval("""
-                INSERT INTO tasks (project_id, title, description, deadline, comment)
-                VALUES ($1, $2, $3, $4, $5)
-                RETURNING id
-            """, project_id, title, description, deadline, comment)
-            return task_id
+        async with self.acquire("create_task") as conn:
+            row = await conn.fetchrow("""
+                INSERT INTO tasks (project_id, title, description, deadline, comment, next_reminder_at)
+                VALUES ($1, $2, $3, $4::timestamp, $5,
+                        CASE WHEN $4::timestamp > NOW() THEN $4::timestamp - $6::interval END)
+                RETURNING id, next_reminder_at,
+                          (SELECT user_id FROM projects WHERE id = $1) AS user_id
+            """, project_id, title, description, deadline, comment, REMINDER_OFFSETS[0])
+            self.cache.invalidate(row['user_id'], f"tasks:{project_id}", "projects_stats")
+        self._notify_task_changed(row['id'], row['next_reminder_at'])
+        return row['id']
     
+    async def create_tasks_bulk(self, project_id: int, user_id: int,
+                                tasks: List[Dict[str, Any]]) -> List[int]:
+        """Создание многих задач проекта одним запросом с проверкой владельца.
+
+        tasks - словари title, deadline, description. Все задачи вставляются
+        одной командой (атомарно); если проект не принадлежит пользователю,
+        ничего не создается и возвращается пустой список.
+        """
+        if not tasks:
+            return []
+        async with self.acquire("create_tasks_bulk") as conn:
+            rows = await conn.fetch("""
+                INSERT INTO tasks (project_id, title, description, deadline, next_reminder_at)
+                SELECT p.id, x.title, x.description, x.deadline,
+                       CASE WHEN x.deadline > NOW() THEN x.deadline - $6::interval END
+                FROM projects p,
+                     unnest($3::text[], $4::text[], $5::timestamp[]) AS x(title, description, deadline)
+                WHERE p.id = $1 AND p.user_id = $2 AND p.deleted_at IS NULL
+                RETURNING id, next_reminder_at
+            """, project_id, user_id,
+                [task['title'] for task in tasks],
+                [task.get('description') for task in tasks],
+                [task['deadline'] for task in tasks],
+                REMINDER_OFFSETS[0])
+            if rows:
+                self.cache.invalidate(user_id, f"tasks:{project_id}", "projects_stats")
+        for row in rows:
+            self._notify_task_changed(row['id'], row['next_reminder_at'])
+        return [row['id'] for row in rows]
+
     async def get_project_tasks(self, project_id: int, user_id: int) -> List[Dict[str, Any]]:
         """Получение всех задач проекта с проверкой владельца"""
-        async with self.pool.acquire() as conn:
+        async with self.acquire("get_project_tasks") as conn:
             rows = await conn.fetch("""
                 SELECT t.id, t.title, t.description, t.deadline, t.status, t.comment
                 FROM tasks t
                 JOIN projects p ON t.project_id = p.id
-                WHERE t.project_id = $1 AND p.user_id = $2
+                WHERE t.project_id = $1 AND p.user_id = $2 AND p.deleted_at IS NULL
                 ORDER BY t.deadline ASC
             """, project_id, user_id)
             return [dict(row) for row in rows]
+
+    async def get_project_tasks_page(self, project_id: int, user_id: int, after: Optional[str] = None,
+                                     limit: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Страница задач проекта по (deadline, id) и курсор следующей страницы"""
+        cache_key = f"tasks:{project_id}"
+        if after is None:
+            cached = self.cache.get(user_id, cache_key)
+            if cached is not None:
+                return [dict(task) for task in cached[0]], cached[1]
+
+        cursor_filter = ""
+        args: List[Any] = [project_id, user_id, limit + 1]
+        if after is not None:
+            cursor_filter = "AND (t.deadline, t.id) > ($4, $5)"
+            args.extend(decode_page_cursor(after))
+
+        async with self.acquire("get_project_tasks_page") as conn:
+            rows = await conn.fetch(f"""
+                SELECT t.id, t.title, t.description, t.deadline, t.status, t.comment
+                FROM tasks t
+                JOIN projects p ON t.project_id = p.id
+                WHERE t.project_id = $1 AND p.user_id = $2 AND p.deleted_at IS NULL {cursor_filter}
+                ORDER BY t.deadline, t.id
+                LIMIT $3
+            """, *args)
+        tasks, next_cursor = _split_page(rows, limit, "deadline")
+        if after is None:
+            self.cache.put(user_id, cache_key, (tasks, next_cursor))
+        return [dict(task) for task in tasks], next_cursor
     
+    async def search_tasks(self, user_id: int, query: str, page: int = 0,
+                           limit: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Поиск задач пользователя по тексту задачи и названию проекта.
+
+        Запрос в свободной форме (слова, "фраза", -исключение). Результаты
+        упорядочены по релевантности; возвращает страницу и номер следующей.
+        """
+        # Совпадений у одного пользователя немного, поэтому страницы по смещению:
+        # курсор по релевантности неудобен, а OFFSET здесь дешев.
+        # Совпадения по задаче и по названию проекта ищутся отдельными
+        # запросами и объединяются: условие "вектор задачи ИЛИ название
+        # проекта" по двум таблицам не может использовать ни один из индексов
+        async with self.acquire("search_tasks") as conn:
+            rows = await conn.fetch(f"""
+                SELECT t.id, t.project_id, p.name AS project_name, t.title,
+                       t.deadline, t.status,
+                       ts_rank(t.search_vector, q) +
+                       ts_rank(to_tsvector('{SEARCH_CONFIG}', p.name), q) * 0.5 AS rank
+                FROM websearch_to_tsquery('{SEARCH_CONFIG}', $2) AS q,
+                     tasks t
+                JOIN projects p ON p.id = t.project_id
+                WHERE p.user_id = $1 AND p.deleted_at IS NULL
+                AND t.search_vector @@ q
+                UNION
+                SELECT t.id, t.project_id, p.name AS project_name, t.title,
+                       t.deadline, t.status,
+                       ts_rank(t.search_vector, q) +
+                       ts_rank(to_tsvector('{SEARCH_CONFIG}', p.name), q) * 0.5 AS rank
+                FROM websearch_to_tsquery('{SEARCH_CONFIG}', $2) AS q,
+                     projects p
+                JOIN tasks t ON t.project_id = p.id
+                WHERE p.user_id = $1 AND p.deleted_at IS NULL
+                AND to_tsvector('{SEARCH_CONFIG}', p.name) @@ q
+                ORDER BY rank DESC, deadline, id
+                LIMIT $3 OFFSET $4
+            """, user_id, query, limit + 1, page * limit)
+        tasks = [dict(row) for row in rows[:limit]]
+        return tasks, page + 1 if len(rows) > limit else None
+
     async def get_task(self, task_id: int, user_id: int) -> Optional[Dict[str, Any]]:
         """Получение задачи по ID с проверкой пользователя"""
-        async with self.pool.acquire() as conn:
+        cache_key = f"task:{task_id}"
+        cached = self.cache.get(user_id, cache_key)
+        if cached is not None:
+            return dict(cached)
+        async with self.acquire("get_task") as conn:
             row = await conn.fetchrow("""
                 SELECT t.id, t.project_id, t.title, t.description, 
                        t.deadline, t.status, t.comment
                 FROM tasks t
                 JOIN projects p ON t.project_id = p.id
-                WHERE t.id = $1 AND p.user_id = $2
+                WHERE t.id = $1 AND p.user_id = $2 AND p.deleted_at IS NULL
             """, task_id, user_id)
-            return dict(row) if row else None
+        if not row:
+            return None
+        self.cache.put(user_id, cache_key, dict(row))
+        return dict(row)
     
-    async def update_task_status(self, task_id: int, user_id: int, status: str) -> bool:
-        """Обновление статуса задачи"""
-        async with self.pool.acquire() as conn:
-            result = await conn.execute("""
+    async def update_task_status(self, task_id: int, user_id: int, status: str) -> Optional[Dict[str, Any]]:
+        """Обновление статуса задачи; возвращает обновленную задачу"""
+        # Повторная активация задачи заново включает напоминания
+        async with self.acquire("update_task_status") as conn:
+            row = await conn.fetchrow(f"""
                 UPDATE tasks
-                SET status = $1
+                SET status = $1,
+                    next_reminder_at = CASE
+                        WHEN $1 = 'активно' AND deadline > NOW() THEN deadline - $4::interval
+                    END,
+                    completed_at = CASE WHEN $1 = 'завершено' THEN COALESCE(completed_at, NOW()) END,
+                    reminder_locked_by = NULL,
+                    reminder_locked_until = NULL
                 WHERE id = $2 AND project_id IN (
-                    SELECT id FROM projects WHERE user_id = $3
+                    SELECT id FROM projects WHERE user_id = $3 AND deleted_at IS NULL
                 )
-            """, status, task_id, user_id)
-            return "UPDATE 1" in result
+                RETURNING {TASK_COLUMNS}, next_reminder_at
+            """, status, task_id, user_id, REMINDER_OFFSETS[0])
+            if row is None:
+                return None
+            task = self._store_updated_task(user_id, row)
+        self._notify_task_changed(task_id, row['next_reminder_at'])
+        return task
     
-    async def update_task_deadline(self, task_id: int, user_id: int, deadline: datetime) -> bool:
-        """Обновление дедлайна задачи"""
-        async with self.pool.acquire() as conn:
-            result = await conn.execute("""
+    async def update_task_deadline(self, task_id: int, user_id: int, deadline: datetime) -> Optional[Dict[str, Any]]:
+        """Обновление дедлайна задачи; возвращает обновленную задачу"""
+        # Перенос дедлайна сбрасывает уже отправленные напоминания
+        async with self.acquire("update_task_deadline") as conn:
+            row = await conn.fetchrow(f"""
                 UPDATE tasks
-                SET deadline = $1
+                SET deadline = $1::timestamp,
+                    next_reminder_at = CASE
+                        WHEN status = 'активно' AND $1::timestamp > NOW() THEN $1::timestamp - $4::interval
+                    END,
+                    reminder_locked_by = NULL,
+                    reminder_locked_until = NULL
                 WHERE id = $2 AND project_id IN (
-                    SELECT id FROM projects WHERE user_id = $3
+                    SELECT id FROM projects WHERE user_id = $3 AND deleted_at IS NULL
                 )
-            """, deadline, task_id, user_id)
-            return "UPDATE 1" in result
+                RETURNING {TASK_COLUMNS}, next_reminder_at
+            """, deadline, task_id, user_id, REMINDER_OFFSETS[0])
+            if row is None:
+                return None
+            task = self._store_updated_task(user_id, row)
+        self._notify_task_changed(task_id, row['next_reminder_at'])
+        return task
     
-    async def update_task_comment(self, task_id: int, user_id: int, comment: str) -> bool:
-        """Обновление комментария задачи"""
-        async with self.pool.acquire() as conn:
-            result = await conn.execute("""
+    async def update_task_comment(self, task_id: int, user_id: int, comment: str) -> Optional[Dict[str, Any]]:
+        """Обновление комментария задачи; возвращает обновленную задачу"""
+        async with self.acquire("update_task_comment") as conn:
+            row = await conn.fetchrow(f"""
                 UPDATE tasks
                 SET comment = $1
                 WHERE id = $2 AND project_id IN (
-                    SELECT id FROM projects WHERE user_id = $3
+                    SELECT id FROM projects WHERE user_id = $3 AND deleted_at IS NULL
                 )
+                RETURNING {TASK_COLUMNS}
             """, comment, task_id, user_id)
-            return "UPDATE 1" in result
+            if row is None:
+                return None
+            return self._store_updated_task(user_id, row)
     
     async def delete_task(self, task_id: int, user_id: int) -> bool:
         """Удаление задачи"""
-        async with self.pool.acquire() as conn:
-            result = await conn.execute("""
+        async with self.acquire("delete_task") as conn:
+            project_id = await conn.fetchval("""
                 DELETE FROM tasks
                 WHERE id = $1 AND project_id IN (
-                    SELECT id FROM projects WHERE user_id = $2
+                    SELECT id FROM projects WHERE user_id = $2 AND deleted_at IS NULL
                 )
+                RETURNING project_id
             """, task_id, user_id)
-            return "DELETE 1" in result
+            if project_id is None:
+                return False
+            self._invalidate_task(user_id, task_id, project_id)
+        self._notify_task_changed(task_id, None)
+        return True
     
+    async def iter_user_export(self, user_id: int) -> AsyncIterator[Dict[str, Any]]:
+        """Все проекты и задачи пользователя построчно, через курсор на сервере.
+
+        В памяти одновременно не больше EXPORT_PREFETCH строк; архивные задачи
+        выгружаются вместе с текущими, проекты без задач выдаются одной строкой
+        с пустыми полями задачи.
+        """
+        async with self.acquire("iter_user_export") as conn:
+            # Курсор на сервере живет только внутри транзакции
+            async with conn.transaction():
+                async for row in conn.cursor("""
+                    SELECT p.id AS project_id, p.name AS project_name,
+                           p.description AS project_description,
+                           t.id AS task_id, t.title, t.description, t.deadline,
+                           t.status, t.comment, t.created_at
+                    FROM projects p
+                    LEFT JOIN (
+                        SELECT project_id, id, title, description, deadline, status, comment, created_at
+                        FROM tasks
+                        UNION ALL
+                        SELECT project_id, id, title, description, deadline, status, comment, created_at
+                        FROM tasks_archive
+                    ) t ON t.project_id = p.id
+                    WHERE p.user_id = $1 AND p.deleted_at IS NULL
+                    ORDER BY p.created_at, p.id, t.deadline, t.id
+                """, user_id, prefetch=EXPORT_PREFETCH):
+                    yield dict(row)
+
+    # Архив завершенных задач
+    async def _ensure_archive_partitions(self, conn: InstrumentedConnection,
+                                         first: datetime, last: datetime) -> List[str]:
+        """Создание месячных секций tasks_archive с first по last включительно.
+
+        Возвращает имена секций; запомнить их можно только после фиксации
+        транзакции, в которой они созданы.
+        """
+        names = []
+        month = first.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        while month <= last:
+            next_month = (month + timedelta(days=32)).replace(day=1)
+            name = f"tasks_archive_{month:%Y%m}"
+            if name not in self._archive_partitions:
+                try:
+                    # Точка сохранения: ошибка не прерывает транзакцию переноса
+                    async with conn.transaction():
+                        await conn.execute(f"""
+                            CREATE TABLE IF NOT EXISTS {name} PARTITION OF tasks_archive
+                            FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')
+                        """)
+                except (asyncpg.DuplicateTableError, asyncpg.UniqueViolationError):
+                    # Ту же секцию одновременно создала другая реплика
+                    pass
+                names.append(name)
+            month = next_month
+        return names
+
+    async def archive_completed_tasks(self, limit: int = ARCHIVE_BATCH) -> int:
+        """Перенос пачки давно завершенных задач в архив; возвращает число перенесенных"""
+        async with self.acquire("archive_completed_tasks") as conn:
+            async with conn.transaction():
+                # Сначала пачка блокируется, и секции создаются ровно под ее строки
+                batch = await conn.fetch("""
+                    SELECT id, completed_at
+                    FROM tasks
+                    WHERE status = 'завершено' AND completed_at < NOW() - $1::interval
+                    ORDER BY completed_at
+                    LIMIT $2
+                    FOR UPDATE SKIP LOCKED
+                """, ARCHIVE_AFTER, limit)
+                if not batch:
+                    return 0
+                completed = [row['completed_at'] for row in batch]
+                partitions = await self._ensure_archive_partitions(conn, min(completed), max(completed))
+                # Удаление и вставка в одном запросе: задача не теряется и не двоится
+                rows = await conn.fetch("""
+                    WITH moved AS (
+                        DELETE FROM tasks
+                        WHERE id = ANY($1::int[])
+                        RETURNING id, project_id, title, description, deadline, status,
+                                  comment, created_at, completed_at
+                    ), archived AS (
+                        INSERT INTO tasks_archive (id, project_id, title, description, deadline,
+                                                   status, comment, created_at, completed_at)
+                        SELECT id, project_id, title, description, deadline,
+                               status, comment, created_at, completed_at
+                        FROM moved
+                        RETURNING id, project_id
+                    )
+                    SELECT a.id, a.project_id, p.user_id
+                    FROM archived a
+                    JOIN projects p ON p.id = a.project_id
+                """, [row['id'] for row in batch])
+        self._archive_partitions.update(partitions)
+        for row in rows:
+            self._invalidate_task(row['user_id'], row['id'], row['project_id'])
+        return len(rows)
+
+    async def get_project_archive_page(self, project_id: int, user_id: int, after: Optional[str] = None,
+                                       limit: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Страница архива проекта, от недавно завершенных, и курсор следующей страницы"""
+        cursor_filter = ""
+        args: List[Any] = [project_id, user_id, limit + 1]
+        if after is not None:
+            cursor_filter = "AND (a.completed_at, a.id) < ($4, $5)"
+            args.extend(decode_page_cursor(after))
+
+        async with self.acquire("get_project_archive_page") as conn:
+            rows = await conn.fetch(f"""
+                SELECT a.id, a.title, a.deadline, a.comment, a.completed_at
+                FROM tasks_archive a
+                JOIN projects p ON a.project_id = p.id
+                WHERE a.project_id = $1 AND p.user_id = $2 AND p.deleted_at IS NULL {cursor_filter}
+                ORDER BY a.completed_at DESC, a.id DESC
+                LIMIT $3
+            """, *args)
+        return _split_page(rows, limit, "completed_at")
+
+    # Групповые действия: один запрос на любое число задач
+    def _apply_bulk_change(self, user_id: int, rows: List[asyncpg.Record]):
+        """Сброс кэша и оповещение планировщика по измененным задачам"""
+        for row in rows:
+            self._invalidate_task(user_id, row['id'], row['project_id'])
+            self._notify_task_changed(row['id'], row['next_reminder_at'])
+
+    async def complete_tasks(self, user_id: int, task_ids: Optional[List[int]] = None,
+                             project_id: Optional[int] = None, overdue: bool = False) -> int:
+        """Завершение выбранных задач; возвращает число завершенных"""
+        where, args = _task_selection(user_id, task_ids, project_id, overdue)
+        async with self.acquire("complete_tasks") as conn:
+            rows = await conn.fetch(f"""
+                UPDATE tasks
+                SET status = 'завершено',
+                    completed_at = NOW(),
+                    next_reminder_at = NULL,
+                    reminder_locked_by = NULL,
+                    reminder_locked_until = NULL
+                WHERE {where} AND status <> 'завершено'
+                RETURNING id, project_id, next_reminder_at
+            """, *args)
+        self._apply_bulk_change(user_id, rows)
+        return len(rows)
+
+    async def shift_task_deadlines(self, user_id: int, shift: timedelta,
+                                   task_ids: Optional[List[int]] = None,
+                                   project_id: Optional[int] = None, overdue: bool = False) -> int:
+        """Перенос дедлайнов выбранных задач на shift; возвращает число перенесенных"""
+        where, args = _task_selection(user_id, task_ids, project_id, overdue)
+        shift_arg = len(args) + 1
+        offset_arg = len(args) + 2
+        async with self.acquire("shift_task_deadlines") as conn:
+            # Как и при переносе одной задачи, напоминания начинаются заново
+            rows = await conn.fetch(f"""
+                UPDATE tasks
+                SET deadline = deadline + ${shift_arg}::interval,
+                    next_reminder_at = CASE
+                        WHEN status = 'активно' AND deadline + ${shift_arg}::interval > NOW()
+                        THEN deadline + ${shift_arg}::interval - ${offset_arg}::interval
+                    END,
+                    reminder_locked_by = NULL,
+                    reminder_locked_until = NULL
+                WHERE {where}
+                RETURNING id, project_id, next_reminder_at
+            """, *args, shift, REMINDER_OFFSETS[0])
+        self._apply_bulk_change(user_id, rows)
+        return len(rows)
+
+    async def delete_tasks(self, user_id: int, task_ids: Optional[List[int]] = None,
+                           project_id: Optional[int] = None, overdue: bool = False) -> int:
+        """Удаление выбранных задач; возвращает число удаленных"""
+        where, args = _task_selection(user_id, task_ids, project_id, overdue)
+        async with self.acquire("delete_tasks") as conn:
+            rows = await conn.fetch(f"""
+                DELETE FROM tasks
+                WHERE {where}
+                RETURNING id, project_id, NULL::timestamp AS next_reminder_at
+            """, *args)
+        self._apply_bulk_change(user_id, rows)
+        return len(rows)
+
     # Методы для напоминаний
     async def get_upcoming_tasks(self) -> List[Dict[str, Any]]:
         """Получение задач с дедлайном в ближайшие 24 часа"""
-        async with self.pool.acquire() as conn:
+        async with self.acquire("get_upcoming_tasks") as conn:
             rows = await conn.fetch("""
                 SELECT t.id, t.title, t.deadline, p.user_id
                 FROM tasks t
                 JOIN projects p ON t.project_id = p.id
                 WHERE t.status = 'активно'
+                AND p.deleted_at IS NULL
                 AND t.deadline > NOW()
                 AND t.deadline <= NOW() + INTERVAL '24 hours'
             """)
             return [dict(row) for row in rows]
-    
+
+    async def get_pending_reminders(self, until: datetime) -> List[Dict[str, Any]]:
+        """Получение задач, следующее напоминание по которым наступит до until"""
+        async with self.acquire("get_pending_reminders") as conn:
+            rows = await conn.fetch("""
+                SELECT t.id, t.next_reminder_at
+                FROM tasks t
+                JOIN projects p ON t.project_id = p.id
+                WHERE t.next_reminder_at IS NOT NULL
+                AND t.next_reminder_at <= $1
+                AND p.deleted_at IS NULL
+            """, until)
+            return [dict(row) for row in rows]
+
+    async def claim_due_reminders(self, limit: int = REMINDER_CLAIM_BATCH) -> List[Dict[str, Any]]:
+        """Аренда пачки наступивших напоминаний этим процессом.
+
+        Строки, которые в этот момент захватывает другая реплика, пропускаются
+        (SKIP LOCKED), а уже арендованные ею - до истечения аренды. После
+        отправки пачку нужно подтвердить complete_reminders.
+        """
+        async with self.acquire("claim_due_reminders") as conn:
+            rows = await conn.fetch("""
+                WITH due AS (
+                    SELECT t.id
+                    FROM tasks t
+                    JOIN projects p ON t.project_id = p.id
+                    WHERE t.next_reminder_at IS NOT NULL
+                    AND t.next_reminder_at <= NOW()
+                    AND t.status = 'активно'
+                    AND (t.reminder_locked_until IS NULL OR t.reminder_locked_until < NOW())
+                    AND p.deleted_at IS NULL
+                    ORDER BY t.next_reminder_at
+                    LIMIT $1
+                    FOR UPDATE OF t SKIP LOCKED
+                )
+                UPDATE tasks t
+                SET reminder_locked_by = $2,
+                    reminder_locked_until = NOW() + $3::interval
+                FROM due, projects p
+                WHERE t.id = due.id AND p.id = t.project_id
+                RETURNING t.id, t.title, t.deadline, t.next_reminder_at, p.user_id,
+                          COALESCE(
+                              (SELECT reminder_mode FROM user_settings WHERE user_id = p.user_id),
+                              'tasks'
+                          ) AS reminder_mode
+            """, limit, self._instance_id, REMINDER_LEASE)
+            return [dict(row) for row in rows]
+
+    async def complete_reminders(self, task_ids: List[int]) -> List[Dict[str, Any]]:
+        """Подтверждение отправки: перевод задач к следующему сроку и снятие аренды.
+
+        Задачи, аренду которых этот процесс потерял (истекла и перехвачена или
+        сброшена изменением задачи), не трогаются.
+        """
+        async with self.acquire("complete_reminders") as conn:
+            rows = await conn.fetch("""
+                UPDATE tasks t
+                SET next_reminder_at = (
+                        SELECT MIN(t.deadline - o)
+                        FROM unnest($2::interval[]) AS o
+                        WHERE t.deadline - o > NOW()
+                    ),
+                    reminder_locked_by = NULL,
+                    reminder_locked_until = NULL
+                WHERE t.id = ANY($1::int[])
+                AND t.reminder_locked_by = $3
+                RETURNING t.id, t.next_reminder_at
+            """, task_ids, REMINDER_OFFSETS, self._instance_id)
+            return [dict(row) for row in rows]
+
+    async def renew_reminder_leases(self, task_ids: List[int]) -> int:
+        """Продление аренды еще не подтвержденных напоминаний этого процесса"""
+        async with self.acquire("renew_reminder_leases") as conn:
+            result = await conn.execute("""
+                UPDATE tasks
+                SET reminder_locked_until = NOW() + $3::interval
+                WHERE id = ANY($1::int[])
+                AND reminder_locked_by = $2
+            """, task_ids, self._instance_id, REMINDER_LEASE)
+        return int(result.rsplit(" ", 1)[-1])
+
+    async def get_reminder_lease_expiry(self) -> Optional[datetime]:
+        """Ближайшее истечение аренды наступивших напоминаний других процессов"""
+        async with self.acquire("get_reminder_lease_expiry") as conn:
+            return await conn.fetchval("""
+                SELECT MIN(reminder_locked_until)
+                FROM tasks
+                WHERE next_reminder_at IS NOT NULL
+                AND next_reminder_at <= NOW()
+                AND status = 'активно'
+                AND reminder_locked_until >= NOW()
+            """)
+
+    # Методы для настроек и ежедневных сводок
+    async def get_user_settings(self, user_id: int) -> Dict[str, Any]:
+        """Настройки напоминаний пользователя; значения по умолчанию, если он их не менял"""
+        cached = self.cache.get(user_id, "settings")
+        if cached is not None:
+            return dict(cached)
+        async with self.acquire("get_user_settings") as conn:
+            row = await conn.fetchrow("""
+                SELECT reminder_mode, digest_time
+                FROM user_settings
+                WHERE user_id = $1
+            """, user_id)
+        settings = dict(row) if row else {"reminder_mode": "tasks", "digest_time": DEFAULT_DIGEST_TIME}
+        self.cache.put(user_id, "settings", settings)
+        return dict(settings)
+
+    async def update_user_settings(self, user_id: int, reminder_mode: Optional[str] = None,
+                                   digest_time: Optional[dt_time] = None) -> Dict[str, Any]:
+        """Изменение режима напоминаний и времени сводки; возвращает новые настройки"""
+        settings = await self.get_user_settings(user_id)
+        if reminder_mode is not None:
+            if reminder_mode not in REMINDER_MODES:
+                raise ValueError(f"Неизвестный режим напоминаний: {reminder_mode}")
+            settings["reminder_mode"] = reminder_mode
+        if digest_time is not None:
+            settings["digest_time"] = digest_time
+        digest_at = None
+        if settings["reminder_mode"] == "digest":
+            digest_at = next_digest_at(settings["digest_time"])
+
+        async with self.acquire("update_user_settings") as conn:
+            await conn.execute("""
+                INSERT INTO user_settings (user_id, reminder_mode, digest_time, digest_next_at)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (user_id) DO UPDATE
+                SET reminder_mode = EXCLUDED.reminder_mode,
+                    digest_time = EXCLUDED.digest_time,
+                    digest_next_at = EXCLUDED.digest_next_at,
+                    updated_at = NOW()
+            """, user_id, settings["reminder_mode"], settings["digest_time"], digest_at)
+        self.cache.put(user_id, "settings", settings)
+        return dict(settings)
+
+    async def claim_due_digests(self, limit: int = DIGEST_CLAIM_BATCH) -> List[Dict[str, Any]]:
+        """Захват наступивших сводок и их задачи одним запросом.
+
+        Срок сводки переносится на следующий день в момент захвата, поэтому
+        каждая сводка достается одной реплике. Возвращает строки задач,
+        упорядоченные по пользователю и проекту; пользователи без задач на
+        ближайшие сутки в выборку не попадают.
+        """
+        async with self.acquire("claim_due_digests") as conn:
+            rows = await conn.fetch("""
+                WITH due AS (
+                    SELECT user_id
+                    FROM user_settings
+                    WHERE digest_next_at IS NOT NULL
+                    AND digest_next_at <= NOW()
+                    ORDER BY digest_next_at
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                ), claimed AS (
+                    -- Пропущенные дни (например, при простое бота) не наверстываются
+                    UPDATE user_settings s
+                    SET digest_next_at = s.digest_next_at + INTERVAL '1 day' * (
+                        FLOOR(EXTRACT(EPOCH FROM NOW() - s.digest_next_at) / 86400) + 1
+                    )
+                    FROM due
+                    WHERE s.user_id = due.user_id
+                    RETURNING s.user_id
+                )
+                SELECT c.user_id, p.id AS project_id, p.name AS project_name,
+                       t.id, t.title, t.deadline
+                FROM claimed c
+                JOIN projects p ON p.user_id = c.user_id AND p.deleted_at IS NULL
+                JOIN tasks t ON t.project_id = p.id
+                WHERE t.status = 'активно'
+                AND t.deadline <= NOW() + $2::interval
+                ORDER BY c.user_id, p.name, p.id, t.deadline, t.id
+            """, limit, DIGEST_HORIZON)
+            return [dict(row) for row in rows]
+
+    async def get_next_digest_at(self) -> Optional[datetime]:
+        """Время ближайшей сводки среди всех пользователей"""
+        async with self.acquire("get_next_digest_at") as conn:
+            return await conn.fetchval("""
+                SELECT MIN(digest_next_at) FROM user_settings
+            """)
+
+    # Методы для отсева повторных обновлений
+    async def mark_update_processed(self, update_id: int) -> bool:
+        """Отметка обновления как обработанного; False, если оно уже встречалось"""
+        async with self.acquire("mark_update_processed") as conn:
+            inserted = await conn.fetchval("""
+                INSERT INTO processed_updates (update_id)
+                VALUES ($1)
+                ON CONFLICT (update_id) DO NOTHING
+                RETURNING update_id
+            """, update_id)
+            return inserted is not None
+
+    async def forget_processed_update(self, update_id: int) -> None:
+        """Снятие отметки об обработке, чтобы повторная доставка была принята"""
+        async with self.acquire("forget_processed_update") as conn:
+            await conn.execute("""
+                DELETE FROM processed_updates WHERE update_id = $1
+            """, update_id)
+
+    async def purge_processed_updates(self, older_than: timedelta) -> None:
+        """Удаление старых отметок об обработанных обновлениях"""
+        async with self.acquire("purge_processed_updates") as conn:
+            await conn.execute("""
+                DELETE FROM processed_updates
+                WHERE created_at < NOW() - $1::interval
+            """, older_than)
+
     async def close(self):
         """Закрытие пула подключений"""
+        if self._feed_reconnect:
+            self._feed_reconnect.cancel()
+            self._feed_reconnect = None
+        if self._feed_connection:
+            conn, self._feed_connection = self._feed_connection, None
+            await conn.close()
+            self.cache.enabled = False
         if self.pool:
             await self.pool.close()
 
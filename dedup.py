@@ -0,0 +1,83 @@
+import logging
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict
+
+from db import db
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDeduplicator:
+    """Отсев повторно доставленных обновлений по update_id.
+
+    В памяти хранятся последние max_size идентификаторов, так что расход
+    памяти не растет под нагрузкой. При shared=True отметки дополнительно
+    пишутся в Postgres, чтобы повтор, пришедший на другой воркер, тоже
+    был отброшен.
+
+    is_new отмечает обновление до обработки, чтобы повтор, пришедший пока
+    оно еще обрабатывается, не выполнился второй раз. Окончательной отметка
+    становится только после успешной обработки: при ошибке вызывающий код
+    снимает ее через forget и отвечает Telegram ошибкой, и повторная
+    доставка будет обработана. Исключение - очередь обновлений
+    (WEBHOOK_WORKERS): Telegram получает ответ сразу после постановки в
+    очередь, поэтому обновление, упавшее в воркере, не повторяется; эта
+    потеря принята и видна в счетчике failed очереди.
+    """
+
+    # Telegram повторяет доставку не дольше суток
+    SHARED_TTL = timedelta(days=1)
+    PURGE_INTERVAL = 60 * 60
+
+    def __init__(self, max_size: int = 10000, shared: bool = False):
+        self.max_size = max_size
+        self.shared = shared
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._last_purge = time.monotonic()
+        self.duplicates = 0
+
+    async def is_new(self, update_id: int) -> bool:
+        """True, если обновление встречается впервые и его нужно обработать"""
+        if update_id in self._seen:
+            self._seen.move_to_end(update_id)
+            self.duplicates += 1
+            return False
+
+        self._seen[update_id] = None
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+
+        if self.shared:
+            try:
+                if not await db.mark_update_processed(update_id):
+                    self.duplicates += 1
+                    return False
+                await self._purge_if_needed()
+            except Exception as e:
+                # Без БД лучше обработать возможный дубль, чем потерять обновление
+                logger.error(f"Ошибка проверки повторного обновления: {e}")
+        return True
+
+    async def forget(self, update_id: int):
+        """Снятие отметки, если обновление не удалось принять в обработку"""
+        self._seen.pop(update_id, None)
+        if self.shared:
+            try:
+                await db.forget_processed_update(update_id)
+            except Exception as e:
+                logger.error(f"Ошибка снятия отметки обновления: {e}")
+
+    async def _purge_if_needed(self):
+        if time.monotonic() - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        await db.purge_processed_updates(self.SHARED_TTL)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Размер кэша и число отброшенных повторов"""
+        return {
+            "cached_ids": len(self._seen),
+            "duplicates": self.duplicates,
+        }
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Any
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+MESSAGES = Counter(
+    "bot_delivery_messages_total", "Сообщения рассылки по исходу (sent, failed, retried)", ("outcome",)
+)
+
+
+class TokenBucket:
+    """Ограничитель частоты: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Ожидание свободного токена"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def is_idle(self) -> bool:
+        """Корзина полна - ограничитель давно не использовался"""
+        self._refill()
+        return self._tokens >= self.capacity
+
+    def pause(self, seconds: float):
+        """Запрет отправки на seconds секунд (после ответа 429 от Telegram)"""
+        self._refill()
+        self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class MessageDelivery:
+    """Параллельная отправка сообщений с учетом лимитов Telegram"""
+
+    # Общий лимит Bot API - около 30 сообщений в секунду
+    GLOBAL_RATE = 30
+    # В один чат - не чаще одного сообщения в секунду
+    CHAT_RATE = 1
+    MAX_CONCURRENCY = 20
+    MAX_RETRIES = 3
+    # Окно, за которое считается текущая скорость отправки, в секундах
+    RATE_WINDOW = 60
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._global = TokenBucket(self.GLOBAL_RATE, self.GLOBAL_RATE)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+        # Время отправки сообщений за последние RATE_WINDOW секунд
+        self._recent: Deque[float] = deque()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.CHAT_RATE, 1)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def send_message(self, chat_id: int, text: str) -> bool:
+        """Отправка одного сообщения с ожиданием лимитов и повторами после 429"""
+        chat_bucket = self._chat_bucket(chat_id)
+        for attempt in range(self.MAX_RETRIES + 1):
+            # Очередь к лимиту чата ждется до занятия слота: сообщения одного
+            # чата не должны держать все слоты и тормозить остальные чаты
+            await chat_bucket.acquire()
+            async with self._semaphore:
+                await self._global.acquire()
+                try:
+                    await self.bot.send_message(chat_id=chat_id, text=text)
+                    self.sent += 1
+                    self._recent.append(time.monotonic())
+                    self._trim_recent()
+                    MESSAGES.inc("sent")
+                    return True
+                except TelegramRetryAfter as e:
+                    self.retried += 1
+                    MESSAGES.inc("retried")
+                    logger.warning(f"Превышен лимит Telegram, пауза {e.retry_after} с")
+                    self._global.pause(e.retry_after)
+                    chat_bucket.pause(e.retry_after)
+                except Exception as e:
+                    logger.error(f"Ошибка отправки сообщения пользователю {chat_id}: {e}")
+                    break
+        self.failed += 1
+        MESSAGES.inc("failed")
+        return False
+
+    def _trim_recent(self):
+        """Удаление отправок старше окна скорости"""
+        window_start = time.monotonic() - self.RATE_WINDOW
+        while self._recent and self._recent[0] < window_start:
+            self._recent.popleft()
+
+    async def send_many(self, messages: List[Dict[str, Any]]) -> int:
+        """Отправка пачки сообщений {chat_id, text}; возвращает число доставленных"""
+        results = await asyncio.gather(*(
+            self.send_message(message['chat_id'], message['text'])
+            for message in messages
+        ))
+        # Лимитеры чатов без активности больше не нужны
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.is_idle()]:
+            del self._chats[chat_id]
+        return sum(results)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Счетчики отправки и скорость за последние RATE_WINDOW секунд"""
+        self._trim_recent()
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "messages_per_second": round(len(self._recent) / self.RATE_WINDOW, 2),
+        }
@@ -0,0 +1,129 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict
+
+import aiofiles
+import aiofiles.os
+from aiogram import Bot
+from aiogram.types import FSInputFile
+
+from db import db
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("csv", "json")
+EXPORT_COLUMNS = [
+    "project_id", "project_name", "project_description",
+    "task_id", "title", "description", "deadline", "status", "comment", "created_at",
+]
+
+EXPORT_DURATION = Histogram("bot_export_duration_seconds", "Время подготовки выгрузки", ("format",))
+EXPORT_ROWS = Counter("bot_export_rows_total", "Строки, записанные в выгрузки", ("format",))
+EXPORT_ERRORS = Counter("bot_export_errors_total", "Выгрузки, завершившиеся ошибкой", ("format",))
+
+
+class ExportJobs:
+    """Фоновые выгрузки проектов и задач в файл с отправкой документом.
+
+    Строки идут из курсора БД в файл порциями, поэтому расход памяти не
+    зависит от объема данных. Выгрузка выполняется отдельной задачей и не
+    занимает обработчики обновлений; у пользователя одновременно не больше
+    одной выгрузки.
+    """
+
+    # Одновременные выгрузки держат по соединению из пула
+    MAX_CONCURRENCY = 2
+    # Строк в одной записи в файл
+    WRITE_BATCH = 500
+    # Ограничение Bot API на размер отправляемого файла
+    MAX_FILE_SIZE = 50 * 1024 * 1024
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._jobs: Dict[int, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+
+    def start(self, user_id: int, chat_id: int, export_format: str) -> bool:
+        """Запуск выгрузки; False, если у пользователя уже идет другая"""
+        if user_id in self._jobs:
+            return False
+        task = asyncio.create_task(self._run(user_id, chat_id, export_format))
+        self._jobs[user_id] = task
+        task.add_done_callback(lambda _: self._jobs.pop(user_id, None))
+        return True
+
+    async def stop(self):
+        """Отмена незавершенных выгрузок при остановке"""
+        jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+
+    async def _write(self, user_id: int, path: str, export_format: str) -> int:
+        """Запись выгрузки в файл; возвращает число строк"""
+        rows = 0
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        async with aiofiles.open(path, "w", encoding="utf-8", newline="") as file:
+            if export_format == "csv":
+                # BOM, чтобы Excel распознал кодировку
+                await file.write("\ufeff")
+                writer.writeheader()
+            async for row in db.iter_user_export(user_id):
+                if export_format == "csv":
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+                rows += 1
+                if rows % self.WRITE_BATCH == 0:
+                    await file.write(buffer.getvalue())
+                    buffer.seek(0)
+                    buffer.truncate()
+            await file.write(buffer.getvalue())
+        return rows
+
+    async def _run(self, user_id: int, chat_id: int, export_format: str):
+        extension = "csv" if export_format == "csv" else "ndjson"
+        fd, path = tempfile.mkstemp(prefix=f"export_{user_id}_", suffix=f".{extension}")
+        os.close(fd)
+        start = time.perf_counter()
+        try:
+            async with self._semaphore:
+                rows = await self._write(user_id, path, export_format)
+            EXPORT_ROWS.inc(export_format, amount=rows)
+
+            size = (await aiofiles.os.stat(path)).st_size
+            if size > self.MAX_FILE_SIZE:
+                await self.bot.send_message(
+                    chat_id, "❌ Выгрузка больше 50 МБ, Telegram не позволяет отправить такой файл"
+                )
+                return
+            filename = f"tasks_{datetime.now():%Y%m%d_%H%M}.{extension}"
+            await self.bot.send_document(
+                chat_id,
+                FSInputFile(path, filename=filename),
+                caption=f"📦 Выгрузка проектов и задач: {rows} строк"
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            EXPORT_ERRORS.inc(export_format)
+            logger.error(f"Ошибка выгрузки пользователя {user_id}: {e}")
+            try:
+                await self.bot.send_message(chat_id, "❌ Не удалось подготовить выгрузку")
+            except Exception:
+                pass
+        finally:
+            EXPORT_DURATION.observe(time.perf_counter() - start, export_format)
+            try:
+                await aiofiles.os.remove(path)
+            except OSError:
+                pass
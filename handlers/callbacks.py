@@ -1,6 +1,9 @@
 from aiogram import Router, types
+from aiogram.dispatcher.event.bases import SkipHandler
 from aiogram.fsm.context import FSMContext
-from datetime import datetime
+from datetime import datetime, time, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import html
 import logging
 
 from keyboards.inline_kb import (
@@ -8,11 +11,22 @@ from keyboards.inline_kb import (
     get_projects_keyboard,
     get_project_actions_keyboard,
     get_tasks_keyboard,
+    get_archive_keyboard,
     get_task_actions_keyboard,
     get_confirm_delete_keyboard,
-    get_edit_task_fields_keyboard
+    get_edit_task_fields_keyboard,
+    get_settings_keyboard,
+    get_digest_time_keyboard,
+    get_cancel_keyboard,
+    get_task_selection_keyboard
 )
+from keyboards.callback_data import (
+    CALLBACK_FACTORIES, MenuCallback, ProjectCallback, TaskCallback, SettingsCallback, SearchCallback,
+    SelectCallback
+)
+from handlers.commands import render_search_page
 from db import db
+from metrics import mark_update_failed
 
 # Создаем роутер
 router = Router()
@@ -20,9 +34,54 @@ router = Router()
 logger = logging.getLogger(__name__)
 
 
-@router.callback_query(lambda c: c.data == "back_to_main")
-async def back_to_main(callback: types.CallbackQuery):
+def shorten(text, limit=100):
+    """Обрезка длинного текста для списков, чтобы страница влезала в сообщение"""
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+# Таблица маршрутов: (префикс, действие) -> обработчик
+CallbackHandler = Callable[[types.CallbackQuery, Any, FSMContext], Awaitable[None]]
+_routes: Dict[Tuple[str, str], CallbackHandler] = {}
+
+
+def callback_route(factory, *actions: str):
+    """Регистрация обработчика для действий указанного вида callback_data"""
+    def decorator(handler: CallbackHandler) -> CallbackHandler:
+        for action in actions:
+            _routes[(factory.__prefix__, action)] = handler
+        return handler
+    return decorator
+
+
+@router.callback_query()
+async def dispatch_callback(callback: types.CallbackQuery, state: FSMContext,
+                            update_timing: Optional[Dict[str, Any]] = None):
+    """Единая точка входа: разбор callback_data и поиск обработчика в таблице"""
+    prefix = callback.data.split(":", 1)[0]
+    factory = CALLBACK_FACTORIES.get(prefix)
+    handler = None
+    if factory:
+        try:
+            callback_data = factory.unpack(callback.data)
+            handler = _routes.get((prefix, callback_data.action))
+        except (TypeError, ValueError) as e:
+            logger.error(f"Некорректные данные кнопки {callback.data}: {e}")
+    
+    # Неизвестные кнопки остаются другим роутерам
+    if handler is None:
+        raise SkipHandler()
+    
+    # Метрики по обработчикам видят конкретную функцию, а не диспетчер
+    if update_timing is not None:
+        update_timing["handler"] = handler.__name__
+    await handler(callback, callback_data, state)
+
+
+@callback_route(MenuCallback, "main")
+async def back_to_main(callback: types.CallbackQuery, callback_data: MenuCallback, state: FSMContext):
     """Возврат в главное меню"""
+    # Выход из ввода по шагам; данные FSM (например, запрос поиска) сохраняются
+    await state.set_state(None)
     welcome_text = (
         "👋 Главное меню\n\n"
         "Используй кнопки ниже для навигации:"
@@ -35,8 +94,8 @@ async def back_to_main(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data == "create_project")
-async def create_project_callback(callback: types.CallbackQuery, state: FSMContext):
+@callback_route(MenuCallback, "create_project")
+async def create_project_callback(callback: types.CallbackQuery, callback_data: MenuCallback, state: FSMContext):
     """Обработчик создания проекта"""
     from states.user_states import ProjectStates
     
@@ -48,28 +107,36 @@ async def create_project_callback(callback: types.CallbackQuery, state: FSMConte
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data == "my_projects")
-async def show_projects(callback: types.CallbackQuery):
+@callback_route(MenuCallback, "projects")
+async def show_projects(callback: types.CallbackQuery, callback_data: MenuCallback, state: FSMContext):
     """Показать список проектов пользователя"""
     try:
         user_id = callback.from_user.id
-        projects = await db.get_user_projects(user_id)
-        
+        after = callback_data.cursor
+        # Проекты и счетчики задач приходят одним запросом
+        projects, next_cursor = await db.get_user_projects_with_stats(user_id, after=after)
+
         if not projects:
             text = "📂 У вас пока нет проектов.\n\nСоздайте первый проект!"
         else:
             text = "📂 Ваши проекты:\n\n"
             for project in projects:
-                task_count = await db.get_project_tasks_count(project['id'])
-                text += f"• {project['name']} (задач: {task_count})\n"
+                text += (
+                    f"• {shorten(project['name'])} (задач: {project['total_tasks']}, "
+                    f"активных: {project['active_tasks']}"
+                )
+                if project['overdue_tasks']:
+                    text += f", просрочено: {project['overdue_tasks']}"
+                text += ")\n"
         
         await callback.message.edit_text(
             text,
-            reply_markup=get_projects_keyboard(projects)
+            reply_markup=get_projects_keyboard(projects, next_cursor, is_first_page=after is None)
         )
         
     except Exception as e:
         logger.error(f"Ошибка при получении проектов: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка при загрузке проектов",
             reply_markup=get_main_menu_keyboard()
@@ -78,12 +145,12 @@ async def show_projects(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data.startswith("project_"))
-async def project_selected(callback: types.CallbackQuery):
+@callback_route(ProjectCallback, "open")
+async def project_selected(callback: types.CallbackQuery, callback_data: ProjectCallback, state: FSMContext):
     """Обработчик выбора проекта"""
     try:
-        project_id = int(callback.data.split("_")[1])
-        project = await db.get_project_by_id(project_id)
+        project_id = callback_data.project_id
+        project = await db.get_project(project_id, callback.from_user.id)
         
         if not project:
             await callback.message.edit_text(
@@ -92,7 +159,7 @@ async def project_selected(callback: types.CallbackQuery):
             )
             return
         
-        tasks = await db.get_project_tasks(project_id)
+        tasks, next_cursor = await db.get_project_tasks_page(project_id, callback.from_user.id)
         
         text = f"📋 Проект: {project['name']}\n\n"
         
@@ -101,13 +168,15 @@ async def project_selected(callback: types.CallbackQuery):
         else:
             text += "📋 Задачи проекта:\n\n"
             for task in tasks:
-                status_icon = "✅" if task['completed'] else "⏳"
+                status_icon = "✅" if task['status'] == 'завершено' else "⏳"
                 deadline_str = task['deadline'].strftime('%d.%m.%y %H:%M')
-                text += f"{status_icon} {task['title']}\n"
+                text += f"{status_icon} {shorten(task['title'])}\n"
                 text += f"   📅 {deadline_str}\n"
                 if task['description']:
-                    text += f"   📝 {task['description']}\n"
+                    text += f"   📝 {shorten(task['description'])}\n"
                 text += "\n"
+            if next_cursor:
+                text += "…остальные задачи - в разделе «Задачи проекта»"
         
         await callback.message.edit_text(
             text,
@@ -116,6 +185,7 @@ async def project_selected(callback: types.CallbackQuery):
         
     except Exception as e:
         logger.error(f"Ошибка при выборе проекта: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка при загрузке проекта",
             reply_markup=get_main_menu_keyboard()
@@ -124,13 +194,13 @@ async def project_selected(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data.startswith("add_task_"))
-async def add_task_to_project(callback: types.CallbackQuery, state: FSMContext):
+@callback_route(ProjectCallback, "add_task")
+async def add_task_to_project(callback: types.CallbackQuery, callback_data: ProjectCallback, state: FSMContext):
     """Добавить задачу в проект"""
     from states.user_states import TaskStates
     
     try:
-        project_id = int(callback.data.split("_")[2])
+        project_id = callback_data.project_id
         
         # Сохраняем project_id в состоянии
         await state.update_data(project_id=project_id)
@@ -144,6 +214,7 @@ async def add_task_to_project(callback: types.CallbackQuery, state: FSMContext):
         
     except Exception as e:
         logger.error(f"Ошибка при добавлении задачи: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка при добавлении задачи",
             reply_markup=get_main_menu_keyboard()
@@ -152,13 +223,52 @@ async def add_task_to_project(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data.startswith("edit_project_"))
-async def edit_project(callback: types.CallbackQuery, state: FSMContext):
+@callback_route(ProjectCallback, "bulk_add")
+async def bulk_add_tasks(callback: types.CallbackQuery, callback_data: ProjectCallback, state: FSMContext):
+    """Добавить в проект много задач одним сообщением"""
+    from states.user_states import TaskStates
+    from handlers.fsm_handlers import MAX_BULK_TASKS
+    
+    try:
+        project_id = callback_data.project_id
+        project = await db.get_project(project_id, callback.from_user.id)
+        if not project:
+            await callback.message.edit_text(
+                "❌ Проект не найден",
+                reply_markup=get_main_menu_keyboard()
+            )
+            return
+        
+        await state.update_data(project_id=project_id)
+        await callback.message.edit_text(
+            f"📥 Отправьте задачи для проекта «{html.escape(project['name'])}» одним сообщением, "
+            f"по одной на строку (не больше {MAX_BULK_TASKS}):\n\n"
+            "название | ДД.ММ.ГГ ЧЧ:ММ | описание\n\n"
+            "Описание можно не указывать. Пример:\n"
+            "Подготовить отчет | 05.02.26 18:30 | за январь\n"
+            "Позвонить клиенту | 06.02.26 10:00",
+            reply_markup=get_cancel_keyboard()
+        )
+        await state.set_state(TaskStates.waiting_for_bulk_tasks)
+        
+    except Exception as e:
+        logger.error(f"Ошибка при добавлении задач списком: {e}")
+        mark_update_failed()
+        await callback.message.edit_text(
+            "❌ Ошибка при добавлении задач",
+            reply_markup=get_main_menu_keyboard()
+        )
+    
+    await callback.answer()
+
+
+@callback_route(ProjectCallback, "edit")
+async def edit_project(callback: types.CallbackQuery, callback_data: ProjectCallback, state: FSMContext):
     """Редактировать проект"""
     from states.user_states import EditProjectStates
     
     try:
-        project_id = int(callback.data.split("_")[2])
+        project_id = callback_data.project_id
         
         # Сохраняем project_id в состоянии
         await state.update_data(project_id=project_id)
@@ -172,6 +282,7 @@ async def edit_project(callback: types.CallbackQuery, state: FSMContext):
         
     except Exception as e:
         logger.error(f"Ошибка при редактировании проекта: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка при редактировании проекта",
             reply_markup=get_main_menu_keyboard()
@@ -180,11 +291,11 @@ async def edit_project(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data.startswith("delete_project_"))
-async def delete_project_confirmation(callback: types.CallbackQuery):
+@callback_route(ProjectCallback, "delete")
+async def delete_project_confirmation(callback: types.CallbackQuery, callback_data: ProjectCallback, state: FSMContext):
     """Подтверждение удаления проекта"""
     try:
-        project_id = int(callback.data.split("_")[2])
+        project_id = callback_data.project_id
         
         await callback.message.edit_text(
             "⚠️ Вы уверены, что хотите удалить этот проект?\n\n"
@@ -194,6 +305,7 @@ async def delete_project_confirmation(callback: types.CallbackQuery):
         
     except Exception as e:
         logger.error(f"Ошибка при подтверждении удаления проекта: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка",
             reply_markup=get_main_menu_keyboard()
@@ -202,13 +314,13 @@ async def delete_project_confirmation(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data.startswith("confirm_delete_project_"))
-async def delete_project(callback: types.CallbackQuery):
+@callback_route(ProjectCallback, "confirm_delete")
+async def delete_project(callback: types.CallbackQuery, callback_data: ProjectCallback, state: FSMContext):
     """Удаление проекта"""
     try:
-        project_id = int(callback.data.split("_")[3])
+        project_id = callback_data.project_id
         
-        await db.delete_project(project_id)
+        await db.delete_project(project_id, callback.from_user.id)
         
         await callback.message.edit_text(
             "✅ Проект успешно удален",
@@ -217,6 +329,7 @@ async def delete_project(callback: types.CallbackQuery):
         
     except Exception as e:
         logger.error(f"Ошибка при удалении проекта: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка при удалении проекта",
             reply_markup=get_main_menu_keyboard()
@@ -225,28 +338,27 @@ async def delete_project(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data.startswith("cancel_delete_"))
-async def cancel_delete(callback: types.CallbackQuery):
+@callback_route(ProjectCallback, "cancel_delete")
+async def cancel_delete(callback: types.CallbackQuery, callback_data: ProjectCallback, state: FSMContext):
     """Отмена удаления"""
     try:
-        entity_type = callback.data.split("_")[2]
-        entity_id = int(callback.data.split("_")[3])
-        
-        if entity_type == "project":
-            project = await db.get_project_by_id(entity_id)
-            if project:
-                await callback.message.edit_text(
-                    f"📋 Проект: {project['name']}",
-                    reply_markup=get_project_actions_keyboard(entity_id)
-                )
-            else:
-                await callback.message.edit_text(
-                    "✅ Удаление отменено",
-                    reply_markup=get_main_menu_keyboard()
-                )
+        project_id = callback_data.project_id
+        
+        project = await db.get_project(project_id, callback.from_user.id)
+        if project:
+            await callback.message.edit_text(
+                f"📋 Проект: {project['name']}",
+                reply_markup=get_project_actions_keyboard(project_id)
+            )
+        else:
+            await callback.message.edit_text(
+                "✅ Удаление отменено",
+                reply_markup=get_main_menu_keyboard()
+            )
         
     except Exception as e:
         logger.error(f"Ошибка при отмене удаления: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка",
             reply_markup=get_main_menu_keyboard()
@@ -255,30 +367,141 @@ async def cancel_delete(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data.startswith("view_tasks_"))
-async def view_project_tasks(callback: types.CallbackQuery):
+@callback_route(ProjectCallback, "tasks")
+async def view_project_tasks(callback: types.CallbackQuery, callback_data: ProjectCallback, state: FSMContext):
     """Просмотр задач проекта"""
     try:
-        project_id = int(callback.data.split("_")[2])
-        tasks = await db.get_project_tasks(project_id)
+        project_id = callback_data.project_id
+        after = callback_data.cursor
+        tasks, next_cursor = await db.get_project_tasks_page(project_id, callback.from_user.id, after=after)
         
         if not tasks:
             text = "📝 В этом проекте пока нет задач.\n\nДобавьте первую задачу!"
         else:
             text = "📋 Задачи проекта:\n\n"
             for task in tasks:
-                status_icon = "✅" if task['completed'] else "⏳"
+                status_icon = "✅" if task['status'] == 'завершено' else "⏳"
                 deadline_str = task['deadline'].strftime('%d.%m.%y %H:%M')
-                text += f"{status_icon} {task['title']}\n"
+                text += f"{status_icon} {shorten(task['title'])}\n"
                 text += f"   📅 {deadline_str}\n\n"
         
         await callback.message.edit_text(
             text,
-            reply_markup=get_tasks_keyboard(tasks, project_id)
+            reply_markup=get_tasks_keyboard(tasks, project_id, next_cursor, is_first_page=after is None)
         )
         
     except Exception as e:
         logger.error(f"Ошибка при просмотре задач: {e}")
+        mark_update_failed()
+        await callback.message.edit_text(
+            "❌ Ошибка при загрузке задач",
+            reply_markup=get_main_menu_keyboard()
+        )
+    
+    await callback.answer()
+
+
+@callback_route(ProjectCallback, "archive")
+async def view_project_archive(callback: types.CallbackQuery, callback_data: ProjectCallback, state: FSMContext):
+    """Просмотр архива завершенных задач проекта"""
+    try:
+        project_id = callback_data.project_id
+        after = callback_data.cursor
+        tasks, next_cursor = await db.get_project_archive_page(project_id, callback.from_user.id, after=after)
+        
+        if not tasks:
+            text = "🗄 В архиве пока пусто.\n\nЗавершенные задачи попадают сюда через сутки."
+        else:
+            text = "🗄 Архив проекта:\n\n"
+            for task in tasks:
+                completed_str = task['completed_at'].strftime('%d.%m.%y %H:%M')
+                text += f"✅ {html.escape(shorten(task['title']))}\n"
+                text += f"   🏁 {completed_str}\n\n"
+        
+        await callback.message.edit_text(
+            text,
+            reply_markup=get_archive_keyboard(project_id, next_cursor, is_first_page=after is None)
+        )
+        
+    except Exception as e:
+        logger.error(f"Ошибка при просмотре архива: {e}")
+        mark_update_failed()
+        await callback.message.edit_text(
+            "❌ Ошибка при загрузке архива",
+            reply_markup=get_main_menu_keyboard()
+        )
+    
+    await callback.answer()
+
+
+async def get_selection(state: FSMContext, project_id: int) -> List[int]:
+    """Выбранные задачи проекта из данных FSM; выбор в другом проекте сбрасывается"""
+    data = await state.get_data()
+    if data.get("selection_project") != project_id:
+        return []
+    return data.get("selected_tasks", [])
+
+
+async def show_task_selection(callback: types.CallbackQuery, state: FSMContext, project_id: int,
+                              page: int = 0, notice: str = ""):
+    """Страница задач в режиме выбора нескольких.
+
+    Курсоры пройденных страниц хранятся в данных FSM (selection_cursors[i] -
+    начало страницы i + 1), в кнопках - только номер страницы.
+    """
+    selected = await get_selection(state, project_id)
+    data = await state.get_data()
+    cursors = data.get("selection_cursors", []) if data.get("selection_project") == project_id else []
+    # Страница из устаревшего сообщения, курсора которой уже нет, - с начала
+    if page > len(cursors):
+        page = 0
+    cursor = cursors[page - 1] if page else None
+    tasks, next_cursor = await db.get_project_tasks_page(project_id, callback.from_user.id, after=cursor)
+    if next_cursor:
+        await state.update_data(selection_project=project_id, selection_cursors=cursors[:page] + [next_cursor])
+    text = notice + (
+        f"☑️ Выбрано задач: {len(selected)}\n\n"
+        "Отметьте задачи (можно на разных страницах) и выберите действие."
+    )
+    await callback.message.edit_text(
+        text,
+        reply_markup=get_task_selection_keyboard(tasks, project_id, set(selected), page, bool(next_cursor))
+    )
+
+
+@callback_route(ProjectCallback, "select")
+async def start_task_selection(callback: types.CallbackQuery, callback_data: ProjectCallback, state: FSMContext):
+    """Вход в режим выбора нескольких задач"""
+    try:
+        await state.update_data(selection_project=callback_data.project_id, selected_tasks=[], selection_cursors=[])
+        await show_task_selection(callback, state, callback_data.project_id)
+    except Exception as e:
+        logger.error(f"Ошибка при выборе задач: {e}")
+        mark_update_failed()
+        await callback.message.edit_text(
+            "❌ Ошибка при загрузке задач",
+            reply_markup=get_main_menu_keyboard()
+        )
+    
+    await callback.answer()
+
+
+@callback_route(SelectCallback, "toggle", "page")
+async def toggle_task_selection(callback: types.CallbackQuery, callback_data: SelectCallback, state: FSMContext):
+    """Отметка задачи или переход на другую страницу в режиме выбора"""
+    try:
+        project_id = callback_data.project_id
+        selected = await get_selection(state, project_id)
+        if callback_data.action == "toggle":
+            if callback_data.task_id in selected:
+                selected = [task_id for task_id in selected if task_id != callback_data.task_id]
+            else:
+                selected = selected + [callback_data.task_id]
+            await state.update_data(selection_project=project_id, selected_tasks=selected)
+        await show_task_selection(callback, state, project_id, callback_data.page)
+    except Exception as e:
+        logger.error(f"Ошибка при выборе задач: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка при загрузке задач",
             reply_markup=get_main_menu_keyboard()
@@ -287,12 +510,73 @@ async def view_project_tasks(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data.startswith("task_"))
-async def task_selected(callback: types.CallbackQuery):
+@callback_route(SelectCallback, "complete", "shift", "confirm_delete", "complete_overdue")
+async def apply_bulk_action(callback: types.CallbackQuery, callback_data: SelectCallback, state: FSMContext):
+    """Групповое действие над выбранными задачами одним запросом"""
+    project_id = callback_data.project_id
+    user_id = callback.from_user.id
+    action = callback_data.action
+    try:
+        selected = await get_selection(state, project_id)
+        if action == "complete_overdue":
+            count = await db.complete_tasks(user_id, project_id=project_id, overdue=True)
+            result = f"✅ Завершено просроченных задач: {count}"
+        elif not selected:
+            await callback.answer("Сначала отметьте задачи")
+            return
+        elif action == "complete":
+            count = await db.complete_tasks(user_id, task_ids=selected)
+            result = f"✅ Завершено задач: {count}"
+        elif action == "shift":
+            count = await db.shift_task_deadlines(user_id, timedelta(days=callback_data.days or 1), task_ids=selected)
+            result = f"📅 Перенесено задач: {count}"
+        else:
+            count = await db.delete_tasks(user_id, task_ids=selected)
+            result = f"🗑️ Удалено задач: {count}"
+        
+        await state.update_data(selected_tasks=[])
+        await show_task_selection(callback, state, project_id, notice=result + "\n\n")
+        
+    except Exception as e:
+        logger.error(f"Ошибка группового действия {action}: {e}")
+        mark_update_failed()
+        await callback.message.edit_text(
+            "❌ Ошибка при изменении задач",
+            reply_markup=get_main_menu_keyboard()
+        )
+    
+    await callback.answer()
+
+
+@callback_route(SelectCallback, "delete")
+async def confirm_bulk_delete(callback: types.CallbackQuery, callback_data: SelectCallback, state: FSMContext):
+    """Подтверждение удаления выбранных задач"""
+    selected = await get_selection(state, callback_data.project_id)
+    if not selected:
+        await callback.answer("Сначала отметьте задачи")
+        return
+    
+    await callback.message.edit_text(
+        f"⚠️ Удалить выбранные задачи ({len(selected)})? Это действие нельзя отменить.",
+        reply_markup=get_confirm_delete_keyboard("selection", callback_data.project_id)
+    )
+    await callback.answer()
+
+
+@callback_route(SelectCallback, "cancel")
+async def cancel_task_selection(callback: types.CallbackQuery, callback_data: SelectCallback, state: FSMContext):
+    """Выход из режима выбора к обычному списку задач"""
+    await state.update_data(selection_project=None, selected_tasks=[], selection_cursors=[])
+    await view_project_tasks(callback, ProjectCallback(action="tasks", project_id=callback_data.project_id), state)
+
+
+# Отмена удаления задачи возвращает к ее карточке
+@callback_route(TaskCallback, "open", "cancel_delete")
+async def task_selected(callback: types.CallbackQuery, callback_data: TaskCallback, state: FSMContext):
     """Обработчик выбора задачи"""
     try:
-        task_id = int(callback.data.split("_")[1])
-        task = await db.get_task_by_id(task_id)
+        task_id = callback_data.task_id
+        task = await db.get_task(task_id, callback.from_user.id)
         
         if not task:
             await callback.message.edit_text(
@@ -301,7 +585,7 @@ async def task_selected(callback: types.CallbackQuery):
             )
             return
         
-        status = "✅ Завершена" if task['completed'] else "⏳ В процессе"
+        status = "✅ Завершена" if task['status'] == 'завершено' else "⏳ В процессе"
         deadline_str = task['deadline'].strftime('%d.%m.%y %H:%M')
         
         text = (
@@ -319,6 +603,7 @@ async def task_selected(callback: types.CallbackQuery):
         
     except Exception as e:
         logger.error(f"Ошибка при выборе задачи: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка при загрузке задачи",
             reply_markup=get_main_menu_keyboard()
@@ -327,15 +612,14 @@ async def task_selected(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data.startswith("complete_task_"))
-async def complete_task(callback: types.CallbackQuery):
+@callback_route(TaskCallback, "complete")
+async def complete_task(callback: types.CallbackQuery, callback_data: TaskCallback, state: FSMContext):
     """Отметить задачу как выполненную"""
     try:
-        task_id = int(callback.data.split("_")[2])
-        
-        await db.update_task_status(task_id, completed=True)
+        task_id = callback_data.task_id
         
-        task = await db.get_task_by_id(task_id)
+        # Обновленная задача приходит из того же запроса, что и изменение
+        task = await db.update_task_status(task_id, callback.from_user.id, 'завершено')
         
         if task:
             status = "✅ Завершена"
@@ -358,14 +642,15 @@ async def complete_task(callback: types.CallbackQuery):
         
     except Exception as e:
         logger.error(f"Ошибка при завершении задачи: {e}")
+        mark_update_failed()
         await callback.answer("❌ Ошибка при завершении задачи")
 
 
-@router.callback_query(lambda c: c.data.startswith("edit_task_"))
-async def edit_task(callback: types.CallbackQuery, state: FSMContext):
+@callback_route(TaskCallback, "edit")
+async def edit_task(callback: types.CallbackQuery, callback_data: TaskCallback, state: FSMContext):
     """Редактировать задачу - выбор поля"""
     try:
-        task_id = int(callback.data.split("_")[2])
+        task_id = callback_data.task_id
         
         await callback.message.edit_text(
             "✏️ Выберите, что хотите отредактировать:",
@@ -377,6 +662,7 @@ async def edit_task(callback: types.CallbackQuery, state: FSMContext):
         
     except Exception as e:
         logger.error(f"Ошибка при редактировании задачи: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка при редактировании задачи",
             reply_markup=get_main_menu_keyboard()
@@ -385,15 +671,14 @@ async def edit_task(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data.startswith("edit_task_field_"))
-async def edit_task_field(callback: types.CallbackQuery, state: FSMContext):
+@callback_route(TaskCallback, "edit_field")
+async def edit_task_field(callback: types.CallbackQuery, callback_data: TaskCallback, state: FSMContext):
     """Редактирование конкретного поля задачи"""
     from states.user_states import EditTaskStates
     
     try:
-        data = callback.data.split("_")
-        task_id = int(data[3])
-        field = data[4]
+        task_id = callback_data.task_id
+        field = callback_data.field
         
         # Сохраняем данные в состоянии
         await state.update_data(task_id=task_id, field=field)
@@ -424,6 +709,7 @@ async def edit_task_field(callback: types.CallbackQuery, state: FSMContext):
         
     except Exception as e:
         logger.error(f"Ошибка при выборе поля для редактирования: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка",
             reply_markup=get_main_menu_keyboard()
@@ -432,11 +718,11 @@ async def edit_task_field(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data.startswith("delete_task_"))
-async def delete_task_confirmation(callback: types.CallbackQuery):
+@callback_route(TaskCallback, "delete")
+async def delete_task_confirmation(callback: types.CallbackQuery, callback_data: TaskCallback, state: FSMContext):
     """Подтверждение удаления задачи"""
     try:
-        task_id = int(callback.data.split("_")[2])
+        task_id = callback_data.task_id
         
         await callback.message.edit_text(
             "⚠️ Вы уверены, что хотите удалить эту задачу?",
@@ -445,6 +731,7 @@ async def delete_task_confirmation(callback: types.CallbackQuery):
         
     except Exception as e:
         logger.error(f"Ошибка при подтверждении удаления задачи: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка",
             reply_markup=get_main_menu_keyboard()
@@ -453,13 +740,13 @@ async def delete_task_confirmation(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data.startswith("confirm_delete_task_"))
-async def delete_task(callback: types.CallbackQuery):
+@callback_route(TaskCallback, "confirm_delete")
+async def delete_task(callback: types.CallbackQuery, callback_data: TaskCallback, state: FSMContext):
     """Удаление задачи"""
     try:
-        task_id = int(callback.data.split("_")[3])
+        task_id = callback_data.task_id
         
-        await db.delete_task(task_id)
+        await db.delete_task(task_id, callback.from_user.id)
         
         await callback.message.edit_text(
             "✅ Задача успешно удалена",
@@ -468,9 +755,129 @@ async def delete_task(callback: types.CallbackQuery):
         
     except Exception as e:
         logger.error(f"Ошибка при удалении задачи: {e}")
+        mark_update_failed()
         await callback.message.edit_text(
             "❌ Ошибка при удалении задачи",
             reply_markup=get_main_menu_keyboard()
         )
     
     await callback.answer()
+
+
+def format_settings(settings):
+    """Текст экрана настроек напоминаний"""
+    if settings['reminder_mode'] == "digest":
+        mode = f"ежедневная сводка в {settings['digest_time']:%H:%M}"
+    else:
+        mode = "сообщение по каждой задаче за 24 часа, за 1 час и в момент дедлайна"
+    return (
+        "⚙️ Настройки напоминаний\n\n"
+        f"Сейчас: {mode}.\n\n"
+        "В режиме сводки все задачи с дедлайном в ближайшие сутки и просроченные "
+        "приходят одним сообщением в выбранное время."
+    )
+
+
+@callback_route(MenuCallback, "settings")
+async def show_settings(callback: types.CallbackQuery, callback_data: MenuCallback, state: FSMContext):
+    """Экран настроек напоминаний"""
+    try:
+        settings = await db.get_user_settings(callback.from_user.id)
+        await callback.message.edit_text(
+            format_settings(settings),
+            reply_markup=get_settings_keyboard(settings)
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке настроек: {e}")
+        mark_update_failed()
+        await callback.message.edit_text(
+            "❌ Ошибка при загрузке настроек",
+            reply_markup=get_main_menu_keyboard()
+        )
+    
+    await callback.answer()
+
+
+@callback_route(SettingsCallback, "mode")
+async def set_reminder_mode(callback: types.CallbackQuery, callback_data: SettingsCallback, state: FSMContext):
+    """Переключение между напоминаниями по задачам и ежедневной сводкой"""
+    try:
+        settings = await db.update_user_settings(callback.from_user.id, reminder_mode=callback_data.mode)
+        await callback.message.edit_text(
+            format_settings(settings),
+            reply_markup=get_settings_keyboard(settings)
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при изменении режима напоминаний: {e}")
+        mark_update_failed()
+        await callback.message.edit_text(
+            "❌ Ошибка при сохранении настроек",
+            reply_markup=get_main_menu_keyboard()
+        )
+    
+    await callback.answer()
+
+
+@callback_route(SettingsCallback, "time")
+async def choose_digest_time(callback: types.CallbackQuery, callback_data: SettingsCallback, state: FSMContext):
+    """Выбор часа ежедневной сводки"""
+    try:
+        settings = await db.get_user_settings(callback.from_user.id)
+        await callback.message.edit_text(
+            "🕘 Во сколько присылать сводку?",
+            reply_markup=get_digest_time_keyboard(settings['digest_time'].hour)
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке настроек: {e}")
+        mark_update_failed()
+        await callback.message.edit_text(
+            "❌ Ошибка при загрузке настроек",
+            reply_markup=get_main_menu_keyboard()
+        )
+    
+    await callback.answer()
+
+
+@callback_route(SettingsCallback, "set_time")
+async def set_digest_time(callback: types.CallbackQuery, callback_data: SettingsCallback, state: FSMContext):
+    """Сохранение часа ежедневной сводки"""
+    try:
+        settings = await db.update_user_settings(
+            callback.from_user.id, digest_time=time(callback_data.hour % 24)
+        )
+        await callback.message.edit_text(
+            format_settings(settings),
+            reply_markup=get_settings_keyboard(settings)
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при изменении времени сводки: {e}")
+        mark_update_failed()
+        await callback.message.edit_text(
+            "❌ Ошибка при сохранении настроек",
+            reply_markup=get_main_menu_keyboard()
+        )
+    
+    await callback.answer()
+
+
+@callback_route(SearchCallback, "page")
+async def search_page(callback: types.CallbackQuery, callback_data: SearchCallback, state: FSMContext):
+    """Листание результатов поиска"""
+    data = await state.get_data()
+    query = data.get("search_query")
+    if not query:
+        await callback.answer("Поиск устарел, повторите /search", show_alert=True)
+        return
+    
+    try:
+        text, keyboard = await render_search_page(callback.from_user.id, query, callback_data.page)
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    except Exception as e:
+        logger.error(f"Ошибка поиска: {e}")
+        mark_update_failed()
+        await callback.message.edit_text(
+            "❌ Ошибка при поиске",
+            reply_markup=get_main_menu_keyboard()
+        )
+    
+    await callback.answer()
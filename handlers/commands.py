@@ -1,18 +1,42 @@
 from aiogram import Router, types
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Any, Dict, List, Optional
 import asyncio
+import html
 import logging
 
-from keyboards.inline_kb import get_main_menu_keyboard
+from keyboards.inline_kb import get_main_menu_keyboard, get_search_keyboard
 from db import db
+from scheduler import BatchJob, DigestScheduler, ReminderScheduler
+from delivery import MessageDelivery
+from export import EXPORT_FORMATS, ExportJobs
+from metrics import mark_update_failed
 
 # Создаем роутер для команд
 router = Router()
 
 logger = logging.getLogger(__name__)
 
+# Отправитель напоминаний, создается при запуске send_reminders
+reminder_delivery: Optional[MessageDelivery] = None
+
+# Фоновые выгрузки /export, создаются при первой команде
+export_jobs: Optional[ExportJobs] = None
+
+# Предел длины одной страницы сводки, с запасом до лимита Telegram в 4096 символов
+DIGEST_PAGE_LIMIT = 4000
+
+# Заголовки напоминаний по тому, за сколько до дедлайна они срабатывают
+# (см. db.REMINDER_OFFSETS)
+REMINDER_HEADLINES = {
+    timedelta(hours=24): "⏰ До дедлайна остались сутки",
+    timedelta(hours=1): "⏰ До дедлайна остался час",
+    timedelta(0): "❗ Дедлайн наступил",
+}
+
 
 @router.message(Command("start"))
 async def cmd_start(message: types.Message):
@@ -40,7 +64,9 @@ async def cmd_help(message: types.Message):
         "📚 Справка по командам:\n\n"
         "Основные команды:\n"
         "/start - Запустить бота\n"
-        "/help - Показать эту справку\n\n"
+        "/help - Показать эту справку\n"
+        "/search текст - Найти задачи по названию, описанию, комментарию или проекту\n"
+        "/export [csv|json] - Выгрузить проекты и задачи файлом\n\n"
         "Управление проектами:\n"
         "• Создавайте проекты для организации задач\n"
         "• В каждом проекте могут быть задачи\n"
@@ -48,9 +74,11 @@ async def cmd_help(message: types.Message):
         "Управление задачами:\n"
         "• У каждой задачи есть дедлайн\n"
         "• Можно добавлять комментарии\n"
-        "• Статус: 'активно' или 'завершено'\n\n"
+        "• Статус: 'активно' или 'завершено'\n"
+        "• Завершенные задачи через сутки переходят в 🗄 Архив проекта\n\n"
         "Напоминания:\n"
-        "• Бот присылает уведомления за 24 часа до дедлайна\n\n"
+        "• Бот присылает уведомления за 24 часа, за 1 час и в момент дедлайна\n"
+        "• Вместо них можно получать одну ежедневную сводку - см. ⚙️ Настройки\n\n"
         "Формат даты: ДД.ММ.ГГ ЧЧ:ММ\n"
         "Пример: 05.02.26 18:30"
     )
@@ -58,44 +86,137 @@ async def cmd_help(message: types.Message):
     await message.answer(help_text)
 
 
+async def render_search_page(user_id: int, query: str, page: int = 0):
+    """Текст и клавиатура страницы результатов поиска"""
+    tasks, next_page = await db.search_tasks(user_id, query, page)
+    # Сообщения отправляются в режиме HTML: запрос и названия экранируются
+    shown_query = html.escape(query)
+    if not tasks:
+        text = f"🔍 По запросу «{shown_query}» ничего не найдено" if page == 0 else "🔍 Больше результатов нет"
+    else:
+        text = f"🔍 Результаты по запросу «{shown_query}»"
+        if page > 0:
+            text += f", страница {page + 1}"
+        text += ":\n\n"
+        for task in tasks:
+            status_icon = "✅" if task['status'] == 'завершено' else "⏳"
+            deadline_str = task['deadline'].strftime('%d.%m.%y %H:%M')
+            text += (f"{status_icon} {html.escape(task['title'][:100])}\n"
+                     f"   📁 {html.escape(task['project_name'][:50])} · 📅 {deadline_str}\n")
+    return text, get_search_keyboard(tasks, page, next_page)
+
+
+@router.message(Command("search"))
+async def cmd_search(message: types.Message, command: CommandObject, state: FSMContext):
+    """Обработчик команды /search"""
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("🔍 Напишите, что искать, например: /search отчет за май")
+        return
+    
+    # Запрос не помещается в callback_data, листание берет его из FSM
+    await state.update_data(search_query=query)
+    try:
+        text, keyboard = await render_search_page(message.from_user.id, query)
+        await message.answer(text, reply_markup=keyboard)
+    except Exception as e:
+        logger.error(f"Ошибка поиска: {e}")
+        mark_update_failed()
+        await message.answer("❌ Ошибка при поиске", reply_markup=get_main_menu_keyboard())
+
+
+@router.message(Command("export"))
+async def cmd_export(message: types.Message, command: CommandObject):
+    """Обработчик команды /export"""
+    global export_jobs
+    export_format = (command.args or "csv").strip().lower()
+    if export_format not in EXPORT_FORMATS:
+        await message.answer("📦 Укажите формат: /export csv или /export json")
+        return
+    
+    if export_jobs is None:
+        export_jobs = ExportJobs(message.bot)
+    # Выгрузка идет в фоне, обработчик сразу освобождается
+    if not export_jobs.start(message.from_user.id, message.chat.id, export_format):
+        await message.answer("⏳ Предыдущая выгрузка еще готовится")
+        return
+    await message.answer("⏳ Готовлю выгрузку, файл придет отдельным сообщением")
+
+
+def render_digest(tasks: List[Dict[str, Any]]) -> List[str]:
+    """Сводка задач одного пользователя по проектам, разбитая на страницы-сообщения"""
+    now = datetime.now()
+    lines = []
+    for _, project_tasks in groupby(tasks, key=lambda task: task['project_id']):
+        project_tasks = list(project_tasks)
+        lines.append(f"\n📁 {html.escape(project_tasks[0]['project_name'][:50])}")
+        for task in project_tasks:
+            icon = "⚠️" if task['deadline'] < now else "⏳"
+            lines.append(f"{icon} {html.escape(task['title'][:200])} - {task['deadline'].strftime('%d.%m.%y %H:%M')}")
+
+    pages = [[]]
+    length = 0
+    for line in lines:
+        if length + len(line) + 1 > DIGEST_PAGE_LIMIT and pages[-1]:
+            pages.append([])
+            length = 0
+        pages[-1].append(line)
+        length += len(line) + 1
+
+    header = f"🗓 Ежедневная сводка: задач на сутки и просроченных - {len(tasks)}"
+    return [
+        header + (f" ({number}/{len(pages)})" if len(pages) > 1 else "") + "\n" + "\n".join(page)
+        for number, page in enumerate(pages, 1)
+    ]
+
+
 async def send_reminders(bot):
     """Фоновая задача для отправки напоминаний"""
+    global reminder_delivery
     logger.info("Запуск задачи напоминаний...")
-    
-    while True:
-        try:
-            tasks = await db.get_upcoming_tasks()
-            
-            sent_reminders = 0
-            for task in tasks:
-                try:
-                    deadline_str = task['deadline'].strftime('%d.%m.%y %H:%M')
-                    reminder_text = (
-                        f"❗ Напоминание:\n"
-                        f"Задача: «{task['title']}»\n"
-                        f"Дедлайн: {deadline_str}"
-                    )
-                    
-                    await bot.send_message(
-                        chat_id=task['user_id'],
-                        text=reminder_text
-                    )
-                    sent_reminders += 1
-                    
-                    # Пауза между отправками, чтобы не превысить лимиты
-                    await asyncio.sleep(0.1)
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка отправки напоминания пользователю {task.get('user_id')}: {e}")
-                    continue
-            
-            if sent_reminders > 0:
-                logger.info(f"Отправлено {sent_reminders} напоминаний")
-            else:
-                logger.info("Нет задач для напоминаний")
-            
-        except Exception as e:
-            logger.error(f"Ошибка в задаче напоминаний: {e}")
+
+    reminder_delivery = MessageDelivery(bot)
+
+    async def deliver(tasks):
+        messages = []
+        for task in tasks:
+            # Пользователи в режиме сводки получают эти задачи в ежедневной сводке
+            if task['reminder_mode'] == "digest":
+                continue
+            deadline_str = task['deadline'].strftime('%d.%m.%y %H:%M')
+            headline = REMINDER_HEADLINES.get(task['deadline'] - task['next_reminder_at'], "❗ Напоминание")
+            messages.append({
+                "chat_id": task['user_id'],
+                "text": (
+                    f"{headline}:\n"
+                    f"Задача: «{html.escape(task['title'])}»\n"
+                    f"Дедлайн: {deadline_str}"
+                )
+            })
+        
+        # Отправка идет параллельно в пределах лимитов Telegram
+        sent_reminders = await reminder_delivery.send_many(messages)
         
-        # Проверяем каждые 5 минут
-        await asyncio.sleep(300)
+        if sent_reminders > 0:
+            logger.info(
+                f"Отправлено {sent_reminders} напоминаний, "
+                f"статистика: {reminder_delivery.get_metrics()}"
+            )
+
+    async def deliver_digests(tasks):
+        messages = []
+        for user_id, user_tasks in groupby(tasks, key=lambda task: task['user_id']):
+            for text in render_digest(list(user_tasks)):
+                messages.append({"chat_id": user_id, "text": text})
+        
+        sent_digests = await reminder_delivery.send_many(messages)
+        if sent_digests > 0:
+            logger.info(f"Отправлено {sent_digests} сообщений сводок")
+
+    # Планировщик спит до ближайшего напоминания и получает изменения задач из db
+    scheduler = ReminderScheduler(deliver)
+    digests = DigestScheduler(deliver_digests)
+    # Вместе с напоминаниями работают очистка удаленных проектов и архивация
+    purger = BatchJob("очистка удаленных проектов", db.purge_deleted_projects)
+    archiver = BatchJob("архивация завершенных задач", db.archive_completed_tasks)
+    await asyncio.gather(scheduler.run(), digests.run(), purger.run(), archiver.run())
@@ -0,0 +1,64 @@
+from typing import Optional
+
+from aiogram.filters.callback_data import CallbackData
+
+
+class MenuCallback(CallbackData, prefix="menu"):
+    """Кнопки меню: main, projects, create_project, help..."""
+    action: str
+    # Курсор страницы списка проектов
+    cursor: Optional[str] = None
+
+
+class ProjectCallback(CallbackData, prefix="prj"):
+    """Действия с проектом: open, tasks, archive, add_task, bulk_add, edit, delete, confirm_delete, cancel_delete"""
+    action: str
+    project_id: int
+    # Курсор страницы списка задач или архива
+    cursor: Optional[str] = None
+
+
+class TaskCallback(CallbackData, prefix="tsk"):
+    """Действия с задачей: open, complete, edit, edit_field, delete, confirm_delete, cancel_delete"""
+    action: str
+    task_id: int
+    # Редактируемое поле для edit_field
+    field: Optional[str] = None
+
+
+class SettingsCallback(CallbackData, prefix="set"):
+    """Настройки напоминаний: mode, time, set_time"""
+    action: str
+    # Выбранный режим напоминаний для mode
+    mode: Optional[str] = None
+    # Час ежедневной сводки для set_time
+    hour: Optional[int] = None
+
+
+class SearchCallback(CallbackData, prefix="srch"):
+    """Листание результатов поиска; сам запрос хранится в данных FSM"""
+    action: str
+    page: int = 0
+
+
+class SelectCallback(CallbackData, prefix="sel"):
+    """Выбор нескольких задач проекта: toggle, page, complete, shift, delete,
+    confirm_delete, complete_overdue, cancel; выбранные id и курсоры страниц
+    хранятся в данных FSM"""
+    action: str
+    project_id: int
+    task_id: Optional[int] = None
+    # Номер текущей страницы списка задач: курсор вместе с id задачи
+    # не помещается в 64 байта callback_data
+    page: int = 0
+    # На сколько дней переносить дедлайны для shift
+    days: Optional[int] = None
+
+
+# Префикс callback_data -> класс для разбора
+CALLBACK_FACTORIES = {
+    factory.__prefix__: factory
+    for factory in (
+        MenuCallback, ProjectCallback, TaskCallback, SettingsCallback, SearchCallback, SelectCallback
+    )
+}
@@ -1,34 +1,53 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from keyboards.callback_data import (
+    MenuCallback, ProjectCallback, TaskCallback, SettingsCallback, SearchCallback, SelectCallback
+)
+
 
 def get_main_menu_keyboard():
     """Главное меню"""
     keyboard = InlineKeyboardBuilder()
     
     keyboard.add(
-        InlineKeyboardButton(text="📂 Мои проекты", callback_data="my_projects"),
-        InlineKeyboardButton(text="➕ Создать проект", callback_data="create_project"),
-        InlineKeyboardButton(text="❓ Помощь", callback_data="help_menu")
+        InlineKeyboardButton(text="📂 Мои проекты", callback_data=MenuCallback(action="projects").pack()),
+        InlineKeyboardButton(text="➕ Создать проект", callback_data=MenuCallback(action="create_project").pack()),
+        InlineKeyboardButton(text="⚙️ Настройки", callback_data=MenuCallback(action="settings").pack()),
+        InlineKeyboardButton(text="❓ Помощь", callback_data=MenuCallback(action="help").pack())
     )
     
     return keyboard.as_markup()
 
 
-def get_projects_keyboard(projects):
+def get_projects_keyboard(projects, next_cursor=None, is_first_page=True):
     """Клавиатура со списком проектов"""
     keyboard = InlineKeyboardBuilder()
     
     for project in projects:
+        text = f"📁 {project['name']}"
+        # Счетчик активных задач есть только у проектов из get_user_projects_with_stats
+        if 'active_tasks' in project:
+            text += f" ({project['active_tasks']})"
         keyboard.add(
             InlineKeyboardButton(
-                text=f"📁 {project['name']}",
-                callback_data=f"project_{project['id']}"
+                text=text,
+                callback_data=ProjectCallback(action="open", project_id=project['id']).pack()
             )
         )
     
+    # Листание страниц по курсору
+    if next_cursor:
+        keyboard.add(
+            InlineKeyboardButton(text="➡️ Далее", callback_data=MenuCallback(action="projects", cursor=next_cursor).pack())
+        )
+    if not is_first_page:
+        keyboard.add(
+            InlineKeyboardButton(text="⏮ В начало", callback_data=MenuCallback(action="projects").pack())
+        )
+    
     keyboard.add(
-        InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_main")
+        InlineKeyboardButton(text="⬅️ Назад", callback_data=MenuCallback(action="main").pack())
     )
     
     keyboard.adjust(1)
@@ -42,23 +61,27 @@ def get_project_actions_keyboard(project_id):
     keyboard.add(
         InlineKeyboardButton(
             text="📋 Задачи проекта",
-            callback_data=f"view_tasks_{project_id}"
+            callback_data=ProjectCallback(action="tasks", project_id=project_id).pack()
         ),
         InlineKeyboardButton(
             text="➕ Добавить задачу",
-            callback_data=f"add_task_to_{project_id}"
+            callback_data=ProjectCallback(action="add_task", project_id=project_id).pack()
+        ),
+        InlineKeyboardButton(
+            text="📥 Добавить списком",
+            callback_data=ProjectCallback(action="bulk_add", project_id=project_id).pack()
         ),
         InlineKeyboardButton(
             text="✏️ Редактировать",
-            callback_data=f"edit_project_{project_id}"
+            callback_data=ProjectCallback(action="edit", project_id=project_id).pack()
         ),
         InlineKeyboardButton(
             text="🗑️ Удалить",
-            callback_data=f"delete_project_{project_id}"
+            callback_data=ProjectCallback(action="delete", project_id=project_id).pack()
         ),
         InlineKeyboardButton(
             text="⬅️ Назад к проектам",
-            callback_data="my_projects"
+            callback_data=MenuCallback(action="projects").pack()
         )
     )
     
@@ -66,27 +89,51 @@ def get_project_actions_keyboard(project_id):
     return keyboard.as_markup()
 
 
-def get_tasks_keyboard(tasks, project_id):
+def get_tasks_keyboard(tasks, project_id, next_cursor=None, is_first_page=True):
     """Клавиатура со списком задач"""
     keyboard = InlineKeyboardBuilder()
     
     for task in tasks:
-        status_icon = "✅" if task['completed'] else "⏳"
+        status_icon = "✅" if task['status'] == 'завершено' else "⏳"
         keyboard.add(
             InlineKeyboardButton(
                 text=f"{status_icon} {task['title'][:30]}",
-                callback_data=f"task_{task['id']}"
+                callback_data=TaskCallback(action="open", task_id=task['id']).pack()
+            )
+        )
+    
+    # Листание страниц по курсору
+    if next_cursor:
+        keyboard.add(
+            InlineKeyboardButton(
+                text="➡️ Далее",
+                callback_data=ProjectCallback(action="tasks", project_id=project_id, cursor=next_cursor).pack()
+            )
+        )
+    if not is_first_page:
+        keyboard.add(
+            InlineKeyboardButton(
+                text="⏮ В начало",
+                callback_data=ProjectCallback(action="tasks", project_id=project_id).pack()
             )
         )
     
     keyboard.add(
+        InlineKeyboardButton(
+            text="☑️ Выбрать несколько",
+            callback_data=ProjectCallback(action="select", project_id=project_id).pack()
+        ),
+        InlineKeyboardButton(
+            text="🗄 Архив",
+            callback_data=ProjectCallback(action="archive", project_id=project_id).pack()
+        ),
         InlineKeyboardButton(
             text="➕ Добавить задачу",
-            callback_data=f"add_task_to_{project_id}"
+            callback_data=ProjectCallback(action="add_task", project_id=project_id).pack()
         ),
         InlineKeyboardButton(
             text="⬅️ Назад к проекту",
-            callback_data=f"project_{project_id}"
+            callback_data=ProjectCallback(action="open", project_id=project_id).pack()
         )
     )
     
@@ -94,6 +141,109 @@ def get_tasks_keyboard(tasks, project_id):
     return keyboard.as_markup()
 
 
+def get_archive_keyboard(project_id, next_cursor=None, is_first_page=True):
+    """Листание архива завершенных задач проекта"""
+    keyboard = InlineKeyboardBuilder()
+    
+    if next_cursor:
+        keyboard.add(
+            InlineKeyboardButton(
+                text="➡️ Далее",
+                callback_data=ProjectCallback(action="archive", project_id=project_id, cursor=next_cursor).pack()
+            )
+        )
+    if not is_first_page:
+        keyboard.add(
+            InlineKeyboardButton(
+                text="⏮ В начало",
+                callback_data=ProjectCallback(action="archive", project_id=project_id).pack()
+            )
+        )
+    
+    keyboard.add(
+        InlineKeyboardButton(
+            text="⬅️ Назад к задачам",
+            callback_data=ProjectCallback(action="tasks", project_id=project_id).pack()
+        )
+    )
+    
+    keyboard.adjust(1)
+    return keyboard.as_markup()
+
+
+def get_task_selection_keyboard(tasks, project_id, selected, page=0, has_next=False):
+    """Список задач в режиме выбора нескольких и групповые действия"""
+    keyboard = InlineKeyboardBuilder()
+    
+    for task in tasks:
+        mark = "☑️" if task['id'] in selected else "⬜"
+        keyboard.row(
+            InlineKeyboardButton(
+                text=f"{mark} {task['title'][:30]}",
+                callback_data=SelectCallback(
+                    action="toggle", project_id=project_id, task_id=task['id'], page=page
+                ).pack()
+            )
+        )
+    
+    # Листание страниц по номеру; выбор сохраняется между страницами
+    pager = []
+    if page:
+        pager.append(
+            InlineKeyboardButton(
+                text="⏮ В начало",
+                callback_data=SelectCallback(action="page", project_id=project_id).pack()
+            )
+        )
+    if has_next:
+        pager.append(
+            InlineKeyboardButton(
+                text="➡️ Далее",
+                callback_data=SelectCallback(action="page", project_id=project_id, page=page + 1).pack()
+            )
+        )
+    if pager:
+        keyboard.row(*pager)
+    
+    if selected:
+        count = len(selected)
+        keyboard.row(
+            InlineKeyboardButton(
+                text=f"✅ Завершить ({count})",
+                callback_data=SelectCallback(action="complete", project_id=project_id).pack()
+            ),
+            InlineKeyboardButton(
+                text=f"🗑️ Удалить ({count})",
+                callback_data=SelectCallback(action="delete", project_id=project_id).pack()
+            )
+        )
+        keyboard.row(
+            InlineKeyboardButton(
+                text="📅 +1 день",
+                callback_data=SelectCallback(action="shift", project_id=project_id, days=1).pack()
+            ),
+            InlineKeyboardButton(
+                text="📅 +1 неделя",
+                callback_data=SelectCallback(action="shift", project_id=project_id, days=7).pack()
+            )
+        )
+    
+    keyboard.row(
+        InlineKeyboardButton(
+            text="⚠️ Завершить все просроченные",
+            callback_data=SelectCallback(action="complete_overdue", project_id=project_id).pack()
+        )
+    )
+    keyboard.row(
+        InlineKeyboardButton(
+            text="❌ Отмена",
+            callback_data=SelectCallback(action="cancel", project_id=project_id).pack()
+        )
+    )
+    
+    return keyboard.as_markup()
+
+
 def get_task_actions_keyboard(task_id):
     """Действия с задачей"""
     keyboard = InlineKeyboardBuilder()
@@ -101,19 +251,19 @@ def get_task_actions_keyboard(task_id):
     keyboard.add(
         InlineKeyboardButton(
             text="✅ Отметить выполненной",
-            callback_data=f"complete_task_{task_id}"
+            callback_data=TaskCallback(action="complete", task_id=task_id).pack()
         ),
         InlineKeyboardButton(
             text="✏️ Редактировать",
-            callback_data=f"edit_task_{task_id}"
+            callback_data=TaskCallback(action="edit", task_id=task_id).pack()
         ),
         InlineKeyboardButton(
             text="🗑️ Удалить",
-            callback_data=f"delete_task_{task_id}"
+            callback_data=TaskCallback(action="delete", task_id=task_id).pack()
         ),
         InlineKeyboardButton(
             text="⬅️ Назад к задачам",
-            callback_data="my_projects"
+            callback_data=MenuCallback(action="projects").pack()
         )
     )
     
@@ -125,14 +275,25 @@ def get_confirm_delete_keyboard(entity_type, entity_id):
     """Подтверждение удаления"""
     keyboard = InlineKeyboardBuilder()
     
+    if entity_type == "project":
+        confirm = ProjectCallback(action="confirm_delete", project_id=entity_id)
+        cancel = ProjectCallback(action="cancel_delete", project_id=entity_id)
+    elif entity_type == "selection":
+        # entity_id - проект, выбранные задачи которого удаляются
+        confirm = SelectCallback(action="confirm_delete", project_id=entity_id)
+        cancel = SelectCallback(action="page", project_id=entity_id)
+    else:
+        confirm = TaskCallback(action="confirm_delete", task_id=entity_id)
+        cancel = TaskCallback(action="cancel_delete", task_id=entity_id)
+    
     keyboard.add(
         InlineKeyboardButton(
             text="✅ Да, удалить",
-            callback_data=f"confirm_delete_{entity_type}_{entity_id}"
+            callback_data=confirm.pack()
         ),
         InlineKeyboardButton(
             text="❌ Нет, отмена",
-            callback_data=f"cancel_delete_{entity_type}_{entity_id}"
+            callback_data=cancel.pack()
         )
     )
     
@@ -147,19 +308,19 @@ def get_edit_task_fields_keyboard(task_id):
     keyboard.add(
         InlineKeyboardButton(
             text="📝 Название",
-            callback_data=f"edit_task_field_{task_id}_title"
+            callback_data=TaskCallback(action="edit_field", task_id=task_id, field="title").pack()
         ),
         InlineKeyboardButton(
             text="📄 Описание",
-            callback_data=f"edit_task_field_{task_id}_description"
+            callback_data=TaskCallback(action="edit_field", task_id=task_id, field="description").pack()
         ),
         InlineKeyboardButton(
             text="📅 Дедлайн",
-            callback_data=f"edit_task_field_{task_id}_deadline"
+            callback_data=TaskCallback(action="edit_field", task_id=task_id, field="deadline").pack()
         ),
         InlineKeyboardButton(
             text="⬅️ Назад",
-            callback_data=f"task_{task_id}"
+            callback_data=TaskCallback(action="open", task_id=task_id).pack()
         )
     )
     
@@ -174,7 +335,7 @@ def get_cancel_keyboard():
     keyboard.add(
         InlineKeyboardButton(
             text="❌ Отмена",
-            callback_data="back_to_main"
+            callback_data=MenuCallback(action="main").pack()
         )
     )
     
@@ -188,15 +349,105 @@ def get_help_keyboard():
     keyboard.add(
         InlineKeyboardButton(
             text="📋 Команды",
-            callback_data="help_commands"
+            callback_data=MenuCallback(action="help_commands").pack()
         ),
         InlineKeyboardButton(
             text="📅 Формат даты",
-            callback_data="help_date_format"
+            callback_data=MenuCallback(action="help_date_format").pack()
         ),
         InlineKeyboardButton(
             text="⬅️ Главное меню",
-            callback_data="back_to_main"
+            callback_data=MenuCallback(action="main").pack()
+        )
+    )
+    
+    keyboard.adjust(1)
+    return keyboard.as_markup()
+
+
+def get_settings_keyboard(settings):
+    """Настройки напоминаний: режим и время сводки"""
+    keyboard = InlineKeyboardBuilder()
+    
+    for mode, title in (("tasks", "🔔 По каждой задаче"), ("digest", "🗓 Ежедневная сводка")):
+        mark = "✔️ " if settings['reminder_mode'] == mode else ""
+        keyboard.add(
+            InlineKeyboardButton(
+                text=f"{mark}{title}",
+                callback_data=SettingsCallback(action="mode", mode=mode).pack()
+            )
+        )
+    
+    keyboard.add(
+        InlineKeyboardButton(
+            text=f"🕘 Время сводки: {settings['digest_time']:%H:%M}",
+            callback_data=SettingsCallback(action="time").pack()
+        ),
+        InlineKeyboardButton(
+            text="⬅️ Главное меню",
+            callback_data=MenuCallback(action="main").pack()
+        )
+    )
+    
+    keyboard.adjust(1)
+    return keyboard.as_markup()
+
+
+def get_digest_time_keyboard(current_hour):
+    """Выбор часа ежедневной сводки"""
+    keyboard = InlineKeyboardBuilder()
+    
+    for hour in range(24):
+        mark = "✔️" if hour == current_hour else ""
+        keyboard.add(
+            InlineKeyboardButton(
+                text=f"{mark}{hour:02d}:00",
+                callback_data=SettingsCallback(action="set_time", hour=hour).pack()
+            )
+        )
+    keyboard.add(
+        InlineKeyboardButton(
+            text="⬅️ Назад",
+            callback_data=MenuCallback(action="settings").pack()
+        )
+    )
+    
+    keyboard.adjust(4)
+    return keyboard.as_markup()
+
+
+def get_search_keyboard(tasks, page=0, next_page=None):
+    """Результаты поиска: переход к задаче и листание страниц"""
+    keyboard = InlineKeyboardBuilder()
+    
+    for task in tasks:
+        status_icon = "✅" if task['status'] == 'завершено' else "⏳"
+        keyboard.add(
+            InlineKeyboardButton(
+                text=f"{status_icon} {task['title'][:30]}",
+                callback_data=TaskCallback(action="open", task_id=task['id']).pack()
+            )
+        )
+    
+    if next_page is not None:
+        keyboard.add(
+            InlineKeyboardButton(
+                text="➡️ Далее",
+                callback_data=SearchCallback(action="page", page=next_page).pack()
+            )
+        )
+    if page > 0:
+        keyboard.add(
+            InlineKeyboardButton(
+                text="⬅️ Назад",
+                callback_data=SearchCallback(action="page", page=page - 1).pack()
+            )
+        )
+    
+    keyboard.add(
+        InlineKeyboardButton(
+            text="🏠 Главное меню",
+            callback_data=MenuCallback(action="main").pack()
         )
     )
     
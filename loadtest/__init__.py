@@ -0,0 +1 @@
+# Этот файл нужен для корректного импорта пакета
@@ -0,0 +1,59 @@
+"""Сравнение скорости создания задач по одной и списком.
+
+Запуск (DATABASE_URL указывает на тестовую базу):
+    python -m loadtest.bulk_insert --tasks 5000 --batch 100
+
+Создает задачи служебного пользователя через Database.create_task и через
+Database.create_tasks_bulk пачками по --batch и печатает задач в секунду.
+Тестовый проект удаляется в конце.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from db import Database
+
+# Служебный пользователь, которому принадлежат тестовые задачи
+TEST_USER_ID = -1
+
+
+async def main_async(args):
+    database = Database()
+    await database.create_pool()
+    project_id = await database.create_project(TEST_USER_ID, "Проверка вставки")
+    deadline = datetime.now() + timedelta(days=7)
+    tasks = [
+        {"title": f"Задача {number}", "deadline": deadline, "description": "описание"}
+        for number in range(args.tasks)
+    ]
+    try:
+        started = time.perf_counter()
+        for task in tasks:
+            await database.create_task(project_id, task['title'], task['description'], task['deadline'])
+        single = time.perf_counter() - started
+        print(f"create_task: {args.tasks / single:.0f} задач/с ({single:.2f} с)")
+
+        started = time.perf_counter()
+        for offset in range(0, len(tasks), args.batch):
+            await database.create_tasks_bulk(project_id, TEST_USER_ID, tasks[offset:offset + args.batch])
+        bulk = time.perf_counter() - started
+        print(f"create_tasks_bulk по {args.batch}: {args.tasks / bulk:.0f} задач/с ({bulk:.2f} с), "
+              f"быстрее в {single / bulk:.1f} раза")
+    finally:
+        await database.delete_project(project_id, TEST_USER_ID)
+        while await database.purge_deleted_projects():
+            pass
+        await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость создания задач по одной и списком")
+    parser.add_argument("--tasks", type=int, default=5000, help="число задач в каждом способе")
+    parser.add_argument("--batch", type=int, default=100, help="задач в одном сообщении со списком")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Замер стоимости выбора обработчика нажатия кнопки.
+
+Запуск (БД и Bot API не нужны):
+    python -m loadtest.dispatch --updates 100000
+
+Сравнивает прежнюю цепочку фильтров lambda c: c.data.startswith(...), которые
+aiogram проверяет по очереди, с таблицей маршрутов handlers.callbacks
+(разбор CallbackData и поиск по (префикс, действие)). Оба варианта проходят
+через Router.propagate_event с пустыми обработчиками, так что замеряется
+только выбор обработчика. Печатает среднее время на обновление для каждой
+кнопки и в среднем по всем.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from aiogram import Router
+from aiogram.types import CallbackQuery, Chat, Message, User
+
+from handlers import callbacks
+from keyboards.callback_data import MenuCallback, ProjectCallback, TaskCallback
+
+# Фильтры обработчиков до перехода на таблицу маршрутов, в порядке регистрации
+OLD_FILTERS = [
+    lambda c: c.data == "back_to_main",
+    lambda c: c.data == "create_project",
+    lambda c: c.data == "my_projects" or c.data.startswith("my_projects_"),
+    lambda c: c.data.startswith("project_"),
+    lambda c: c.data.startswith("add_task_"),
+    lambda c: c.data.startswith("edit_project_"),
+    lambda c: c.data.startswith("delete_project_"),
+    lambda c: c.data.startswith("confirm_delete_project_"),
+    lambda c: c.data.startswith("cancel_delete_"),
+    lambda c: c.data.startswith("view_tasks_"),
+    lambda c: c.data.startswith("task_"),
+    lambda c: c.data.startswith("complete_task_"),
+    lambda c: c.data.startswith("edit_task_"),
+    lambda c: c.data.startswith("edit_task_field_"),
+    lambda c: c.data.startswith("delete_task_"),
+    lambda c: c.data.startswith("confirm_delete_task_"),
+]
+
+# Одни и те же кнопки в прежнем и текущем формате callback_data
+BUTTONS: List[Tuple[str, str]] = [
+    ("back_to_main", MenuCallback(action="main").pack()),
+    ("create_project", MenuCallback(action="create_project").pack()),
+    ("my_projects", MenuCallback(action="projects").pack()),
+    ("project_5", ProjectCallback(action="open", project_id=5).pack()),
+    ("add_task_to_5", ProjectCallback(action="add_task", project_id=5).pack()),
+    ("edit_project_5", ProjectCallback(action="edit", project_id=5).pack()),
+    ("delete_project_5", ProjectCallback(action="delete", project_id=5).pack()),
+    ("confirm_delete_project_5", ProjectCallback(action="confirm_delete", project_id=5).pack()),
+    ("cancel_delete_5", ProjectCallback(action="cancel_delete", project_id=5).pack()),
+    ("view_tasks_5", ProjectCallback(action="tasks", project_id=5).pack()),
+    ("task_7", TaskCallback(action="open", task_id=7).pack()),
+    ("complete_task_7", TaskCallback(action="complete", task_id=7).pack()),
+    ("edit_task_7", TaskCallback(action="edit", task_id=7).pack()),
+    ("edit_task_field_title_7", TaskCallback(action="edit_field", task_id=7, field="title").pack()),
+    ("delete_task_7", TaskCallback(action="delete", task_id=7).pack()),
+    ("confirm_delete_task_7", TaskCallback(action="confirm_delete", task_id=7).pack()),
+]
+
+
+async def _noop(*args, **kwargs):
+    pass
+
+
+def build_old_router() -> Router:
+    """Роутер с прежней цепочкой фильтров и пустыми обработчиками"""
+    router = Router(name="old")
+    for callback_filter in OLD_FILTERS:
+        router.callback_query.register(_noop, callback_filter)
+    return router
+
+
+def build_new_router() -> Router:
+    """Роутер с dispatch_callback; обработчики в таблице заменены пустыми"""
+    for key in callbacks._routes:
+        callbacks._routes[key] = _noop
+    router = Router(name="new")
+    router.callback_query.register(callbacks.dispatch_callback)
+    return router
+
+
+def make_callback(data: str) -> CallbackQuery:
+    user = User(id=1, is_bot=False, first_name="load")
+    message = Message(message_id=1, date=datetime.now(), chat=Chat(id=1, type="private"))
+    return CallbackQuery(id="1", from_user=user, chat_instance="1", data=data, message=message)
+
+
+async def measure(router: Router, data: str, updates: int) -> float:
+    """Среднее время выбора обработчика в микросекундах"""
+    callback = make_callback(data)
+    start = time.perf_counter()
+    for _ in range(updates):
+        await router.propagate_event("callback_query", callback, state=None)
+    return (time.perf_counter() - start) / updates * 10 ** 6
+
+
+async def main_async(args):
+    old_router = build_old_router()
+    new_router = build_new_router()
+    totals: Dict[str, float] = {"old": 0.0, "new": 0.0}
+    print(f"{'кнопка':<26} {'startswith, мкс':>16} {'таблица, мкс':>14}")
+    for old_data, new_data in BUTTONS:
+        old = await measure(old_router, old_data, args.updates)
+        new = await measure(new_router, new_data, args.updates)
+        totals["old"] += old
+        totals["new"] += new
+        print(f"{old_data:<26} {old:>16.1f} {new:>14.1f}")
+    print(f"{'в среднем':<26} {totals['old'] / len(BUTTONS):>16.1f} {totals['new'] / len(BUTTONS):>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость выбора обработчика кнопки")
+    parser.add_argument("--updates", type=int, default=20000, help="обновлений на каждую кнопку")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
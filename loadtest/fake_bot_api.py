@@ -0,0 +1,101 @@
+"""Локальная замена Telegram Bot API для нагрузочного тестирования.
+
+Запуск:
+    python -m loadtest.fake_bot_api --port 8081 --latency-ms 50 --rate-limit 0.01
+
+Бот направляется сюда переменной окружения TELEGRAM_API_URL=http://localhost:8081.
+Статистика вызовов доступна по GET /stats.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+_message_ids = itertools.count(1)
+
+
+def _fake_message(params) -> dict:
+    """Минимальный объект Message в ответ на отправку или редактирование"""
+    chat_id = int(params.get("chat_id") or 0)
+    return {
+        "message_id": int(params.get("message_id") or next(_message_ids)),
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "text": params.get("text", ""),
+    }
+
+
+class FakeBotApi:
+    """Записывает вызовы методов и отвечает с заданной задержкой и долей 429"""
+
+    MESSAGE_METHODS = {"sendmessage", "editmessagetext", "senddocument"}
+
+    def __init__(self, latency_ms: float, rate_limit_ratio: float, retry_after: int):
+        self.latency = latency_ms / 1000
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.rate_limited = Counter()
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await request.post()
+        self.calls[method] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if random.random() < self.rate_limit_ratio:
+            self.rate_limited[method] += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            })
+
+        if method.lower() in self.MESSAGE_METHODS:
+            result = _fake_message(params)
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "calls": dict(self.calls),
+            "rate_limited": dict(self.rate_limited),
+            "total": sum(self.calls.values()),
+        })
+
+    async def handle_reset(self, request: web.Request) -> web.Response:
+        self.calls.clear()
+        self.rate_limited.clear()
+        return web.json_response({"ok": True})
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/stats", self.handle_stats)
+        app.router.add_post("/stats/reset", self.handle_reset)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный Bot API для нагрузочных тестов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0, help="задержка ответа")
+    parser.add_argument("--rate-limit", type=float, default=0, help="доля ответов 429, 0..1")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429")
+    args = parser.parse_args()
+
+    api = FakeBotApi(args.latency_ms, args.rate_limit, args.retry_after)
+    web.run_app(api.build_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
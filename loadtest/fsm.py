@@ -0,0 +1,80 @@
+"""Сравнение хранилищ FSM: MemoryStorage и PostgresStorage.
+
+Запуск (DATABASE_URL указывает на тестовую базу):
+    python -m loadtest.fsm --users 100 --updates 20
+
+Каждый служебный пользователь проходит диалог из --updates обновлений, как
+при создании задачи: get_state в начале обновления, get_data, update_data,
+смена состояния каждые несколько шагов и сброс изменений в конце (как
+StorageFlushMiddleware). Пользователи работают параллельно. Печатает
+p50/p95/p99 времени обработки обновления хранилищем и обновлений в секунду.
+Тестовые состояния удаляются в конце.
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from db import db
+from loadtest.run import percentile
+from storage import PostgresStorage
+
+# Смены состояния диалога создания задачи
+STATES = ["TaskStates:waiting_for_title", "TaskStates:waiting_for_description",
+          "TaskStates:waiting_for_deadline", None]
+
+
+async def dialog(storage: BaseStorage, user_id: int, updates: int, latencies: List[float]):
+    """Обновления одного пользователя; время каждого пишется в latencies"""
+    key = StorageKey(bot_id=0, chat_id=user_id, user_id=user_id)
+    for step in range(updates):
+        start = time.perf_counter()
+        await storage.get_state(key)
+        await storage.get_data(key)
+        await storage.update_data(key, {f"field_{step % 4}": f"значение {step}"})
+        if step % 5 == 4:
+            await storage.set_state(key, STATES[step // 5 % len(STATES)])
+        if isinstance(storage, PostgresStorage):
+            await storage.flush()
+        latencies.append(time.perf_counter() - start)
+
+
+async def measure(name: str, storage: BaseStorage, users: int, updates: int):
+    latencies: List[float] = []
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        dialog(storage, -user, updates, latencies) for user in range(1, users + 1)
+    ])
+    elapsed = time.perf_counter() - started
+    print(f"{name}: p50/p95/p99 {percentile(latencies, 50) * 1000:.2f} / "
+          f"{percentile(latencies, 95) * 1000:.2f} / {percentile(latencies, 99) * 1000:.2f} мс, "
+          f"{len(latencies) / elapsed:.0f} обновлений/с")
+
+
+async def main_async(args):
+    await measure("MemoryStorage", MemoryStorage(), args.users, args.updates)
+
+    await db.create_pool()
+    storage = PostgresStorage()
+    try:
+        await measure("PostgresStorage", storage, args.users, args.updates)
+    finally:
+        await storage.close()
+        async with db.acquire("cleanup_fsm") as conn:
+            await conn.execute("DELETE FROM fsm_states WHERE key LIKE 'fsm:-%'")
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение хранилищ FSM")
+    parser.add_argument("--users", type=int, default=100, help="число параллельных пользователей")
+    parser.add_argument("--updates", type=int, default=20, help="обновлений на пользователя")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
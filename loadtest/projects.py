@@ -0,0 +1,119 @@
+"""Сравнение загрузки списка проектов со счетчиками задач: N+1 и один запрос.
+
+Запуск (DATABASE_URL указывает на тестовую базу):
+    python -m loadtest.projects --sizes 10 100 1000 --tasks 20 --repeat 20
+
+Для каждого размера заводит служебного пользователя с таким числом проектов
+по --tasks задач в каждом и загружает их двумя способами: прежним (список
+проектов, затем отдельный COUNT по каждому проекту, как get_project_tasks_count)
+и через Database.get_user_projects_with_stats сразу на все проекты. Кэш
+пользователя перед каждым замером сбрасывается. Печатает число запросов к БД
+и p50/p95 времени загрузки. Тестовые данные удаляются в конце.
+"""
+import argparse
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+from db import Database
+from loadtest.run import percentile
+
+
+def count_round_trips(database: Database) -> Dict[str, int]:
+    """Подмена database.acquire, считающая запросы методов Database"""
+    counter = {"queries": 0}
+    acquire = database.acquire
+
+    @asynccontextmanager
+    async def counting_acquire(name: str):
+        counter["queries"] += 1
+        async with acquire(name) as conn:
+            yield conn
+
+    database.acquire = counting_acquire
+    return counter
+
+
+async def load_n_plus_one(database: Database, user_id: int) -> List[dict]:
+    """Прежняя загрузка: список проектов и отдельный COUNT задач на каждый"""
+    projects = await database.get_user_projects(user_id)
+    for project in projects:
+        async with database.acquire("get_project_tasks_count") as conn:
+            project['total_tasks'] = await conn.fetchval("""
+                SELECT COUNT(*) FROM tasks WHERE project_id = $1
+            """, project['id'])
+    return projects
+
+
+async def load_with_stats(database: Database, user_id: int, size: int) -> List[dict]:
+    projects, _ = await database.get_user_projects_with_stats(user_id, limit=size)
+    return projects
+
+
+async def seed(database: Database, user_id: int, projects: int, tasks: int):
+    """Проекты пользователя по tasks задач в каждом"""
+    async with database.acquire("seed_projects") as conn:
+        project_ids = await conn.fetch("""
+            INSERT INTO projects (user_id, name)
+            SELECT $1, 'Проект ' || n FROM generate_series(1, $2) AS n
+            RETURNING id
+        """, user_id, projects)
+        deadline = datetime.now() + timedelta(days=7)
+        await conn.copy_records_to_table("tasks", columns=["project_id", "title", "deadline"], records=[
+            (row['id'], f"Задача {number}", deadline)
+            for row in project_ids for number in range(tasks)
+        ])
+        await conn.execute("ANALYZE tasks")
+
+
+async def measure(database: Database, counter: Dict[str, int], user_id: int, repeat: int,
+                  load: Callable[[], Awaitable[List[dict]]]):
+    """Запросов к БД на одну загрузку и p50/p95 ее времени в миллисекундах"""
+    timings = []
+    counter["queries"] = 0
+    for _ in range(repeat):
+        database.cache.invalidate(user_id)
+        start = time.perf_counter()
+        await load()
+        timings.append((time.perf_counter() - start) * 1000)
+    return counter["queries"] / repeat, percentile(timings, 50), percentile(timings, 95)
+
+
+async def main_async(args):
+    database = Database()
+    await database.create_pool()
+    counter = count_round_trips(database)
+    user_ids = [-size for size in args.sizes]
+    try:
+        print(f"{'проектов':>9} {'способ':<12} {'запросов':>9} {'p50, мс':>9} {'p95, мс':>9}")
+        for size, user_id in zip(args.sizes, user_ids):
+            await seed(database, user_id, size, args.tasks)
+            cases = [
+                ("N+1", lambda: load_n_plus_one(database, user_id)),
+                ("один запрос", lambda: load_with_stats(database, user_id, size)),
+            ]
+            results = []
+            for name, load in cases:
+                queries, p50, p95 = await measure(database, counter, user_id, args.repeat, load)
+                results.append(p50)
+                print(f"{size:>9} {name:<12} {queries:>9.0f} {p50:>9.2f} {p95:>9.2f}")
+            print(f"{'':>9} быстрее в {results[0] / results[1]:.1f} раза")
+    finally:
+        async with database.acquire("cleanup_projects") as conn:
+            await conn.execute("DELETE FROM projects WHERE user_id = ANY($1::bigint[])", user_ids)
+        await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка проектов со счетчиками: N+1 и один запрос")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="числа проектов")
+    parser.add_argument("--tasks", type=int, default=20, help="задач в каждом проекте")
+    parser.add_argument("--repeat", type=int, default=20, help="замеров каждого способа")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
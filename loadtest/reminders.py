@@ -0,0 +1,110 @@
+"""Проверка распределения напоминаний между репликами на одной БД.
+
+Запуск (DATABASE_URL указывает на тестовую базу):
+    python -m loadtest.reminders --tasks 2000 --workers 1,2,4 --send-ms 5 --crash
+
+Для каждого числа воркеров создает задачи с наступившим напоминанием, запускает
+воркеров с отдельными пулами (как разные реплики) и проверяет, что каждое
+напоминание отправлено ровно один раз. С --crash первый воркер бросает первую
+захваченную пачку, и ее должны забрать другие после истечения аренды.
+Печатает время и пропускную способность по числу воркеров.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List
+
+import db as db_module
+from db import Database
+
+# Служебный пользователь, которому принадлежат тестовые задачи
+TEST_USER_ID = -1
+
+
+async def seed(database: Database, count: int) -> int:
+    """Проект с count задачами, напоминание по которым уже наступило"""
+    project_id = await database.create_project(TEST_USER_ID, "Проверка напоминаний")
+    async with database.acquire("seed_reminders") as conn:
+        await conn.execute("""
+            INSERT INTO tasks (project_id, title, deadline, next_reminder_at)
+            SELECT $1, 'Напоминание ' || n, NOW() + INTERVAL '30 minutes', NOW() - INTERVAL '1 second'
+            FROM generate_series(1, $2) AS n
+        """, project_id, count)
+    return project_id
+
+
+async def worker(database: Database, send_delay: float, delivered: Counter, crash: bool):
+    """Цикл реплики: аренда пачки, отправка, подтверждение"""
+    while True:
+        tasks = await database.claim_due_reminders()
+        if not tasks:
+            expiry = await database.get_reminder_lease_expiry()
+            if expiry is None:
+                return
+            # Ждем истечения чужой аренды
+            await asyncio.sleep(max((expiry - datetime.now()).total_seconds(), 0.1))
+            continue
+        if crash:
+            # Реплика "упала" после захвата: пачка не подтверждается
+            crash = False
+            continue
+        for task in tasks:
+            await asyncio.sleep(send_delay)
+            delivered[task['id']] += 1
+        await database.complete_reminders([task['id'] for task in tasks])
+
+
+async def run_round(databases: List[Database], tasks: int, send_delay: float, crash: bool):
+    project_id = await seed(databases[0], tasks)
+    delivered: Counter = Counter()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*[
+            worker(database, send_delay, delivered, crash and index == 0)
+            for index, database in enumerate(databases)
+        ])
+        elapsed = time.perf_counter() - started
+    finally:
+        await databases[0].delete_project(project_id, TEST_USER_ID)
+        while await databases[0].purge_deleted_projects():
+            pass
+
+    duplicates = sum(1 for count in delivered.values() if count > 1)
+    missing = tasks - len(delivered)
+    print(f"Воркеров: {len(databases)}, время: {elapsed:.2f} с, "
+          f"{tasks / elapsed:.0f} напоминаний/с, повторов: {duplicates}, потеряно: {missing}")
+    return duplicates == 0 and missing == 0
+
+
+async def main_async(args):
+    # Короткая аренда, чтобы проверка с --crash не ждала минутами
+    db_module.REMINDER_LEASE = timedelta(seconds=args.lease)
+    ok = True
+    for count in [int(value) for value in args.workers.split(",")]:
+        databases = [Database() for _ in range(count)]
+        # Реплики стартуют одновременно, как при развертывании
+        await asyncio.gather(*[database.create_pool() for database in databases])
+        try:
+            ok = await run_round(databases, args.tasks, args.send_ms / 1000, args.crash) and ok
+        finally:
+            for database in databases:
+                await database.close()
+    if not ok:
+        raise SystemExit("Обнаружены повторные или потерянные напоминания")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка напоминаний на нескольких репликах")
+    parser.add_argument("--tasks", type=int, default=1000, help="число наступивших напоминаний")
+    parser.add_argument("--workers", default="1,2,4", help="числа воркеров через запятую")
+    parser.add_argument("--send-ms", type=float, default=5, help="имитация отправки одного сообщения")
+    parser.add_argument("--lease", type=float, default=2, help="срок аренды, с")
+    parser.add_argument("--crash", action="store_true", help="первый воркер бросает первую пачку")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
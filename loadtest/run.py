@@ -0,0 +1,204 @@
+"""Генератор нагрузки на /webhook синтетическими обновлениями Telegram.
+
+Запуск (бот с TELEGRAM_API_URL на loadtest.fake_bot_api и WEBHOOK_URL):
+    python -m loadtest.run --url http://localhost:8000/webhook --rate 100 --duration 30
+
+Текстовый ввод проходит настоящий диалог добавления задач списком: синтетический
+пользователь нажимает «Добавить списком» в своем проекте, бот переводит его в
+состояние TaskStates.waiting_for_bulk_tasks, и следующим обновлением приходят
+строки задач. Проекты для этого создаются в базе бота (нужен тот же DATABASE_URL)
+и удаляются в конце. Обновления одного пользователя отправляются по очереди,
+как от живого человека.
+
+Печатает p50/p95/p99 задержки ответа вебхука, пропускную способность и долю ошибок.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import aiohttp
+
+from db import Database
+from handlers.fsm_handlers import DEADLINE_FORMAT
+from keyboards.callback_data import ProjectCallback
+
+_update_ids = itertools.count(int(time.time()))
+
+# Нажатия кнопок, не требующие существующих записей в БД
+CALLBACK_DATA = ["menu:projects:", "menu:main:", "menu:create_project:"]
+COMMANDS = ["/start", "/help"]
+# Задач в одном сообщении диалога добавления списком
+BULK_LINES = 3
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"load{user_id}"}
+
+
+def _message(user_id: int, text: str) -> dict:
+    return {
+        "message_id": random.randint(1, 10 ** 6),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+        "text": text,
+    }
+
+
+def _callback_query(user_id: int, data: str) -> dict:
+    return {
+        "id": str(random.randint(1, 10 ** 12)),
+        "from": _user(user_id),
+        "chat_instance": str(user_id),
+        "message": _message(user_id, "menu"),
+        "data": data,
+    }
+
+
+def build_update(user_id: int, kind: str) -> dict:
+    """Синтетическое обновление: команда или нажатие кнопки"""
+    update = {"update_id": next(_update_ids)}
+    if kind == "command":
+        text = random.choice(COMMANDS)
+        message = _message(user_id, text)
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        update["message"] = message
+    else:
+        update["callback_query"] = _callback_query(user_id, random.choice(CALLBACK_DATA))
+    return update
+
+
+def build_bulk_dialog(user_id: int, project_id: int) -> List[dict]:
+    """Диалог ввода текста в FSM: кнопка «Добавить списком», затем строки задач"""
+    button = ProjectCallback(action="bulk_add", project_id=project_id).pack()
+    deadline = datetime.now() + timedelta(days=random.randint(1, 30))
+    lines = "\n".join(
+        f"Нагрузочная задача {random.randint(1, 10 ** 6)} | {deadline.strftime(DEADLINE_FORMAT)}"
+        for _ in range(BULK_LINES)
+    )
+    return [
+        {"update_id": next(_update_ids), "callback_query": _callback_query(user_id, button)},
+        {"update_id": next(_update_ids), "message": _message(user_id, lines)},
+    ]
+
+
+async def create_projects(database: Database, users: int) -> Dict[int, int]:
+    """Проект каждого синтетического пользователя: user_id -> project_id"""
+    async with database.acquire("loadtest_projects") as conn:
+        rows = await conn.fetch("""
+            INSERT INTO projects (user_id, name)
+            SELECT u, 'Нагрузочный проект'
+            FROM generate_series(1, $1::bigint) AS u
+            RETURNING id, user_id
+        """, users)
+    return {row['user_id']: row['id'] for row in rows}
+
+
+async def delete_projects(database: Database, project_ids: List[int]):
+    """Удаление проектов нагрузочного теста вместе с созданными задачами"""
+    async with database.acquire("loadtest_cleanup") as conn:
+        await conn.execute("DELETE FROM projects WHERE id = ANY($1::int[])", project_ids)
+
+
+def percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(int(len(values) * percent / 100), len(values) - 1)
+    return values[index]
+
+
+async def run(url: str, rate: float, duration: float, users: int, mix: dict):
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    kinds = [kind for kind in mix if mix[kind] > 0]
+    weights = [mix[kind] for kind in kinds]
+    # Следующее обновление пользователя уходит после ответа на предыдущее
+    user_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    database = None
+    projects: Dict[int, int] = {}
+    if "text" in kinds:
+        database = Database()
+        await database.create_pool()
+        projects = await create_projects(database, users)
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            async def post(update: dict) -> bool:
+                start = time.perf_counter()
+                try:
+                    async with session.post(url, json=update) as response:
+                        await response.read()
+                        statuses[response.status] += 1
+                except Exception as e:
+                    statuses[type(e).__name__] += 1
+                    return False
+                latencies.append(time.perf_counter() - start)
+                return response.status == 200
+
+            async def send(user_id: int, kind: str):
+                if kind == "text":
+                    updates = build_bulk_dialog(user_id, projects[user_id])
+                else:
+                    updates = [build_update(user_id, kind)]
+                async with user_locks[user_id]:
+                    for update in updates:
+                        # Без перехода в состояние строки задач не имеют смысла
+                        if not await post(update):
+                            break
+
+            pending = set()
+            started = time.perf_counter()
+            scheduled = 0
+            # Обновления отправляются по расписанию, не дожидаясь ответов
+            while time.perf_counter() - started < duration:
+                target = started + scheduled / rate
+                delay = target - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                kind = random.choices(kinds, weights)[0]
+                task = asyncio.create_task(send(random.randint(1, users), kind))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                scheduled += 1
+            if pending:
+                await asyncio.wait(pending)
+            elapsed = time.perf_counter() - started
+    finally:
+        if database:
+            await delete_projects(database, list(projects.values()))
+            await database.close()
+
+    sent = sum(statuses.values())
+    errors = sum(count for status, count in statuses.items() if status != 200)
+    print(f"Отправлено обновлений: {sent} за {elapsed:.1f} с")
+    print(f"Пропускная способность: {len(latencies) / elapsed:.1f} обновлений/с")
+    print(f"Задержка p50/p95/p99: {percentile(latencies, 50) * 1000:.1f} / "
+          f"{percentile(latencies, 95) * 1000:.1f} / {percentile(latencies, 99) * 1000:.1f} мс")
+    print(f"Ошибки: {errors} ({errors / sent * 100 if sent else 0:.2f}%), статусы: {dict(statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест вебхука")
+    parser.add_argument("--url", default="http://localhost:8000/webhook")
+    parser.add_argument("--rate", type=float, default=50, help="обновлений в секунду")
+    parser.add_argument("--duration", type=float, default=30, help="длительность, с")
+    parser.add_argument("--users", type=int, default=100, help="число разных пользователей")
+    parser.add_argument("--commands", type=float, default=1, help="доля команд")
+    parser.add_argument("--callbacks", type=float, default=3, help="доля нажатий кнопок")
+    parser.add_argument("--texts", type=float, default=1,
+                        help="доля диалогов добавления задач списком (нужен DATABASE_URL бота)")
+    args = parser.parse_args()
+
+    mix = {"command": args.commands, "callback": args.callbacks, "text": args.texts}
+    asyncio.run(run(args.url, args.rate, args.duration, args.users, mix))
+
+
+if __name__ == "__main__":
+    main()
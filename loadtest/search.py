@@ -0,0 +1,126 @@
+"""Замер задержки полнотекстового поиска задач на большом объеме.
+
+Запуск (DATABASE_URL указывает на тестовую базу):
+    python -m loadtest.search --tasks 1000000 --users 1000 --queries 500
+
+Заполняет базу задачами служебных пользователей (отрицательные user_id),
+выполняет Database.search_tasks для случайных пользователей и запросов и печатает
+p50/p95/p99. С --baseline для сравнения замеряет тот же поиск через ILIKE.
+Тестовые данные удаляются в конце, если не указан --keep.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from db import Database
+from loadtest.run import percentile
+
+WORDS = [
+    "отчет", "встреча", "клиент", "договор", "презентация", "бюджет", "релиз",
+    "тестирование", "документация", "согласование", "оплата", "счет", "поставка",
+    "интервью", "анализ", "дизайн", "макет", "сервер", "база", "миграция",
+    "квартал", "план", "стратегия", "маркетинг", "рассылка", "звонок", "письмо",
+    "исправить", "проверить", "подготовить", "отправить", "обновить", "собрать",
+    "срочно", "май", "июнь", "команда", "партнер", "выставка", "аудит",
+]
+
+
+def _text(words: int) -> str:
+    return " ".join(random.choices(WORDS, k=words))
+
+
+async def seed(database: Database, tasks: int, users: int, projects_per_user: int) -> List[int]:
+    """Проекты и задачи служебных пользователей; возвращает их user_id"""
+    user_ids = [-user for user in range(1, users + 1)]
+    async with database.acquire("seed_search") as conn:
+        project_ids = await conn.fetch("""
+            INSERT INTO projects (user_id, name)
+            SELECT u, 'Проект ' || ($2::text[])[1 + floor(random() * array_length($2::text[], 1))::int]
+            FROM unnest($1::bigint[]) AS u, generate_series(1, $3)
+            RETURNING id
+        """, user_ids, WORDS, projects_per_user)
+        project_ids = [row['id'] for row in project_ids]
+
+        now = datetime.now()
+        batch = []
+        for _ in range(tasks):
+            batch.append((
+                random.choice(project_ids), _text(3), _text(8),
+                now + timedelta(minutes=random.randint(-10 ** 4, 10 ** 5)),
+            ))
+            if len(batch) == 10000:
+                await conn.copy_records_to_table(
+                    "tasks", records=batch, columns=["project_id", "title", "description", "deadline"]
+                )
+                batch = []
+        if batch:
+            await conn.copy_records_to_table(
+                "tasks", records=batch, columns=["project_id", "title", "description", "deadline"]
+            )
+        await conn.execute("ANALYZE tasks")
+        await conn.execute("ANALYZE projects")
+    return user_ids
+
+
+async def search_ilike(database: Database, user_id: int, query: str):
+    """Поиск без индекса для сравнения: подстрока в полях задачи"""
+    async with database.acquire("search_ilike") as conn:
+        return await conn.fetch("""
+            SELECT t.id
+            FROM projects p
+            JOIN tasks t ON t.project_id = p.id
+            WHERE p.user_id = $1
+            AND (t.title ILIKE $2 OR t.description ILIKE $2 OR t.comment ILIKE $2 OR p.name ILIKE $2)
+            ORDER BY t.deadline, t.id
+            LIMIT 11
+        """, user_id, f"%{query}%")
+
+
+async def measure(name: str, search, user_ids: List[int], queries: int):
+    latencies = []
+    for _ in range(queries):
+        query = " ".join(random.sample(WORDS, random.randint(1, 2)))
+        start = time.perf_counter()
+        await search(random.choice(user_ids), query)
+        latencies.append(time.perf_counter() - start)
+    print(f"{name}: p50/p95/p99 {percentile(latencies, 50) * 1000:.1f} / "
+          f"{percentile(latencies, 95) * 1000:.1f} / {percentile(latencies, 99) * 1000:.1f} мс")
+
+
+async def main_async(args):
+    database = Database()
+    await database.create_pool()
+    try:
+        started = time.perf_counter()
+        user_ids = await seed(database, args.tasks, args.users, args.projects)
+        print(f"Создано задач: {args.tasks} за {time.perf_counter() - started:.1f} с")
+        try:
+            await measure("search_tasks", database.search_tasks, user_ids, args.queries)
+            if args.baseline:
+                await measure("ILIKE", lambda user_id, query: search_ilike(database, user_id, query.split()[0]),
+                              user_ids, args.queries)
+        finally:
+            if not args.keep:
+                async with database.acquire("cleanup_search") as conn:
+                    await conn.execute("DELETE FROM projects WHERE user_id = ANY($1::bigint[])", user_ids)
+    finally:
+        await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер полнотекстового поиска задач")
+    parser.add_argument("--tasks", type=int, default=1000000, help="число задач")
+    parser.add_argument("--users", type=int, default=1000, help="число пользователей")
+    parser.add_argument("--projects", type=int, default=5, help="проектов на пользователя")
+    parser.add_argument("--queries", type=int, default=500, help="число поисковых запросов")
+    parser.add_argument("--baseline", action="store_true", help="сравнить с поиском через ILIKE")
+    parser.add_argument("--keep", action="store_true", help="не удалять тестовые данные")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,24 @@ from contextlib import asynccontextmanager
 from datetime import datetime
 
 from aiogram import Bot, Dispatcher, types
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
 import os
 from dotenv import load_dotenv
 
 from db import db
+from storage import PostgresStorage, StorageFlushMiddleware
+from update_queue import UpdateQueue
+from dedup import UpdateDeduplicator
+from metrics import render_metrics
+from middlewares.timing import ApiTimingMiddleware, HandlerNameMiddleware, UpdateTimingMiddleware
+from webhook_reply import WebhookReplyMiddleware, build_webhook_reply
+from handlers import commands
 from handlers.commands import router as commands_router, send_reminders
 from handlers.callbacks import router as callbacks_router
 from handlers.fsm_handlers import router as fsm_handlers_router
@@ -28,11 +37,15 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Инициализация бота и диспетчера
+# TELEGRAM_API_URL позволяет направить бота на локальный Bot API (см. loadtest/)
+telegram_api_url = os.getenv("TELEGRAM_API_URL")
 bot = Bot(
     token=os.getenv("BOT_TOKEN"),
+    session=AiohttpSession(api=TelegramAPIServer.from_base(telegram_api_url)) if telegram_api_url else None,
     default=DefaultBotProperties(parse_mode=ParseMode.HTML)
 )
-storage = MemoryStorage()
+# Состояния FSM хранятся в Postgres, чтобы их видели все воркеры и реплики
+storage = PostgresStorage()
 dp = Dispatcher(storage=storage)
 
 # Регистрация роутеров
@@ -40,6 +53,38 @@ dp.include_router(commands_router)
 dp.include_router(callbacks_router)
 dp.include_router(fsm_handlers_router)
 
+# Замер времени обработки обновлений по обработчикам и фазам (БД, Bot API)
+update_timing = UpdateTimingMiddleware()
+dp.update.outer_middleware(update_timing)
+# Изменения данных FSM записываются в конце каждого обновления
+dp.update.outer_middleware(StorageFlushMiddleware(storage))
+dp.message.middleware(HandlerNameMiddleware())
+dp.callback_query.middleware(HandlerNameMiddleware())
+bot.session.middleware(ApiTimingMiddleware())
+
+# Отсев повторных доставок вебхука; при нескольких воркерах или репликах
+# (UPDATE_DEDUP_SHARED=1) отметки о update_id общие через Postgres
+update_dedup = UpdateDeduplicator(
+    max_size=int(os.getenv("UPDATE_DEDUP_SIZE", 10000)),
+    shared=os.getenv("UPDATE_DEDUP_SHARED") == "1"
+)
+
+# Ответ вызовом Bot API прямо в теле ответа вебхука (WEBHOOK_REPLY=1);
+# работает только при обработке обновлений внутри запроса, без очереди
+webhook_reply = None
+if os.getenv("WEBHOOK_REPLY") == "1":
+    webhook_reply = WebhookReplyMiddleware()
+    bot.session.middleware(webhook_reply)
+
+# Очередь обновлений вебхука: при WEBHOOK_WORKERS > 0 вебхук сразу отвечает
+# Telegram, а обновления обрабатываются фоновыми воркерами
+webhook_workers = int(os.getenv("WEBHOOK_WORKERS", 0))
+update_queue = UpdateQueue(
+    dp, bot,
+    workers=webhook_workers,
+    max_size=int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))
+) if webhook_workers > 0 else None
+
 # FastAPI приложение
 app = FastAPI()
 
@@ -70,15 +115,24 @@ async def lifespan(app: FastAPI):
     # Запуск фоновой задачи для напоминаний
     task = asyncio.create_task(send_reminders(bot))
     
+    if update_queue:
+        update_queue.start()
+    
     yield
     
     # Завершение
+    if update_queue:
+        await update_queue.stop()
+    if commands.export_jobs:
+        await commands.export_jobs.stop()
+    
     task.cancel()
     try:
         await task
     except asyncio.CancelledError:
         pass
     
+    await storage.close()
     await db.close()
     
     # Удаление вебхука
@@ -93,16 +147,56 @@ async def webhook(request: Request):
     """Обработчик вебхука"""
     try:
         update = types.Update(**await request.json())
-        await dp.feed_update(bot, update)
     except Exception as e:
+        logger.error(f"Некорректное обновление: {e}")
+        return {"status": "ok"}
+    if not await update_dedup.is_new(update.update_id):
+        logger.info(f"Повторное обновление {update.update_id} пропущено")
+        return {"status": "ok"}
+    try:
+        if update_queue:
+            # Переполненная очередь - сигнал Telegram повторить доставку позже
+            if not await update_queue.put(update):
+                logger.warning("Очередь обновлений переполнена")
+                await update_dedup.forget(update.update_id)
+                return JSONResponse({"status": "busy"}, status_code=503)
+        elif webhook_reply:
+            reply_slot = webhook_reply.start_update()
+            await dp.feed_update(bot, update)
+            if reply_slot:
+                return build_webhook_reply(reply_slot[0])
+        else:
+            await dp.feed_update(bot, update)
+    except Exception as e:
+        # Отметка снимается, а ошибка в ответе заставит Telegram повторить
+        # доставку: необработанное обновление не теряется
         logger.error(f"Ошибка обработки обновления: {e}")
+        await update_dedup.forget(update.update_id)
+        return JSONResponse({"status": "error"}, status_code=500)
     return {"status": "ok"}
 
 
 @app.get("/health")
 async def health_check():
     """Проверка здоровья приложения"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    response = {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    if commands.reminder_delivery:
+        response["reminders"] = commands.reminder_delivery.get_metrics()
+    if update_queue:
+        response["updates"] = update_queue.get_metrics()
+    response["dedup"] = update_dedup.get_metrics()
+    response["db_cache"] = db.cache.get_metrics()
+    response["change_feed"] = db.get_change_feed_metrics()
+    response["handlers"] = update_timing.get_summary()
+    if webhook_reply:
+        response["webhook_reply"] = webhook_reply.get_metrics()
+    return response
+
+
+@app.get("/metrics")
+async def metrics():
+    """Метрики в формате Prometheus"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/")
@@ -112,21 +206,18 @@ async def root():
         "service": "Telegram Task Planner Bot",
         "status": "running",
         "webhook": "POST /webhook",
-        "health": "GET /health"
+        "health": "GET /health",
+        "metrics": "GET /metrics"
     }
 
 
 async def main():
     """Запуск бота в зависимости от режима"""
-    await db.create_pool()
-    
-    # Запуск фоновой задачи для напоминаний
-    asyncio.create_task(send_reminders(bot))
-    
     # Режим вебхука
     webhook_url = os.getenv("WEBHOOK_URL")
     
     if webhook_url:
+        # Пул БД и напоминания запускает lifespan приложения
         logger.info("Запуск в режиме вебхука...")
         port = int(os.getenv("PORT", 8000))
         config = uvicorn.Config(
@@ -139,8 +230,17 @@ async def main():
         await server.serve()
     else:
         logger.info("Запуск в режиме поллинга...")
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        await db.create_pool()
+        reminders = asyncio.create_task(send_reminders(bot))
+        try:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
+        finally:
+            reminders.cancel()
+            if commands.export_jobs:
+                await commands.export_jobs.stop()
+            await storage.close()
+            await db.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+import bisect
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Границы корзин гистограмм задержек, в секундах
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape_label(value: str) -> str:
+    """Экранирование значения метки по формату Prometheus: \\, \" и перевод строки"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Счетчик в формате Prometheus"""
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+        REGISTRY.append(self)
+
+    def inc(self, *label_values: str, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for label_values, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus"""
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # значения меток -> (счетчики корзин, сумма, количество)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *label_values: str):
+        counts, total, count = self._values.get(label_values) or ([0] * len(self.buckets), 0.0, 0)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(counts):
+            counts[index] += 1
+        self._values[label_values] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+REGISTRY: List = []
+
+
+def render_metrics() -> str:
+    """Все зарегистрированные метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Накопитель времени по фазам для текущего обновления (см. middlewares.timing)
+_phase_times: ContextVar[Optional[Dict[str, float]]] = ContextVar("phase_times", default=None)
+
+
+def start_phase_timing() -> Dict[str, float]:
+    """Начало учета времени по фазам в текущем контексте"""
+    phases: Dict[str, float] = {}
+    _phase_times.set(phases)
+    return phases
+
+
+# Ошибка текущего обновления, перехваченная обработчиком (см. middlewares.timing)
+_update_failure: ContextVar[Optional[Dict[str, bool]]] = ContextVar("update_failure", default=None)
+
+
+def start_failure_tracking() -> Dict[str, bool]:
+    """Начало учета перехваченных ошибок в текущем контексте"""
+    failure = {"failed": False}
+    _update_failure.set(failure)
+    return failure
+
+
+def mark_update_failed():
+    """Отметка обновления как завершенного ошибкой.
+
+    Обработчики перехватывают исключения и отвечают пользователю сообщением
+    об ошибке, поэтому middleware само исключение не видит.
+    """
+    failure = _update_failure.get()
+    if failure is not None:
+        failure["failed"] = True
+
+
+def add_phase_time(phase: str, seconds: float):
+    """Добавление времени фазы (db, api) к обрабатываемому обновлению"""
+    phases = _phase_times.get()
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
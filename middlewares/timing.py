@@ -0,0 +1,113 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject
+
+from metrics import Counter, Histogram, add_phase_time, start_failure_tracking, start_phase_timing
+
+UPDATE_DURATION = Histogram(
+    "bot_update_duration_seconds", "Полное время обработки обновления", ("handler", "outcome")
+)
+UPDATE_PHASE_DURATION = Histogram(
+    "bot_update_phase_seconds", "Время обработки обновления по фазам: код обработчика, БД, Bot API",
+    ("handler", "phase")
+)
+UPDATE_ERRORS = Counter(
+    "bot_update_errors_total", "Обновления, завершившиеся ошибкой, в том числе перехваченной обработчиком",
+    ("handler",)
+)
+API_DURATION = Histogram("bot_api_request_seconds", "Время запросов к Bot API", ("method",))
+
+
+class UpdateTimingMiddleware(BaseMiddleware):
+    """Внешний middleware: замер обработки обновления от начала до конца"""
+
+    def __init__(self):
+        # имя обработчика -> (обновлений, ошибок, суммарное время)
+        self._summary: Dict[str, list] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        phases = start_phase_timing()
+        failure = start_failure_tracking()
+        timing = {"handler": "unhandled"}
+        data["update_timing"] = timing
+        outcome = "ok"
+        start = time.perf_counter()
+        try:
+            result = await handler(event, data)
+            if result is UNHANDLED:
+                outcome = "unhandled"
+            return result
+        except Exception:
+            failure["failed"] = True
+            raise
+        finally:
+            # Обработчики обычно сами ловят исключение и отвечают "❌ Ошибка...",
+            # отмечая это через metrics.mark_update_failed
+            if failure["failed"]:
+                outcome = "error"
+                UPDATE_ERRORS.inc(timing["handler"])
+            self._record(timing["handler"], outcome, time.perf_counter() - start, phases)
+
+    def _record(self, name: str, outcome: str, total: float, phases: Dict[str, float]):
+        db_time = phases.get("db", 0.0)
+        api_time = phases.get("api", 0.0)
+        UPDATE_DURATION.observe(total, name, outcome)
+        UPDATE_PHASE_DURATION.observe(max(total - db_time - api_time, 0.0), name, "handler")
+        UPDATE_PHASE_DURATION.observe(db_time, name, "db")
+        UPDATE_PHASE_DURATION.observe(api_time, name, "api")
+
+        summary = self._summary.setdefault(name, [0, 0, 0.0])
+        summary[0] += 1
+        summary[1] += outcome == "error"
+        summary[2] += total
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Краткая сводка по обработчикам для /health"""
+        return {
+            name: {
+                "updates": count,
+                "errors": errors,
+                "avg_ms": round(total / count * 1000, 1),
+            }
+            for name, (count, errors, total) in self._summary.items()
+        }
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Внутренний middleware: запоминает имя выбранного обработчика для метрик"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        timing = data.get("update_timing")
+        handler_object = data.get("handler")
+        if timing is not None and handler_object is not None:
+            timing["handler"] = handler_object.callback.__name__
+        return await handler(event, data)
+
+
+class ApiTimingMiddleware(BaseRequestMiddleware):
+    """Замер исходящих запросов к Bot API"""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot,
+                       method: TelegramMethod) -> Any:
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            elapsed = time.perf_counter() - start
+            API_DURATION.observe(elapsed, method.__api_method__)
+            add_phase_time("api", elapsed)
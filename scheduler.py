@@ -0,0 +1,216 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Any
+
+from db import db, REMINDER_CLAIM_BATCH, REMINDER_LEASE_RENEW
+
+logger = logging.getLogger(__name__)
+
+# Обработчик сработавших напоминаний: получает строки задач (id, title, deadline, user_id)
+ReminderHandler = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+# Обработчик сводок: строки задач (user_id, project_id, project_name, id, title, deadline)
+DigestHandler = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+
+class ReminderScheduler:
+    """Планировщик напоминаний на куче, упорядоченной по времени срабатывания.
+
+    Каждая реплика бота запускает свой планировщик; наступившие напоминания
+    они делят через аренду в БД (db.claim_due_reminders), так что каждое
+    уходит один раз, а отправка распределяется между репликами.
+    """
+
+    # На сколько вперед загружаются напоминания из БД; более поздние
+    # подгружаются при следующем пополнении окна
+    LOOKAHEAD = timedelta(hours=6)
+
+    def __init__(self, handler: ReminderHandler):
+        self.handler = handler
+        self._heap: List[Tuple[datetime, int]] = []
+        # Актуальное время напоминания по каждой задаче; записи в куче,
+        # не совпадающие с ним, считаются устаревшими и пропускаются
+        self._scheduled: Dict[int, datetime] = {}
+        self._window_end: Optional[datetime] = None
+        # Когда истекает ближайшая чужая аренда: если реплика-владелец упала,
+        # ее напоминания забираются после этого момента
+        self._lease_recheck: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+
+    def schedule(self, task_id: int, remind_at: Optional[datetime]):
+        """Добавление, перенос или отмена напоминания по задаче"""
+        # Напоминания за пределами загруженного окна подтянутся при его пополнении
+        if remind_at is None or self._window_end is None or remind_at > self._window_end:
+            self._scheduled.pop(task_id, None)
+            return
+
+        if self._scheduled.get(task_id) == remind_at:
+            return
+
+        self._scheduled[task_id] = remind_at
+        heapq.heappush(self._heap, (remind_at, task_id))
+        self._wakeup.set()
+
+    def _on_change(self, event: Dict[str, Any]):
+        """После обрыва ленты изменений окно перечитывается из БД заново"""
+        if event["op"] == "RESYNC":
+            self._window_end = None
+            self._wakeup.set()
+
+    async def _refill(self):
+        """Загрузка напоминаний, которые наступят в ближайшее окно"""
+        self._window_end = datetime.now() + self.LOOKAHEAD
+        tasks = await db.get_pending_reminders(self._window_end)
+        for task in tasks:
+            self.schedule(task['id'], task['next_reminder_at'])
+        logger.info(f"Загружено {len(tasks)} задач для напоминаний")
+
+    def _pop_due(self, now: datetime) -> bool:
+        """Снятие с кучи наступивших напоминаний; True, если такие были"""
+        has_due = False
+        while self._heap and self._heap[0][0] <= now:
+            remind_at, task_id = heapq.heappop(self._heap)
+            if self._scheduled.get(task_id) == remind_at:
+                del self._scheduled[task_id]
+                has_due = True
+        return has_due
+
+    def _next_wakeup(self, now: datetime) -> float:
+        """Сколько секунд спать до ближайшего напоминания, проверки аренды или пополнения окна"""
+        next_at = min(self._heap[0][0], self._window_end) if self._heap else self._window_end
+        if self._lease_recheck is not None:
+            next_at = min(next_at, self._lease_recheck)
+        return max((next_at - now).total_seconds(), 0)
+
+    async def _renew_leases(self, task_ids: List[int]):
+        """Продление аренды пачки, пока идет ее отправка"""
+        while True:
+            await asyncio.sleep(REMINDER_LEASE_RENEW.total_seconds())
+            try:
+                await db.renew_reminder_leases(task_ids)
+            except Exception as e:
+                logger.error(f"Ошибка продления аренды напоминаний: {e}")
+
+    async def _deliver_due(self):
+        """Отправка наступивших напоминаний пачками, пока их удается захватить"""
+        self._lease_recheck = None
+        try:
+            while True:
+                tasks = await db.claim_due_reminders()
+                if tasks:
+                    task_ids = [task['id'] for task in tasks]
+                    renewal = asyncio.create_task(self._renew_leases(task_ids))
+                    try:
+                        await self.handler(tasks)
+                    finally:
+                        renewal.cancel()
+                        await asyncio.gather(renewal, return_exceptions=True)
+                    # Без подтверждения аренда истечет, и напоминания отправит другая реплика
+                    for task in await db.complete_reminders(task_ids):
+                        self.schedule(task['id'], task['next_reminder_at'])
+                if len(tasks) < REMINDER_CLAIM_BATCH:
+                    break
+            expiry = await db.get_reminder_lease_expiry()
+            if expiry is not None:
+                # Не чаще раза в секунду, даже если часы БД и процесса расходятся
+                self._lease_recheck = max(expiry, datetime.now() + timedelta(seconds=1))
+        except Exception as e:
+            logger.error(f"Ошибка отправки напоминаний: {e}")
+            self._lease_recheck = datetime.now() + timedelta(minutes=1)
+
+    async def run(self):
+        """Основной цикл планировщика"""
+        # Изменения задач из этого и, через ленту изменений, других процессов
+        db.add_task_listener(self.schedule)
+        db.add_change_listener(self._on_change)
+        try:
+            while True:
+                now = datetime.now()
+                if self._window_end is None or now >= self._window_end:
+                    try:
+                        await self._refill()
+                    except Exception as e:
+                        logger.error(f"Ошибка загрузки задач для напоминаний: {e}")
+                        self._window_end = None
+                        await asyncio.sleep(60)
+                        continue
+
+                lease_expired = self._lease_recheck is not None and now >= self._lease_recheck
+                if self._pop_due(now) or lease_expired:
+                    await self._deliver_due()
+                    continue
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._next_wakeup(now))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            db.remove_task_listener(self.schedule)
+            db.remove_change_listener(self._on_change)
+
+
+class DigestScheduler:
+    """Ежедневные сводки: сон до ближайшего digest_next_at среди пользователей"""
+
+    # Самый долгий сон: новое время сводки, выбранное в любом процессе,
+    # подхватывается не позже чем через минуту
+    MAX_SLEEP = timedelta(minutes=1)
+
+    def __init__(self, handler: DigestHandler):
+        self.handler = handler
+
+    async def _deliver_due(self):
+        """Отправка наступивших сводок пачками"""
+        while True:
+            tasks = await db.claim_due_digests()
+            if tasks:
+                await self.handler(tasks)
+            next_at = await db.get_next_digest_at()
+            # Пустая пачка - либо сводок больше нет, либо часы процесса и БД расходятся
+            if not tasks or next_at is None or next_at > datetime.now():
+                return next_at
+
+    async def run(self):
+        """Основной цикл отправки сводок"""
+        while True:
+            try:
+                next_at = await self._deliver_due()
+            except Exception as e:
+                logger.error(f"Ошибка отправки сводок: {e}")
+                next_at = None
+            now = datetime.now()
+            sleep_until = now + self.MAX_SLEEP
+            if next_at is not None:
+                sleep_until = min(sleep_until, next_at)
+            await asyncio.sleep(max((sleep_until - now).total_seconds(), 1))
+
+
+class BatchJob:
+    """Фоновая обработка небольшими пачками: очистка удаленных проектов, архивация.
+
+    step выполняет одну пачку и возвращает число обработанных строк; пока
+    работа есть, пачки идут одна за другой, иначе задача засыпает.
+    """
+
+    # Пауза между пачками оставляет место запросам пользователей
+    BATCH_PAUSE = 0.1
+    # Проверка новой работы, когда обрабатывать нечего
+    IDLE_SLEEP = 60
+
+    def __init__(self, name: str, step: Callable[[], Awaitable[int]]):
+        self.name = name
+        self.step = step
+
+    async def run(self):
+        """Основной цикл обработки"""
+        while True:
+            try:
+                processed = await self.step()
+            except Exception as e:
+                logger.error(f"Ошибка фоновой задачи «{self.name}»: {e}")
+                processed = 0
+            if processed:
+                logger.debug(f"{self.name}: обработано строк {processed}")
+            await asyncio.sleep(self.BATCH_PAUSE if processed else self.IDLE_SLEEP)
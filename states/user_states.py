@@ -14,6 +14,8 @@ class TaskStates(StatesGroup):
     waiting_for_description = State()
     waiting_for_deadline = State()
     waiting_for_comment = State()
+    # Ввод многих задач одним сообщением, по строке на задачу
+    waiting_for_bulk_tasks = State()
 
 
 class EditProjectStates(StatesGroup):
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.types import TelegramObject
+
+from db import db
+
+logger = logging.getLogger(__name__)
+
+# Отсутствующий ключ при сравнении данных: отличается от любого значения, включая None
+_MISSING = object()
+
+
+class PostgresStorage(BaseStorage):
+    """Хранилище FSM в Postgres на общем пуле db с локальным кэшем.
+
+    Каждое обновление начинается с get_state, который всегда читает запись
+    из БД, - так воркер видит состояние, оставленное другим воркером. Данные
+    в пределах обновления берутся из кэша, изменения (update_data) копятся
+    и пишутся одним запросом в конце обновления (StorageFlushMiddleware)
+    или сразу при смене состояния. В БД уходят только измененные ключи
+    данных: они сливаются с записью на сервере, поэтому чужие изменения
+    других ключей не затираются.
+    """
+
+    # Сколько загруженная запись считается свежей: хватает на одно обновление
+    CACHE_TTL = 1
+    # Страховочный сброс изменений, не записанных в конце обновления
+    FLUSH_INTERVAL = 0.2
+    # Брошенные диалоги удаляются через сутки без активности
+    STATE_TTL = timedelta(days=1)
+    CLEANUP_INTERVAL = 60 * 60
+
+    def __init__(self):
+        self.key_builder = DefaultKeyBuilder(with_destiny=True)
+        # ключ -> (состояние, данные, время загрузки из БД)
+        self._cache: Dict[str, Tuple[Optional[str], Dict[str, Any], float]] = {}
+        # ключ -> данные в том виде, в каком они были прочитаны из БД;
+        # по разнице с кэшем определяются измененные ключи
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _read(self, key: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Чтение записи из БД с обновлением кэша"""
+        async with db.acquire("fsm_load") as conn:
+            row = await conn.fetchrow("""
+                SELECT state, data FROM fsm_states WHERE key = $1
+            """, key)
+        state, data = (row['state'], json.loads(row['data'])) if row else (None, {})
+        self._cache[key] = (state, data, time.monotonic())
+        return state, data
+
+    async def _load(self, key: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Чтение записи из кэша, если она свежая или изменена здесь, иначе из БД"""
+        cached = self._cache.get(key)
+        if cached and (key in self._dirty or time.monotonic() - cached[2] < self.CACHE_TTL):
+            return cached[0], cached[1]
+        return await self._read(key)
+
+    def _changes(self, key: str) -> Tuple[Dict[str, Any], List[str]]:
+        """Измененные и удаленные ключи данных относительно прочитанных из БД"""
+        base = self._dirty.get(key)
+        if base is None:
+            return {}, []
+        data = self._cache[key][1]
+        changed = {name: value for name, value in data.items() if base.get(name, _MISSING) != value}
+        removed = [name for name in base if name not in data]
+        return changed, removed
+
+    async def _write(self, keys) -> Dict[str, Dict[str, Any]]:
+        """Запись измененных ключей данных одним запросом; возвращает записанные данные"""
+        records = []
+        written = {}
+        for key in keys:
+            changed, removed = self._changes(key)
+            records.append((key, json.dumps(changed, ensure_ascii=False), removed))
+            written[key] = self._cache[key][1]
+        if not records:
+            return written
+        async with db.acquire("fsm_write") as conn:
+            await conn.executemany("""
+                INSERT INTO fsm_states (key, data, updated_at)
+                VALUES ($1, $2::jsonb, NOW())
+                ON CONFLICT (key) DO UPDATE
+                SET data = (fsm_states.data - $3::text[]) || EXCLUDED.data, updated_at = NOW()
+            """, records)
+        return written
+
+    async def flush(self):
+        """Запись накопленных изменений данных в БД"""
+        if not self._dirty:
+            return
+        written = await self._write(list(self._dirty))
+        for key, data in written.items():
+            if key not in self._dirty:
+                continue
+            if self._cache[key][1] is data:
+                del self._dirty[key]
+            else:
+                # Данные изменились во время записи: остаток пишется следующим сбросом
+                self._dirty[key] = data
+
+    async def _flush_loop(self):
+        last_cleanup = 0.0
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            try:
+                await self.flush()
+                if time.monotonic() - last_cleanup >= self.CLEANUP_INTERVAL:
+                    await self._cleanup()
+                    last_cleanup = time.monotonic()
+            except Exception as e:
+                logger.error(f"Ошибка записи состояний FSM: {e}")
+
+    async def _cleanup(self):
+        """Удаление брошенных состояний из БД и устаревших записей кэша"""
+        async with db.acquire("fsm_cleanup") as conn:
+            await conn.execute("""
+                DELETE FROM fsm_states
+                WHERE updated_at < NOW() - $1::interval
+            """, self.STATE_TTL)
+        now = time.monotonic()
+        for key in [key for key, cached in self._cache.items()
+                    if key not in self._dirty and now - cached[2] >= self.CACHE_TTL]:
+            del self._cache[key]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        state = state.state if isinstance(state, State) else state
+        # Смена состояния пишется сразу вместе с изменениями данных этого воркера
+        changed, removed = self._changes(storage_key) if storage_key in self._cache else ({}, [])
+        async with db.acquire("fsm_set_state") as conn:
+            data = await conn.fetchval("""
+                INSERT INTO fsm_states (key, state, data, updated_at)
+                VALUES ($1, $2, $3::jsonb, NOW())
+                ON CONFLICT (key) DO UPDATE
+                SET state = EXCLUDED.state,
+                    data = (fsm_states.data - $4::text[]) || EXCLUDED.data,
+                    updated_at = NOW()
+                RETURNING data
+            """, storage_key, state, json.dumps(changed, ensure_ascii=False), removed)
+        self._dirty.pop(storage_key, None)
+        self._cache[storage_key] = (state, json.loads(data), time.monotonic())
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        storage_key = self.key_builder.build(key)
+        # Начало обработки обновления: состояние мог изменить другой воркер
+        if storage_key in self._dirty:
+            return self._cache[storage_key][0]
+        state, _ = await self._read(storage_key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self.key_builder.build(key)
+        state, current = await self._load(storage_key)
+        self._dirty.setdefault(storage_key, current)
+        self._cache[storage_key] = (state, data.copy(), self._cache[storage_key][2])
+        self._ensure_flusher()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self.key_builder.build(key))
+        return data.copy()
+
+    async def close(self) -> None:
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+
+class StorageFlushMiddleware(BaseMiddleware):
+    """Внешний middleware: запись изменений данных FSM в конце обновления,
+    до того как следующее обновление пользователя попадет к другому воркеру"""
+
+    def __init__(self, storage: PostgresStorage):
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            await self.storage.flush()
@@ -0,0 +1,62 @@
+"""Разбор сообщения со списком задач (parse_bulk_tasks)."""
+from datetime import datetime, timedelta
+
+from handlers.fsm_handlers import DEADLINE_FORMAT, parse_bulk_tasks
+
+
+def deadline(days: int) -> str:
+    return (datetime.now() + timedelta(days=days)).strftime(DEADLINE_FORMAT)
+
+
+def test_accepts_lines_with_and_without_description():
+    tasks, errors = parse_bulk_tasks(
+        f"Отчет | {deadline(1)} | за январь\n"
+        f"  Звонок клиенту  |  {deadline(2)}  \n"
+        f"Макет | {deadline(3)} | \n"
+    )
+    assert errors == []
+    assert [task["title"] for task in tasks] == ["Отчет", "Звонок клиенту", "Макет"]
+    assert [task["description"] for task in tasks] == ["за январь", None, None]
+    assert tasks[1]["deadline"] == datetime.strptime(deadline(2), DEADLINE_FORMAT)
+
+
+def test_description_keeps_separators():
+    tasks, errors = parse_bulk_tasks(f"Отчет | {deadline(1)} | итог | по кварталу")
+    assert errors == []
+    assert tasks[0]["description"] == "итог | по кварталу"
+
+
+def test_blank_lines_are_skipped_without_errors():
+    tasks, errors = parse_bulk_tasks(f"\n   \nОтчет | {deadline(1)}\n\n")
+    assert len(tasks) == 1
+    assert errors == []
+
+
+def test_malformed_lines_are_reported_by_number():
+    tasks, errors = parse_bulk_tasks(
+        f"Отчет | {deadline(1)}\n"
+        "без дедлайна\n"
+        f" | {deadline(1)}\n"
+        "Встреча | завтра\n"
+        "Аудит | 31.02.26 10:00\n"
+    )
+    assert len(tasks) == 1
+    assert [error.split(":", 1)[0] for error in errors] == ["2", "3", "4", "5"]
+    assert "нужно «название | дедлайн»" in errors[0]
+    assert "нужно «название | дедлайн»" in errors[1]
+    assert "не в формате" in errors[2]
+    assert "не в формате" in errors[3]
+
+
+def test_past_deadlines_are_rejected():
+    tasks, errors = parse_bulk_tasks(f"Вчера | {deadline(-1)}\nЗавтра | {deadline(1)}")
+    assert [task["title"] for task in tasks] == ["Завтра"]
+    assert len(errors) == 1
+    assert errors[0].startswith("1:") and "уже прошел" in errors[0]
+
+
+def test_user_input_in_errors_is_escaped():
+    tasks, errors = parse_bulk_tasks("Отчет | <b>завтра</b>")
+    assert tasks == []
+    assert "&lt;b&gt;завтра&lt;/b&gt;" in errors[0]
+    assert "<b>" not in errors[0]
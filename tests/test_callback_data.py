@@ -0,0 +1,27 @@
+"""Размер callback_data: Telegram принимает не больше 64 байт."""
+from datetime import datetime
+
+import pytest
+
+from db import encode_page_cursor
+from keyboards.callback_data import (
+    MenuCallback, ProjectCallback, TaskCallback, SettingsCallback, SearchCallback, SelectCallback
+)
+
+CALLBACK_DATA_LIMIT = 64
+
+# Наибольшие значения: id - INTEGER, курсор - последней возможной строки
+MAX_ID = 2 ** 31 - 1
+MAX_CURSOR = encode_page_cursor(datetime(9999, 12, 31, 23, 59, 59, 999999), MAX_ID)
+
+
+@pytest.mark.parametrize("callback", [
+    MenuCallback(action="create_project", cursor=MAX_CURSOR),
+    ProjectCallback(action="confirm_delete", project_id=MAX_ID, cursor=MAX_CURSOR),
+    TaskCallback(action="confirm_delete", task_id=MAX_ID, field="description"),
+    SettingsCallback(action="set_time", mode="digest", hour=23),
+    SearchCallback(action="page", page=9999),
+    SelectCallback(action="complete_overdue", project_id=MAX_ID, task_id=MAX_ID, page=9999, days=7),
+], ids=lambda callback: callback.__prefix__)
+def test_callback_data_fits_limit(callback):
+    assert len(callback.pack().encode()) <= CALLBACK_DATA_LIMIT
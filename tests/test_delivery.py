@@ -0,0 +1,78 @@
+"""Ограничитель частоты рассылки (TokenBucket) на подставных часах."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import delivery
+from delivery import TokenBucket
+
+
+class FakeClock:
+    """monotonic и sleep без реального ожидания: sleep сдвигает часы"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(delivery, "time", SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(delivery, "asyncio", SimpleNamespace(Lock=asyncio.Lock, sleep=clock.sleep))
+    return clock
+
+
+def acquire(bucket: TokenBucket, times: int = 1):
+    async def run():
+        for _ in range(times):
+            await bucket.acquire()
+    asyncio.run(run())
+
+
+def test_full_bucket_allows_burst_then_waits(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    acquire(bucket, 3)
+    assert clock.sleeps == []
+    acquire(bucket)
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_tokens_refill_with_time(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    acquire(bucket, 3)
+    clock.now += 1
+    acquire(bucket, 2)
+    assert clock.sleeps == []
+    # Частично накопленный токен сокращает ожидание
+    clock.now += 0.25
+    acquire(bucket)
+    assert clock.sleeps == [pytest.approx(0.25)]
+
+
+def test_refill_is_capped_by_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    acquire(bucket)
+    assert not bucket.is_idle()
+    clock.now += 3600
+    assert bucket.is_idle()
+    acquire(bucket, 3)
+    acquire(bucket)
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_pause_blocks_for_retry_after(clock):
+    bucket = TokenBucket(rate=1, capacity=5)
+    bucket.pause(2)
+    acquire(bucket)
+    # Токенов было бы 5, но после 429 сначала нужно переждать retry_after
+    assert sum(clock.sleeps) == pytest.approx(3)
+    assert clock.now == pytest.approx(1003)
@@ -0,0 +1,61 @@
+"""Текст ежедневной сводки (render_digest)."""
+from datetime import datetime, timedelta
+
+from handlers.commands import DIGEST_PAGE_LIMIT, render_digest
+
+HEADER = "🗓 Ежедневная сводка"
+
+
+def task(project_id: int, title: str, hours: float, project_name: str = None) -> dict:
+    return {
+        "project_id": project_id,
+        "project_name": project_name or f"Проект {project_id}",
+        "title": title,
+        "deadline": datetime.now() + timedelta(hours=hours),
+    }
+
+
+def test_single_page_groups_tasks_by_project():
+    pages = render_digest([
+        task(1, "Отчет", -2),
+        task(1, "Звонок", 3),
+        task(2, "Макет", 5),
+    ])
+    assert len(pages) == 1
+    lines = pages[0].split("\n")
+    assert lines[0] == f"{HEADER}: задач на сутки и просроченных - 3"
+    assert "📁 Проект 1" in lines and "📁 Проект 2" in lines
+    assert lines.index("📁 Проект 1") < lines.index("📁 Проект 2")
+    assert any(line.startswith("⚠️ Отчет - ") for line in lines)
+    assert any(line.startswith("⏳ Звонок - ") for line in lines)
+
+
+def test_user_input_is_escaped_and_truncated():
+    pages = render_digest([task(1, "<i>" + "з" * 300, 1, project_name="<b>" + "п" * 100)])
+    text = pages[0]
+    assert "<b>" not in text and "<i>" not in text
+    assert f"📁 &lt;b&gt;{'п' * 47}\n" in text
+    assert "з" * 197 + " - " in text
+    assert "з" * 198 not in text
+
+
+def test_long_digest_is_split_into_numbered_pages():
+    tasks = [task(project, f"Задача {project}-{number} " + "x" * 150, 1)
+             for project in range(10) for number in range(10)]
+    pages = render_digest(tasks)
+    assert len(pages) > 1
+    for number, page in enumerate(pages, 1):
+        header, body = page.split("\n", 1)
+        assert header.endswith(f" - {len(tasks)} ({number}/{len(pages)})")
+        assert len(body) <= DIGEST_PAGE_LIMIT
+    # Каждая задача попадает ровно на одну страницу, порядок сохраняется
+    titles = [line.split(" ", 1)[1].rsplit(" - ", 1)[0]
+              for page in pages for line in page.split("\n")[1:] if line.startswith("⏳")]
+    assert titles == [item["title"] for item in tasks]
+
+
+def test_worst_case_lines_fit_telegram_limit():
+    # Экранирование увеличивает текст до 6 раз: страница все равно в пределах 4096
+    tasks = [task(project, "&" * 1000, 1, project_name="&" * 1000) for project in range(20)]
+    pages = render_digest(tasks)
+    assert all(len(page) <= 4096 for page in pages)
@@ -0,0 +1,261 @@
+"""Проверка планов запросов на большом объеме.
+
+Запуск (DATABASE_URL указывает на тестовую базу; без него тесты пропускаются):
+    DATABASE_URL=... python -m pytest tests/test_query_plans.py
+
+Заполняет базу задачами служебных пользователей (отрицательные user_id):
+большинство завершено за прошедший год, активные в основном впереди, часть
+пользователей получает сводки, несколько проектов удалено. Затем выполняет
+методы Database, которыми пользуются бот и планировщики, в откатываемой
+транзакции. Перед каждым запросом его план снимается через EXPLAIN ANALYZE в
+точке сохранения, поэтому многошаговые методы (архив, очистка) проверяются
+на настоящих промежуточных результатах. Каждый запрос обязан использовать
+ожидаемый индекс, не читать tasks последовательно и укладываться в
+PLAN_BUDGET_MS по медиане. Объем задается PLAN_TASKS (по умолчанию 200000).
+"""
+import asyncio
+import json
+import os
+import random
+import statistics
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import pytest
+
+from db import Database, REMINDER_OFFSETS
+
+pytestmark = pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="DATABASE_URL не задан")
+
+TASKS = int(os.getenv("PLAN_TASKS", 200000))
+USERS = int(os.getenv("PLAN_USERS", 1000))
+PROJECTS_PER_USER = 5
+BUDGET_MS = float(os.getenv("PLAN_BUDGET_MS", 50))
+REPEAT = 5
+
+# Доля завершенных задач: история, через которую не должны идти горячие запросы
+COMPLETED_SHARE = 0.8
+# Доля просроченных среди активных задач, просрочка до недели
+OVERDUE_SHARE = 0.05
+# Доля пользователей в режиме сводки
+DIGEST_SHARE = 0.1
+# Удаленные проекты и задач в каждом: меньше PURGE_BATCH на все, чтобы шаг
+# очистки дошел до архива и самих проектов
+DELETED_PROJECTS = 5
+DELETED_PROJECT_TASKS = 50
+
+WORDS = ["отчет", "встреча", "клиент", "договор", "бюджет", "релиз", "макет", "аудит"]
+
+# Метод Database (аргументы: база, сид) -> для каждого его запроса набор
+# индексов, хотя бы один из которых обязан быть в плане (None - без требования)
+CASES = {
+    "claim_due_reminders": (
+        lambda database, seeded: database.claim_due_reminders(),
+        [{"idx_tasks_next_reminder_at"}],
+    ),
+    "get_pending_reminders": (
+        lambda database, seeded: database.get_pending_reminders(datetime.now() + timedelta(hours=6)),
+        [{"idx_tasks_next_reminder_at"}],
+    ),
+    "claim_due_digests": (
+        lambda database, seeded: database.claim_due_digests(),
+        [{"idx_user_settings_digest_next_at"}],
+    ),
+    "get_project_tasks_page": (
+        lambda database, seeded: database.get_project_tasks_page(seeded["project_id"], seeded["user_id"]),
+        [{"idx_tasks_project_deadline"}],
+    ),
+    "search_tasks": (
+        lambda database, seeded: database.search_tasks(seeded["user_id"], random.choice(WORDS)),
+        [{"idx_tasks_search", "idx_tasks_project_deadline"}],
+    ),
+    "archive_completed_tasks": (
+        lambda database, seeded: database.archive_completed_tasks(),
+        [{"idx_tasks_completed_at"}, {"tasks_pkey"}],
+    ),
+    "purge_deleted_projects": (
+        lambda database, seeded: database.purge_deleted_projects(),
+        [{"idx_tasks_project_deadline"}, None, {"idx_projects_deleted"}],
+    ),
+}
+
+# Запросы, план которых снимается; DDL (секции архива) выполняется как есть
+EXPLAINED = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def plan_nodes(plan: Dict[str, Any]):
+    """Все узлы плана EXPLAIN в формате JSON"""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+class ExplainingConnection:
+    """Соединение, снимающее план каждого запроса перед его выполнением"""
+
+    def __init__(self, conn, plans: List[Tuple[str, Dict[str, Any], float]]):
+        self._conn = conn
+        self._plans = plans
+
+    def transaction(self):
+        return self._conn.transaction()
+
+    async def _explain(self, query: str, args: tuple):
+        if query.split(None, 1)[0].upper() not in EXPLAINED:
+            return
+        timings = []
+        for _ in range(REPEAT):
+            # Точка сохранения: изменения EXPLAIN ANALYZE откатываются
+            savepoint = self._conn.transaction()
+            await savepoint.start()
+            try:
+                result = await self._conn.fetchval(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}", *args)
+            finally:
+                await savepoint.rollback()
+            explained = json.loads(result)[0]
+            timings.append(explained["Execution Time"])
+        self._plans.append((query, explained["Plan"], statistics.median(timings)))
+
+    async def fetch(self, query: str, *args):
+        await self._explain(query, args)
+        return await self._conn.fetch(query, *args)
+
+    async def fetchrow(self, query: str, *args):
+        await self._explain(query, args)
+        return await self._conn.fetchrow(query, *args)
+
+    async def fetchval(self, query: str, *args):
+        await self._explain(query, args)
+        return await self._conn.fetchval(query, *args)
+
+    async def execute(self, query: str, *args):
+        await self._explain(query, args)
+        return await self._conn.execute(query, *args)
+
+
+async def collect_plans(case: str, seeded: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any], float]]:
+    """Планы и медианы времени всех запросов метода; изменения откатываются"""
+    plans: List[Tuple[str, Dict[str, Any], float]] = []
+    database = Database()
+    await database.create_pool()
+    try:
+        async with database.pool.acquire() as conn:
+            transaction = conn.transaction()
+            await transaction.start()
+
+            @asynccontextmanager
+            async def acquire(name: str):
+                yield ExplainingConnection(conn, plans)
+
+            database.acquire = acquire
+            try:
+                await CASES[case][0](database, seeded)
+            finally:
+                await transaction.rollback()
+    finally:
+        await database.close()
+    return plans
+
+
+async def seed() -> Dict[str, Any]:
+    """Проекты, задачи и настройки служебных пользователей"""
+    database = Database()
+    await database.create_pool()
+    user_ids = [-user for user in range(1, USERS + 1)]
+    try:
+        async with database.acquire("seed_plans") as conn:
+            rows = await conn.fetch("""
+                INSERT INTO projects (user_id, name)
+                SELECT u, 'Проект ' || n
+                FROM unnest($1::bigint[]) AS u, generate_series(1, $2) AS n
+                RETURNING id, user_id
+            """, user_ids, PROJECTS_PER_USER)
+            projects = [(row['user_id'], row['id']) for row in rows]
+
+            deleted = [row['id'] for row in await conn.fetch("""
+                INSERT INTO projects (user_id, name, deleted_at)
+                SELECT $1, 'Удаленный проект ' || n, NOW()
+                FROM generate_series(1, $2) AS n
+                RETURNING id
+            """, user_ids[0], DELETED_PROJECTS)]
+
+            now = datetime.now()
+            columns = ["project_id", "title", "deadline", "status", "completed_at", "next_reminder_at"]
+            batch = []
+            for number in range(TASKS + DELETED_PROJECTS * DELETED_PROJECT_TASKS):
+                if number < TASKS:
+                    project_id = random.choice(projects)[1]
+                else:
+                    project_id = deleted[(number - TASKS) % DELETED_PROJECTS]
+                if random.random() < COMPLETED_SHARE:
+                    deadline = now - timedelta(minutes=random.randint(1, 525600))
+                    record = ("завершено", deadline, None)
+                elif random.random() < OVERDUE_SHARE:
+                    deadline = now - timedelta(minutes=random.randint(1, 10080))
+                    record = ("активно", None, None)
+                else:
+                    deadline = now + timedelta(minutes=random.randint(1, 525600))
+                    remind_at = min(deadline - offset for offset in REMINDER_OFFSETS if deadline - offset > now)
+                    record = ("активно", None, remind_at)
+                title = f"{random.choice(WORDS)} {random.choice(WORDS)} {number}"
+                batch.append((project_id, title, deadline, *record))
+                if len(batch) == 10000:
+                    await conn.copy_records_to_table("tasks", records=batch, columns=columns)
+                    batch = []
+            if batch:
+                await conn.copy_records_to_table("tasks", records=batch, columns=columns)
+
+            # Настройки есть у всех, сводку получает часть пользователей
+            digest_users = random.sample(user_ids, int(USERS * DIGEST_SHARE))
+            await conn.execute("""
+                INSERT INTO user_settings (user_id, reminder_mode, digest_next_at)
+                SELECT u,
+                       CASE WHEN u = ANY($2::bigint[]) THEN 'digest' ELSE 'tasks' END,
+                       CASE WHEN u = ANY($2::bigint[]) THEN NOW() - INTERVAL '1 minute' END
+                FROM unnest($1::bigint[]) AS u
+            """, user_ids, digest_users)
+            for table in ("tasks", "projects", "user_settings"):
+                await conn.execute(f"ANALYZE {table}")
+    finally:
+        await database.close()
+
+    user_id, project_id = random.choice(projects)
+    return {"user_ids": user_ids, "user_id": user_id, "project_id": project_id}
+
+
+async def cleanup(user_ids: List[int]):
+    database = Database()
+    await database.create_pool()
+    try:
+        async with database.acquire("cleanup_plans") as conn:
+            await conn.execute("DELETE FROM projects WHERE user_id = ANY($1::bigint[])", user_ids)
+            await conn.execute("DELETE FROM user_settings WHERE user_id = ANY($1::bigint[])", user_ids)
+    finally:
+        await database.close()
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    data = asyncio.run(seed())
+    yield data
+    asyncio.run(cleanup(data["user_ids"]))
+
+
+@pytest.mark.parametrize("case", list(CASES))
+def test_query_plan(case: str, seeded: Dict[str, Any]):
+    plans = asyncio.run(collect_plans(case, seeded))
+    expected: List[Optional[Set[str]]] = CASES[case][1]
+    assert len(plans) == len(expected), f"{case}: запросов {len(plans)}, ожидалось {len(expected)}"
+
+    for number, ((query, plan, median), indexes_expected) in enumerate(zip(plans, expected), 1):
+        nodes = list(plan_nodes(plan))
+        indexes = {node["Index Name"] for node in nodes if "Index Name" in node}
+        seq_scans = [node for node in nodes
+                     if node["Node Type"] == "Seq Scan" and node.get("Relation Name") == "tasks"]
+        where = f"{case}, запрос {number}"
+        if indexes_expected is not None:
+            assert indexes & indexes_expected, \
+                f"{where}: в плане нет индекса {' / '.join(sorted(indexes_expected))}, есть {sorted(indexes)}"
+        assert not seq_scans, f"{where}: последовательное чтение tasks"
+        assert median <= BUDGET_MS, f"{where}: {median:.2f} мс больше бюджета {BUDGET_MS} мс"
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from typing import Any, Dict, List
+
+from aiogram import Bot, Dispatcher, types
+
+logger = logging.getLogger(__name__)
+
+
+def get_partition_key(update: types.Update) -> int:
+    """Ключ упорядочивания: пользователь (или чат), от которого пришло обновление"""
+    try:
+        event = update.event
+    except Exception:
+        return update.update_id
+    user = getattr(event, "from_user", None)
+    if user:
+        return user.id
+    chat = getattr(event, "chat", None)
+    if chat:
+        return chat.id
+    return update.update_id
+
+
+class UpdateQueue:
+    """Очередь обработки обновлений на пуле фоновых воркеров.
+
+    Каждое обновление попадает в очередь воркера по ключу пользователя,
+    поэтому обновления одного чата обрабатываются строго по порядку,
+    а разные пользователи - параллельно.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, workers: int, max_size: int,
+                 put_timeout: float = 5.0):
+        self.dp = dp
+        self.bot = bot
+        self.put_timeout = put_timeout
+        # Лимит каждой очереди - доля общего размера
+        per_worker_size = max(max_size // workers, 1)
+        self._queues: List[asyncio.Queue] = [
+            asyncio.Queue(maxsize=per_worker_size) for _ in range(workers)
+        ]
+        self._workers: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        """Запуск воркеров"""
+        self._workers = [
+            asyncio.create_task(self._worker(queue)) for queue in self._queues
+        ]
+        logger.info(f"Запущено {len(self._workers)} воркеров обработки обновлений")
+
+    async def stop(self):
+        """Обработка оставшихся обновлений и остановка воркеров"""
+        for queue in self._queues:
+            await queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def put(self, update: types.Update) -> bool:
+        """Постановка обновления в очередь; False, если очередь переполнена"""
+        queue = self._queues[get_partition_key(update) % len(self._queues)]
+        try:
+            # При переполнении ждем освобождения места, а не роняем обновление
+            await asyncio.wait_for(queue.put(update), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        return True
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception as e:
+                # Доставка уже подтверждена Telegram, повтора не будет
+                self.failed += 1
+                logger.error(f"Ошибка обработки обновления {update.update_id}: {e}")
+            finally:
+                queue.task_done()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Глубина очередей и счетчики обработки"""
+        depths = [queue.qsize() for queue in self._queues]
+        return {
+            "workers": len(self._queues),
+            "queue_depth": sum(depths),
+            "max_worker_queue_depth": max(depths) if depths else 0,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,59 @@
+import logging
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import AnswerCallbackQuery, TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+# Слот для метода, который уйдет в ответе на текущий запрос вебхука;
+# None - обновление обрабатывается не в режиме ответа через вебхук
+_reply_slot: ContextVar[Optional[List[TelegramMethod]]] = ContextVar("webhook_reply_slot", default=None)
+
+
+class WebhookReplyMiddleware(BaseRequestMiddleware):
+    """Перехват первого подходящего вызова Bot API для отправки в ответе вебхука.
+
+    Ответ вебхука не возвращает результат вызова, поэтому перехватываются
+    только методы, результат которых обработчики не используют (всегда True).
+    Остальные вызовы уходят в Telegram как обычно.
+    """
+
+    ELIGIBLE_METHODS = (AnswerCallbackQuery,)
+
+    def __init__(self):
+        self.updates = 0
+        self.saved_calls = 0
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot,
+                       method: TelegramMethod) -> Any:
+        slot = _reply_slot.get()
+        if slot is not None and not slot and isinstance(method, self.ELIGIBLE_METHODS):
+            slot.append(method)
+            self.saved_calls += 1
+            return True
+        return await make_request(bot, method)
+
+    def start_update(self) -> List[TelegramMethod]:
+        """Открытие слота ответа для обрабатываемого обновления"""
+        slot: List[TelegramMethod] = []
+        _reply_slot.set(slot)
+        self.updates += 1
+        return slot
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Сколько исходящих вызовов сэкономлено ответами через вебхук"""
+        return {
+            "updates": self.updates,
+            "saved_calls": self.saved_calls,
+            "saved_calls_per_update": round(self.saved_calls / self.updates, 3) if self.updates else 0.0,
+        }
+
+
+def build_webhook_reply(method: TelegramMethod) -> Dict[str, Any]:
+    """Тело ответа вебхука с вызовом метода Bot API"""
+    payload = method.model_dump(exclude_none=True, warnings=False)
+    payload["method"] = method.__api_method__
+    return payload